@@ -1,4 +1,4 @@
-from fastapi import FastAPI, Request, HTTPException
+from fastapi import FastAPI, Request, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.responses import JSONResponse
@@ -6,8 +6,21 @@ from fastapi.exceptions import RequestValidationError
 from dotenv import load_dotenv
 import os
 import logging
+import secrets
 
 from routes import auth, documents, tutor, quiz, flashcards, progress, agora, agora_voice
+from utils.mistral_client import ai_client
+from utils.chroma_client import chroma_client
+from utils.write_batch import progress_writer
+from utils.session_stats import session_stats
+from utils.semantic_cache import semantic_cache
+from utils.token_verifier import token_verifier
+from utils.listing_cache import listing_cache
+from utils.config import METRICS_API_KEY
+from services.ingestion_service import ingestion_service
+from services.voice_tutor_service import voice_tutor_service
+from services.agora_voice_service import agora_voice_service
+from services.voice_socket_service import voice_socket_service
 
 # Load environment variables
 load_dotenv()
@@ -103,6 +116,37 @@ app.include_router(progress.router, tags=["Progress"])
 app.include_router(agora.router, tags=["Agora"])
 app.include_router(agora_voice.router, tags=["Agora Voice"])
 
+@app.on_event("startup")
+async def startup_event():
+    # Start background document ingestion workers (resumes interrupted jobs)
+    await ingestion_service.start()
+    
+    # Periodically flush tutor session statistics
+    await session_stats.start()
+    
+    # Expire idle voice sessions
+    await voice_tutor_service.sessions.start()
+    await agora_voice_service.sessions.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ingestion_service.stop()
+    await voice_tutor_service.sessions.stop()
+    await agora_voice_service.sessions.stop()
+    
+    # Write out buffered session stats and progress logs
+    await session_stats.stop()
+    await progress_writer.flush()
+    
+    # Release pooled keep-alive connections to the AI provider
+    await ai_client.close()
+    if ai_client.embedding_cache:
+        ai_client.embedding_cache.close()
+    chroma_client.close()
+    await listing_cache.versions.close()
+    if semantic_cache:
+        await semantic_cache.versions.close()
+
 @app.get("/")
 async def root():
     return {"message": "Kashar AI Backend API"}
@@ -111,6 +155,33 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+def require_metrics_access(request: Request):
+    """Allow /metrics only from a direct loopback connection or with the metrics key"""
+    key = request.headers.get("x-metrics-key")
+    if METRICS_API_KEY and key and secrets.compare_digest(key, METRICS_API_KEY):
+        return
+    # Requests relayed by a proxy arrive from loopback too, so forwarded ones need the key
+    direct = "x-forwarded-for" not in request.headers and "forwarded" not in request.headers
+    if direct and request.client and request.client.host in ("127.0.0.1", "::1"):
+        return
+    raise HTTPException(status_code=404, detail="Not Found")
+
+@app.get("/metrics", include_in_schema=False, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    return {
+        "embedding_cache": ai_client.embedding_cache.stats() if ai_client.embedding_cache else None,
+        "vector_store": chroma_client.stats(),
+        "progress_writer": progress_writer.stats(),
+        "session_stats": session_stats.stats(),
+        "semantic_cache": semantic_cache.stats() if semantic_cache else None,
+        "structured_output": ai_client.structured_stats,
+        "auth": token_verifier.stats(),
+        "listing_cache": listing_cache.stats(),
+        "voice_sessions": voice_tutor_service.sessions.stats(),
+        "agora_voice_sessions": agora_voice_service.sessions.stats(),
+        "voice_socket": voice_socket_service.stats()
+    }
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -52,6 +52,11 @@ class User(BaseModel):
     email: str
     created_at: datetime
 
+class AuthenticatedUser(BaseModel):
+    id: str
+    email: Optional[str] = None
+    role: Optional[str] = None
+
 # Document Models
 class DocumentUpload(BaseModel):
     title: str
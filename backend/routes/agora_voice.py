@@ -168,7 +168,7 @@ async def get_active_agora_sessions(current_user: User = Depends(get_current_use
     Get active Agora voice sessions
     """
     try:
-        sessions = agora_voice_service.get_active_sessions()
+        sessions = await agora_voice_service.get_active_sessions()
         return {
             "status": "success",
             **sessions
@@ -187,15 +187,15 @@ async def get_agora_session_status(
     Get Agora voice session status
     """
     try:
-        if session_id in agora_voice_service.active_voice_sessions:
-            session = agora_voice_service.active_voice_sessions[session_id]
+        session = await agora_voice_service.get_session(session_id)
+        if session:
             return {
                 "status": "active",
                 "session_id": session_id,
                 "voice_enabled": session.get("voice_enabled", False),
                 "agora_connected": session.get("agora_connected", False),
-                "created_at": session.get("created_at").isoformat() if session.get("created_at") else None,
-                "message_count": len(session.get("conversation_context", []))
+                "created_at": session.get("created_at"),
+                "message_count": session.get("message_count", 0)
             }
         else:
             return {
@@ -1,18 +1,26 @@
-from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form
+from fastapi import APIRouter, HTTPException, Depends, UploadFile, File, Form, Request, Response
+from fastapi.responses import JSONResponse
+from typing import Optional
 from routes.auth import get_current_user
 from services.document_service import document_service
+from services.ingestion_service import ingestion_service
+from utils.config import MAX_UPLOAD_SIZE_MB
+from utils.listing_cache import listing_cache, etag_matches
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/documents", tags=["documents"])
 
-@router.post("/upload")
+CHUNK_STRATEGIES = ["token", "sentence", "paragraph", "heading"]
+
+@router.post("/upload", status_code=202)
 async def upload_document(
     file: UploadFile = File(...),
     title: str = Form(...),
+    chunk_strategy: Optional[str] = Form(None),
     current_user = Depends(get_current_user)
 ):
-    """Upload and process a document"""
+    """Upload a document and queue it for background processing"""
     try:
         # Comprehensive file validation
         if not file.filename:
@@ -33,8 +41,8 @@ async def upload_document(
         if not file.size:
             raise HTTPException(status_code=400, detail="Empty file not allowed")
         
-        if file.size > 10 * 1024 * 1024:  # 10MB limit
-            raise HTTPException(status_code=400, detail="File size too large. Maximum 10MB allowed")
+        if file.size > MAX_UPLOAD_SIZE_MB * 1024 * 1024:
+            raise HTTPException(status_code=400, detail=f"File size too large. Maximum {MAX_UPLOAD_SIZE_MB}MB allowed")
         
         # Validate content type
         allowed_content_types = ['application/pdf']
@@ -53,37 +61,70 @@ async def upload_document(
         if any(char in title for char in ['<', '>', '"', "'", '&']):
             raise HTTPException(status_code=400, detail="Document title contains invalid characters")
         
-        result = await document_service.upload_and_process_document(
+        if chunk_strategy and chunk_strategy not in CHUNK_STRATEGIES:
+            raise HTTPException(status_code=400, detail=f"Invalid chunk strategy. Use one of: {', '.join(CHUNK_STRATEGIES)}")
+        
+        job = await ingestion_service.submit_upload(
             file=file,
             title=title,
-            user_id=current_user.id
+            user_id=current_user.id,
+            chunk_strategy=chunk_strategy
         )
         
         return {
-            "message": "Document uploaded and processed successfully",
-            "document": result
+            "message": "Document uploaded and queued for processing",
+            "job": job
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Document upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}")
+async def get_ingestion_job(
+    job_id: str,
+    current_user = Depends(get_current_user)
+):
+    """Get per-stage progress of a document ingestion job"""
+    job = await ingestion_service.get_job(job_id, current_user.id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {"job": job}
+
+def _listing_response(request: Request, key: str, value, etag: str) -> Response:
+    """JSON listing with its ETag, or 304 when the client already has it"""
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if value is None or etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({key: value}, headers=headers)
+
 @router.get("/")
-async def get_documents(current_user = Depends(get_current_user)):
+async def get_documents(request: Request, current_user = Depends(get_current_user)):
     """Get all documents for the current user"""
     try:
-        documents = await document_service.get_user_documents(current_user.id)
-        return {"documents": documents}
+        # A matching If-None-Match is answered from the cache without loading anything
+        etag = await listing_cache.match(current_user.id, "documents", request.headers.get("if-none-match"))
+        if etag:
+            return _listing_response(request, "documents", None, etag)
+        
+        documents, etag = await document_service.get_user_documents(current_user.id)
+        return _listing_response(request, "documents", documents, etag)
     except Exception as e:
         logger.error(f"Get documents error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/topics")
-async def get_topics(current_user = Depends(get_current_user)):
+async def get_topics(request: Request, current_user = Depends(get_current_user)):
     """Get all topics for the current user"""
     try:
-        topics = await document_service.get_user_topics(current_user.id)
-        return {"topics": topics}
+        etag = await listing_cache.match(current_user.id, "topics", request.headers.get("if-none-match"))
+        if etag:
+            return _listing_response(request, "topics", None, etag)
+        
+        topics, etag = await document_service.get_user_topics(current_user.id)
+        return _listing_response(request, "topics", topics, etag)
     except Exception as e:
         logger.error(f"Get topics error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
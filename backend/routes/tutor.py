@@ -1,8 +1,12 @@
-from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form
+from fastapi import APIRouter, HTTPException, Depends, File, UploadFile, Form, WebSocket
+from fastapi.responses import StreamingResponse
 from routes.auth import get_current_user
 from services.tutor_service import tutor_service
 from services.voice_tutor_service import voice_tutor_service
+from services.voice_socket_service import voice_socket_service
 from models.schemas import TutorMessage, VoiceTextMessage
+import base64
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -34,6 +38,22 @@ async def send_message(
         logger.error(f"Send message error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/message/stream")
+async def send_message_stream(
+    message: TutorMessage,
+    current_user = Depends(get_current_user)
+):
+    """Send a message to the tutor and stream the response as NDJSON events"""
+    async def event_stream():
+        async for event in tutor_service.process_message_stream(message, current_user.id):
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/end-session/{session_id}")
 async def end_session(
     session_id: str,
@@ -89,19 +109,11 @@ async def process_voice_message(
         # Read audio data
         audio_data = await audio_file.read()
         
-        # Determine audio format from filename
-        audio_format = "wav"
-        if audio_file.filename:
-            if audio_file.filename.endswith('.mp3'):
-                audio_format = "mp3"
-            elif audio_file.filename.endswith('.m4a'):
-                audio_format = "m4a"
-        
         # Process through voice pipeline
         response = await voice_tutor_service.process_voice_message(
             session_id, 
             audio_data, 
-            audio_format
+            _audio_format(audio_file.filename)
         )
         
         return response
@@ -109,6 +121,52 @@ async def process_voice_message(
         logger.error(f"Process voice message error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/voice/process-audio/stream")
+async def process_voice_message_stream(
+    session_id: str = Form(...),
+    audio_file: UploadFile = File(...),
+    current_user = Depends(get_current_user)
+):
+    """Process a voice message and stream transcript, tokens and per-sentence audio as NDJSON events"""
+    # Check ownership before the stream starts so failures get a real status code
+    try:
+        await voice_tutor_service.get_owned_session(session_id, current_user.id)
+    except LookupError:
+        raise HTTPException(status_code=404, detail="Session not found")
+    except PermissionError:
+        raise HTTPException(status_code=403, detail="Session belongs to another user")
+    
+    audio_data = await audio_file.read()
+    audio_format = _audio_format(audio_file.filename)
+    
+    async def event_stream():
+        async for event in voice_tutor_service.process_voice_message_stream(
+            session_id, current_user.id, audio_data, audio_format
+        ):
+            if event["type"] == "audio":
+                event = {**event, "audio": base64.b64encode(event["audio"]).decode()}
+            yield json.dumps(event) + "\n"
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/voice/ws/{session_id}")
+async def voice_socket(websocket: WebSocket, session_id: str):
+    """Persistent voice connection: binary audio frames in, JSON events and binary audio frames out"""
+    await voice_socket_service.serve(websocket, session_id)
+
+def _audio_format(filename: str) -> str:
+    """Determine audio format from an upload filename"""
+    if filename:
+        if filename.endswith('.mp3'):
+            return "mp3"
+        if filename.endswith('.m4a'):
+            return "m4a"
+    return "wav"
+
 @router.post("/voice/process-text")
 async def process_text_in_voice_session(
     payload: VoiceTextMessage,
@@ -144,7 +202,7 @@ async def get_active_voice_sessions(
 ):
     """Get active voice sessions for current user"""
     try:
-        sessions = voice_tutor_service.get_active_sessions(current_user.id)
+        sessions = await voice_tutor_service.get_active_sessions(current_user.id)
         return {"sessions": sessions}
     except Exception as e:
         logger.error(f"Get active voice sessions error: {e}")
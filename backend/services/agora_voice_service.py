@@ -13,6 +13,8 @@ import uuid
 from services.stt_service import stt_service
 from services.tts_service import tts_service
 from services.tutor_service import tutor_service
+from services.session_memory import session_memory
+from utils.session_registry import create_session_registry
 from utils.config import AGORA_APP_ID, AGORA_APP_CERTIFICATE
 
 logger = logging.getLogger(__name__)
@@ -21,9 +23,8 @@ class AgoraVoiceService:
     """Service for handling Agora-based real-time voice conversations"""
     
     def __init__(self):
-        self.active_voice_sessions = {}  # session_id -> session_data
-        self.voice_buffers = {}  # session_id -> audio_buffer
-        self.processing_queue = {}  # session_id -> processing_status
+        # Active Agora sessions, shared across workers and expired after inactivity
+        self.sessions = create_session_registry("agora_voice")
         
     async def start_agora_voice_session(self, user_id: str, session_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -40,23 +41,15 @@ class AgoraVoiceService:
             session_id = session_data["session_id"]
             
             # Initialize voice session
-            self.active_voice_sessions[session_id] = {
+            await self.sessions.create(session_id, {
                 "user_id": user_id,
-                "session_id": session_id,
                 "channel_name": session_data["channel_name"],
                 "agora_tokens": session_data["agora_tokens"],
-                "created_at": datetime.utcnow(),
+                "created_at": datetime.utcnow().isoformat(),
                 "voice_enabled": True,
                 "processing_status": "ready",
-                "conversation_context": []
-            }
-            
-            # Initialize voice buffer for this session
-            self.voice_buffers[session_id] = {
-                "incoming_audio": [],
-                "processing": False,
-                "last_activity": datetime.utcnow()
-            }
+                "message_count": 0
+            })
             
             logger.info(f"Agora voice session initialized: {session_id}")
             
@@ -93,10 +86,10 @@ class AgoraVoiceService:
             Processing result with AI response
         """
         try:
-            if session_id not in self.active_voice_sessions:
+            session = await self.sessions.get(session_id)
+            if not session:
                 raise Exception("Invalid voice session")
             
-            session = self.active_voice_sessions[session_id]
             user_id = session["user_id"]
             
             logger.info(f"Processing Agora voice stream for session: {session_id}")
@@ -120,22 +113,8 @@ class AgoraVoiceService:
             # Step 3: Get AI response
             logger.info("Generating AI response...")
             
-            # Add to conversation context
-            session["conversation_context"].append({
-                "role": "user",
-                "content": user_text,
-                "timestamp": datetime.utcnow().isoformat()
-            })
-            
-            # Get AI response using tutor service
-            ai_response = await self._get_ai_response(user_text, user_id, session["conversation_context"])
-            
-            # Add AI response to context
-            session["conversation_context"].append({
-                "role": "assistant", 
-                "content": ai_response,
-                "timestamp": datetime.utcnow().isoformat()
-            })
+            # Get AI response using tutor service (conversation memory is kept per session there)
+            ai_response = await self._get_ai_response(user_text, user_id, session_id)
             
             # Step 4: Text-to-Speech for Agora streaming
             logger.info("Converting AI response to speech...")
@@ -163,6 +142,8 @@ class AgoraVoiceService:
                 # Encode for JSON transport
                 result["agora_streaming"]["audio_data"] = base64.b64encode(streaming_audio).decode('utf-8')
             
+            await self.sessions.increment(session_id, "message_count")
+            
             logger.info(f"Agora voice processing completed for session: {session_id}")
             return result
             
@@ -207,12 +188,12 @@ class AgoraVoiceService:
             logger.error(f"Error preparing audio for Agora: {e}")
             return audio_data
     
-    async def _get_ai_response(self, user_message: str, user_id: str, context: list) -> str:
+    async def _get_ai_response(self, user_message: str, user_id: str, session_id: str) -> str:
         """Get AI response using the tutor service"""
         try:
             # Use the existing tutor service for consistent AI responses
-            response = await tutor_service.get_response(user_message, user_id)
-            return response.get("response", "I'm sorry, I couldn't process your request.")
+            response = await tutor_service.generate_reply(user_message, user_id, session_id)
+            return response or "I'm sorry, I couldn't process your request."
             
         except Exception as e:
             logger.error(f"Error getting AI response: {e}")
@@ -221,11 +202,11 @@ class AgoraVoiceService:
     async def handle_agora_user_joined(self, session_id: str, user_id: str) -> Dict[str, Any]:
         """Handle when user joins Agora channel"""
         try:
-            if session_id in self.active_voice_sessions:
-                session = self.active_voice_sessions[session_id]
-                session["agora_connected"] = True
-                session["connected_at"] = datetime.utcnow()
-                
+            session = await self.sessions.update(session_id, {
+                "agora_connected": True,
+                "connected_at": datetime.utcnow().isoformat()
+            })
+            if session:
                 logger.info(f"User {user_id} joined Agora channel for session: {session_id}")
                 
                 return {
@@ -243,11 +224,11 @@ class AgoraVoiceService:
     async def handle_agora_user_left(self, session_id: str, user_id: str) -> Dict[str, Any]:
         """Handle when user leaves Agora channel"""
         try:
-            if session_id in self.active_voice_sessions:
-                session = self.active_voice_sessions[session_id]
-                session["agora_connected"] = False
-                session["disconnected_at"] = datetime.utcnow()
-                
+            session = await self.sessions.update(session_id, {
+                "agora_connected": False,
+                "disconnected_at": datetime.utcnow().isoformat()
+            })
+            if session:
                 logger.info(f"User {user_id} left Agora channel for session: {session_id}")
                 
                 return {
@@ -264,16 +245,9 @@ class AgoraVoiceService:
     async def end_agora_voice_session(self, session_id: str) -> bool:
         """End Agora voice session and cleanup"""
         try:
-            if session_id in self.active_voice_sessions:
-                session = self.active_voice_sessions[session_id]
-                session["ended_at"] = datetime.utcnow()
-                
-                # Cleanup
-                del self.active_voice_sessions[session_id]
-                if session_id in self.voice_buffers:
-                    del self.voice_buffers[session_id]
-                if session_id in self.processing_queue:
-                    del self.processing_queue[session_id]
+            session = await self.sessions.get(session_id)
+            if session and await self.sessions.delete(session_id):
+                session_memory.discard(session["user_id"], session_id)
                 
                 logger.info(f"Agora voice session ended: {session_id}")
                 return True
@@ -285,11 +259,16 @@ class AgoraVoiceService:
             logger.error(f"Error ending Agora voice session: {e}")
             return False
     
-    def get_active_sessions(self) -> Dict[str, Any]:
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Get an active Agora voice session"""
+        return await self.sessions.get(session_id)
+    
+    async def get_active_sessions(self) -> Dict[str, Any]:
         """Get all active Agora voice sessions"""
+        sessions = await self.sessions.list()
         return {
-            "active_sessions": len(self.active_voice_sessions),
-            "sessions": list(self.active_voice_sessions.keys())
+            "active_sessions": len(sessions),
+            "sessions": [session["session_id"] for session in sessions]
         }
 
 # Global service instance
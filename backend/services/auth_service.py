@@ -1,5 +1,9 @@
 from utils.database import get_supabase_client, create_user_record
-from models.schemas import UserCreate, UserLogin
+from utils.token_verifier import token_verifier
+from utils.config import AUTH_REVALIDATE_SECONDS
+from models.schemas import UserCreate, UserLogin, AuthenticatedUser
+from jose import jwt, JWTError
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
@@ -7,6 +11,7 @@ logger = logging.getLogger(__name__)
 class AuthService:
     def __init__(self):
         self.supabase = get_supabase_client()
+        self._revalidations = set()
     
     async def signup(self, user_data: UserCreate) -> dict:
         """Register a new user"""
@@ -58,13 +63,51 @@ class AuthService:
             logger.error(f"Logout error: {e}")
             raise
     
-    async def get_user_from_token(self, access_token: str) -> dict:
-        """Get user from access token"""
+    async def get_user_from_token(self, access_token: str):
+        """Get user from access token, verifying it locally when a JWT secret or JWKS is configured"""
         try:
-            user_response = self.supabase.auth.get_user(access_token)
-            return user_response.user
+            entry = token_verifier.get_cached(access_token)
+            if entry is None:
+                entry = await self._verify_token(access_token)
+            
+            if token_verifier.enabled and AUTH_REVALIDATE_SECONDS > 0 \
+                    and token_verifier.due_for_revalidation(access_token, AUTH_REVALIDATE_SECONDS):
+                task = asyncio.create_task(self._revalidate(access_token, entry["token_expires_at"]))
+                self._revalidations.add(task)
+                task.add_done_callback(self._revalidations.discard)
+            
+            return entry["user"]
+        except JWTError as e:
+            logger.warning(f"Token validation error: {e}")
+            return None
         except Exception as e:
             logger.error(f"Token validation error: {e}")
             raise
+    
+    async def _verify_token(self, access_token: str) -> dict:
+        """Verify a token and cache the resulting user"""
+        if token_verifier.enabled:
+            claims = await token_verifier.verify(access_token)
+            user = AuthenticatedUser(id=claims["sub"], email=claims.get("email"), role=claims.get("role"))
+            return token_verifier.cache(access_token, user, claims.get("exp"))
+        
+        # No local key configured: ask Supabase Auth
+        user_response = await asyncio.to_thread(self.supabase.auth.get_user, access_token)
+        if not user_response or not user_response.user:
+            raise JWTError("Token rejected by Supabase Auth")
+        return token_verifier.cache(access_token, user_response.user, jwt.get_unverified_claims(access_token).get("exp"))
+    
+    async def _revalidate(self, access_token: str, expires_at: float = None):
+        """Check a locally verified token with Supabase Auth, revoking it if rejected"""
+        try:
+            user_response = await asyncio.to_thread(self.supabase.auth.get_user, access_token)
+            if user_response and user_response.user:
+                return
+        except Exception as e:
+            if getattr(e, "status", None) not in (401, 403):
+                logger.error(f"Token revalidation error: {e}")
+                return
+        logger.info("Revoking access token rejected by Supabase Auth")
+        token_verifier.revoke(access_token, expires_at)
 
 auth_service = AuthService()
@@ -1,10 +1,21 @@
-import requests
+import asyncio
+import httpx
+import json
 import uuid
 from utils.database import get_supabase_admin
+from services.quiz_service import quiz_service
+from utils.write_batch import WriteBatch
+from utils.semantic_cache import semantic_cache
+from utils.listing_cache import listing_cache
 from utils.chroma_client import chroma_client
-from utils.mistral_client import ai_client
-from utils.config import PARSING_SERVICE_URL
-from models.schemas import DocumentUpload
+from utils.mistral_client import ai_client, parse_json_array
+from utils.config import (
+    PARSING_SERVICE_URL,
+    PARSING_SERVICE_TIMEOUT,
+    CHUNK_STRATEGY,
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,27 +24,56 @@ class DocumentService:
     def __init__(self):
         self.supabase = get_supabase_admin()
     
-    async def upload_and_process_document(self, file, title: str, user_id: str) -> dict:
-        """Upload and process a document"""
+    async def parse_document(self, file_path: str, filename: str, chunk_strategy: str = None) -> dict:
+        """Stream a stored upload through the parsing service and collect its chunks"""
         try:
-            # Send file to parsing service
-            files = {'file': (file.filename, file.file, file.content_type)}
-            response = requests.post(f"{PARSING_SERVICE_URL}/parse-pdf", files=files)
-            
-            if response.status_code != 200:
-                raise Exception(f"Parsing service error: {response.json().get('error', 'Unknown error')}")
+            chunk_options = {
+                "strategy": chunk_strategy or CHUNK_STRATEGY,
+                "max_tokens": str(CHUNK_MAX_TOKENS),
+                "overlap_tokens": str(CHUNK_OVERLAP_TOKENS)
+            }
+            chunks = []
+            excerpt_parts, excerpt_length = [], 0
             
-            parsed_data = response.json()
-            chunks = parsed_data['chunks']
+            async with httpx.AsyncClient(timeout=httpx.Timeout(PARSING_SERVICE_TIMEOUT)) as client:
+                with open(file_path, "rb") as f:
+                    files = {'file': (filename, f, "application/pdf")}
+                    async with client.stream("POST", f"{PARSING_SERVICE_URL}/parse-pdf/stream", files=files, data=chunk_options) as response:
+                        if response.status_code != 200:
+                            await response.aread()
+                            raise Exception(f"Parsing service error: {response.json().get('error', 'Unknown error')}")
+                        
+                        # NDJSON chunk records arrive as pages are extracted
+                        async for line in response.aiter_lines():
+                            if not line.strip():
+                                continue
+                            
+                            record = json.loads(line)
+                            if record["type"] == "chunk":
+                                chunks.append(record["text"])
+                                if excerpt_length < 2000:
+                                    excerpt_parts.append(record["text"])
+                                    excerpt_length += len(record["text"])
+                            elif record["type"] == "error":
+                                raise Exception(f"Parsing service error: {record['error']}")
             
-            # Generate embeddings for chunks
-            embeddings = await ai_client.generate_embeddings(chunks)
+            if not chunks:
+                raise Exception("Parsing service error: No text found in PDF")
             
-            # Extract topics using LLM
-            topics = await self._extract_topics(parsed_data['text'])
+            return {
+                "chunks": chunks,
+                "text_excerpt": "\n".join(excerpt_parts)[:2000]
+            }
             
-            # Generate unique IDs for chunks
-            chunk_ids = [f"{user_id}_{uuid.uuid4()}" for _ in chunks]
+        except Exception as e:
+            logger.error(f"Error parsing document: {e}")
+            raise
+    
+    async def index_chunks(self, document_id: str, user_id: str, title: str, chunks: list, embeddings: list, topics: list):
+        """Store chunk embeddings in ChromaDB"""
+        try:
+            # Deterministic IDs keep a resumed ingestion from duplicating chunks
+            chunk_ids = [f"{user_id}_{document_id}_{i}" for i in range(len(chunks))]
             
             # Prepare metadata for ChromaDB
             # Convert topics list to comma-separated string for ChromaDB
@@ -41,6 +81,7 @@ class DocumentService:
             metadatas = [
                 {
                     "user_id": str(user_id),
+                    "document_id": str(document_id),
                     "document_title": str(title),
                     "chunk_index": str(i),
                     "topics": topics_str
@@ -49,35 +90,54 @@ class DocumentService:
             ]
             
             # Store embeddings in ChromaDB
-            chroma_client.add_documents(
+            await chroma_client.add_documents(
                 documents=chunks,
                 embeddings=embeddings,
                 metadatas=metadatas,
                 ids=chunk_ids
             )
             
-            # Store document metadata in Supabase
-            document_id = str(uuid.uuid4())
+            # Cached tutor answers predate the new material
+            if semantic_cache:
+                await semantic_cache.invalidate_user(user_id)
+            
+        except Exception as e:
+            logger.error(f"Error indexing document chunks: {e}")
+            raise
+    
+    async def save_document(self, document_id: str, user_id: str, title: str, filename: str, topics: list, chunk_count: int) -> dict:
+        """Store document metadata and topics in Supabase"""
+        try:
+            # The LLM can repeat a topic with different casing or spacing; one row per topic
+            unique_topics = {}
+            for topic in topics:
+                unique_topics.setdefault(quiz_service.topic_key(topic), topic)
+            topics = list(unique_topics.values())
+            
             document_record = {
                 "id": document_id,
                 "user_id": user_id,
                 "title": title,
-                "filename": file.filename,
+                "filename": filename,
                 "topics": topics,
-                "chunk_count": len(chunks)
+                "chunk_count": chunk_count
             }
             
-            result = self.supabase.table("documents").insert(document_record).execute()
-            
-            # Store topics in topics table
-            for topic in topics:
-                topic_record = {
-                    "id": str(uuid.uuid4()),
+            topic_records = [
+                {
+                    "id": str(uuid.uuid5(uuid.UUID(document_id), key)),
                     "user_id": user_id,
                     "document_id": document_id,
                     "name": topic
                 }
-                self.supabase.table("topics").insert(topic_record).execute()
+                for key, topic in unique_topics.items()
+            ]
+            
+            # Upserts keep a resumed ingestion idempotent; all topics go in one request
+            async with WriteBatch(self.supabase) as batch:
+                batch.upsert("documents", document_record)
+                batch.upsert("topics", topic_records)
+            await listing_cache.invalidate_user(user_id)
             
             logger.info(f"Document processed successfully: {title}")
             
@@ -85,11 +145,11 @@ class DocumentService:
                 "document_id": document_id,
                 "title": title,
                 "topics": topics,
-                "chunk_count": len(chunks)
+                "chunk_count": chunk_count
             }
             
         except Exception as e:
-            logger.error(f"Error processing document: {e}")
+            logger.error(f"Error saving document: {e}")
             raise
     
     async def _extract_topics(self, text: str) -> list:
@@ -105,9 +165,8 @@ class DocumentService:
             messages = [{"role": "user", "content": prompt}]
             response = await ai_client.chat_completion(messages, max_tokens=200)
             
-            # Parse JSON response
-            import json
-            topics = json.loads(response.strip())
+            # Parse JSON response, tolerating fences and surrounding prose
+            topics = parse_json_array(response)
             
             # Ensure topics is a list and contains only strings
             if isinstance(topics, list):
@@ -123,25 +182,35 @@ class DocumentService:
             # Fallback to generic topic
             return ["General Study Material"]
     
-    async def get_user_documents(self, user_id: str) -> list:
-        """Get all documents for a user"""
+    async def get_user_documents(self, user_id: str) -> tuple:
+        """Get all documents for a user along with the listing's ETag"""
         try:
-            result = self.supabase.table("documents").select("*").eq("user_id", user_id).execute()
-            return result.data
+            return await listing_cache.get(user_id, "documents", lambda: self._load_user_documents(user_id))
         except Exception as e:
             logger.error(f"Error getting user documents: {e}")
             raise
     
-    async def get_user_topics(self, user_id: str) -> list:
-        """Get all topics for a user"""
+    async def get_user_topics(self, user_id: str) -> tuple:
+        """Get all topics for a user along with the listing's ETag"""
         try:
-            result = self.supabase.table("topics").select("name").eq("user_id", user_id).execute()
-            topics = list(set([item["name"] for item in result.data]))
-            return topics
+            return await listing_cache.get(user_id, "topics", lambda: self._load_user_topics(user_id))
         except Exception as e:
             logger.error(f"Error getting user topics: {e}")
             raise
     
+    async def _load_user_documents(self, user_id: str) -> list:
+        result = await asyncio.to_thread(
+            lambda: self.supabase.table("documents").select("*").eq("user_id", user_id).order("created_at", desc=True).execute()
+        )
+        return result.data
+    
+    async def _load_user_topics(self, user_id: str) -> list:
+        result = await asyncio.to_thread(
+            lambda: self.supabase.table("topics").select("name").eq("user_id", user_id).execute()
+        )
+        # Sorted so the listing (and its ETag) is stable between loads
+        return sorted(set(item["name"] for item in result.data))
+    
     async def delete_document(self, document_id: str, user_id: str) -> bool:
         """Delete a document and its associated data"""
         try:
@@ -159,8 +228,10 @@ class DocumentService:
             
             # Delete from ChromaDB using document_title (as stored in metadata)
             try:
-                chroma_client.delete_user_documents(user_id, document_title)
+                await chroma_client.delete_user_documents(user_id, document_title)
                 logger.info(f"Successfully deleted document chunks from ChromaDB")
+                if semantic_cache:
+                    await semantic_cache.invalidate_user(user_id)
             except Exception as chroma_error:
                 logger.error(f"Error deleting from ChromaDB: {chroma_error}")
                 raise Exception(f"Failed to delete document from vector database: {str(chroma_error)}")
@@ -174,6 +245,7 @@ class DocumentService:
                 # Delete document record
                 doc_delete_result = self.supabase.table("documents").delete().eq("id", document_id).eq("user_id", user_id).execute()
                 logger.info(f"Deleted {len(doc_delete_result.data) if doc_delete_result.data else 0} document records")
+                await listing_cache.invalidate_user(user_id)
                 
             except Exception as supabase_error:
                 logger.error(f"Error deleting from Supabase: {supabase_error}")
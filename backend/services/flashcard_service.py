@@ -1,5 +1,6 @@
 import uuid
 from utils.database import get_supabase_admin
+from utils.write_batch import progress_writer
 from utils.chroma_client import chroma_client
 from utils.mistral_client import ai_client
 from models.schemas import FlashcardRequest, FlashcardSet
@@ -17,7 +18,7 @@ class FlashcardService:
             # Get relevant chunks from ChromaDB
             query_embedding = await ai_client.generate_embeddings([request.topic])
             
-            results = chroma_client.query_documents(
+            results = await chroma_client.query_documents(
                 query_embeddings=query_embedding,
                 n_results=10,
                 where={"user_id": user_id}
@@ -26,12 +27,9 @@ class FlashcardService:
             if not results['documents'][0]:
                 raise Exception(f"No study material found for topic: {request.topic}")
             
-            # Combine relevant chunks
-            context = "\n\n".join(results['documents'][0])
-            
-            # Generate flashcards using LLM
-            cards = await ai_client.generate_flashcards(
-                context=context,
+            # Generate flashcards using LLM, in parallel over groups of chunks
+            cards = await ai_client.generate_flashcards_sharded(
+                context_chunks=results['documents'][0],
                 topic=request.topic,
                 num_cards=request.num_cards
             )
@@ -45,8 +43,6 @@ class FlashcardService:
                 "cards": cards
             }
             
-            self.supabase.table("flashcard_sets").insert(flashcard_record).execute()
-            
             # Log progress
             progress_record = {
                 "id": str(uuid.uuid4()),
@@ -59,7 +55,8 @@ class FlashcardService:
                 }
             }
             
-            self.supabase.table("progress_logs").insert(progress_record).execute()
+            self.supabase.table("flashcard_sets").insert(flashcard_record).execute()
+            progress_writer.insert("progress_logs", progress_record)
             
             flashcard_set = FlashcardSet(
                 id=set_id,
@@ -0,0 +1,213 @@
+import asyncio
+import os
+import shutil
+import uuid
+from typing import Optional
+import logging
+
+from utils.config import INGESTION_DB_PATH, INGESTION_UPLOAD_DIR, INGESTION_WORKERS, INGESTION_LEASE_SECONDS
+from utils.job_queue import JobQueue
+from utils.mistral_client import ai_client
+from services.document_service import document_service
+from services.quiz_service import quiz_service
+
+logger = logging.getLogger(__name__)
+
+INGESTION_STAGES = ["parse", "embed", "topics", "index", "save"]
+
+class IngestionService:
+    """Runs document uploads through the ingestion pipeline in background workers"""
+
+    def __init__(self):
+        self.queue = JobQueue(INGESTION_DB_PATH, INGESTION_LEASE_SECONDS)
+        self.upload_dir = INGESTION_UPLOAD_DIR
+        os.makedirs(self.upload_dir, exist_ok=True)
+        self._workers = []
+        self._wakeup = asyncio.Event()
+
+    async def start(self):
+        """Resume jobs abandoned by dead processes and start the worker pool"""
+        requeued = await asyncio.to_thread(self.queue.requeue_expired)
+        if requeued:
+            logger.info(f"Requeued {requeued} interrupted ingestion jobs")
+
+        for index in range(INGESTION_WORKERS):
+            self._workers.append(asyncio.create_task(self._worker(index)))
+        logger.info(f"Started {INGESTION_WORKERS} ingestion workers")
+
+    async def stop(self):
+        """Stop the worker pool; running jobs resume on next start"""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def submit_upload(self, file, title: str, user_id: str, chunk_strategy: str = None) -> dict:
+        """Store an uploaded file and queue it for ingestion"""
+        try:
+            job_id = str(uuid.uuid4())
+            file_path = os.path.join(self.upload_dir, f"{job_id}.pdf")
+
+            def save_upload():
+                with open(file_path, "wb") as out:
+                    shutil.copyfileobj(file.file, out)
+
+            await asyncio.to_thread(save_upload)
+
+            payload = {
+                "document_id": str(uuid.uuid4()),
+                "title": title,
+                "filename": file.filename,
+                "file_path": file_path,
+                "chunk_strategy": chunk_strategy
+            }
+            job = await asyncio.to_thread(self.queue.enqueue, job_id, user_id, "document_ingestion", INGESTION_STAGES, payload)
+            self._wakeup.set()
+
+            logger.info(f"Queued ingestion job {job_id} for document: {title}")
+            return self._public_view(job)
+
+        except Exception as e:
+            logger.error(f"Error queueing document upload: {e}")
+            raise
+
+    async def get_job(self, job_id: str, user_id: str) -> Optional[dict]:
+        """Get the progress of a user's ingestion job"""
+        job = await asyncio.to_thread(self.queue.get, job_id, user_id)
+        return self._public_view(job) if job else None
+
+    async def _worker(self, index: int):
+        while True:
+            try:
+                self._wakeup.clear()
+                job = await asyncio.to_thread(self.queue.claim_next)
+                if job is None:
+                    # Uploads set the wakeup event; the timeout is a fallback poll that
+                    # also picks up jobs whose process died mid-run
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=5)
+                    except asyncio.TimeoutError:
+                        await asyncio.to_thread(self.queue.requeue_expired)
+                    continue
+
+                runner = asyncio.create_task(self._run_job(job))
+                heartbeat = asyncio.create_task(self._heartbeat(job["id"], runner))
+                try:
+                    await asyncio.wait([runner])
+                finally:
+                    heartbeat.cancel()
+                    runner.cancel()
+
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Ingestion worker {index} error: {e}")
+                await asyncio.sleep(1)
+
+    async def _heartbeat(self, job_id: str, runner: asyncio.Task):
+        """Renew the job's lease while it runs, abandoning the job if another process took it over"""
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, job_id):
+                logger.warning(f"Lost lease on ingestion job {job_id}; abandoning it")
+                runner.cancel()
+                return
+
+    async def _run_job(self, job: dict):
+        """Run the remaining stages of a job, persisting progress after each"""
+        job_id = job["id"]
+        user_id = job["user_id"]
+        payload = job["payload"]
+        state = job["state"]
+        stages = job["stages"]
+        embeddings = None
+        current_stage = None
+
+        async def update_stage(stage: str, status: str, **fields):
+            await asyncio.to_thread(self.queue.update_stage, job_id, stage, status, **fields)
+
+        async def embed_progress(completed: int, total: int):
+            await update_stage("embed", "running", completed=completed, total=total)
+
+        try:
+            for stage in INGESTION_STAGES:
+                if stages[stage]["status"] == "completed":
+                    continue
+
+                current_stage = stage
+                await update_stage(stage, "running")
+
+                if stage == "parse":
+                    parsed = await document_service.parse_document(
+                        payload["file_path"], payload["filename"], payload.get("chunk_strategy")
+                    )
+                    state.update(parsed)
+                    await update_stage(stage, "completed", state=state, chunk_count=len(parsed["chunks"]))
+
+                elif stage == "embed":
+                    embeddings = await ai_client.generate_embeddings_batched(state["chunks"], progress_callback=embed_progress)
+                    await update_stage(stage, "completed")
+
+                elif stage == "topics":
+                    state["topics"] = await document_service._extract_topics(state["text_excerpt"])
+                    await update_stage(stage, "completed", state=state)
+
+                elif stage == "index":
+                    if embeddings is None:
+                        # Embeddings are not persisted; after a restart they come back from the embedding cache
+                        embeddings = await ai_client.generate_embeddings_batched(state["chunks"])
+                    await document_service.index_chunks(
+                        payload["document_id"], user_id, payload["title"],
+                        state["chunks"], embeddings, state["topics"]
+                    )
+                    await update_stage(stage, "completed")
+
+                elif stage == "save":
+                    await document_service.save_document(
+                        payload["document_id"], user_id, payload["title"], payload["filename"],
+                        state["topics"], len(state["chunks"])
+                    )
+                    await update_stage(stage, "completed")
+
+            await asyncio.to_thread(self.queue.complete, job_id, {
+                "document_id": payload["document_id"],
+                "title": payload["title"],
+                "topics": state["topics"],
+                "chunk_count": len(state["chunks"])
+            })
+            logger.info(f"Ingestion job {job_id} completed")
+            
+            # Pre-generate quiz questions for the new topics
+            quiz_service.prefill_pools(user_id, state["topics"], payload["document_id"])
+
+        except Exception as e:
+            logger.error(f"Ingestion job {job_id} failed at stage {current_stage}: {e}")
+            if current_stage:
+                await update_stage(current_stage, "failed")
+            await asyncio.to_thread(self.queue.fail, job_id, str(e))
+
+        self._remove_upload(payload["file_path"])
+
+    def _remove_upload(self, file_path: str):
+        try:
+            if os.path.exists(file_path):
+                os.unlink(file_path)
+        except OSError as e:
+            logger.warning(f"Could not remove upload {file_path}: {e}")
+
+    def _public_view(self, job: dict) -> dict:
+        """Job fields safe to return to the client"""
+        completed = sum(1 for stage in job["stages"].values() if stage["status"] == "completed")
+        return {
+            "job_id": job["id"],
+            "status": job["status"],
+            "title": job["payload"].get("title"),
+            "stages": job["stages"],
+            "progress": round(completed / len(job["stages"]) * 100),
+            "document": job["result"],
+            "error": job["error"],
+            "created_at": job["created_at"],
+            "updated_at": job["updated_at"]
+        }
+
+ingestion_service = IngestionService()
@@ -1,10 +1,15 @@
+from postgrest.exceptions import APIError
 from utils.database import get_supabase_admin
 from models.schemas import ProgressData
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Error codes for a function that has not been deployed (PostgREST schema cache, Postgres)
+MISSING_FUNCTION_CODES = ("PGRST202", "42883")
+
 class ProgressService:
     def __init__(self):
         self.supabase = get_supabase_admin()
@@ -13,20 +18,27 @@ class ProgressService:
         """Get comprehensive progress data for a user"""
         try:
             # Calculate date range
-            end_date = datetime.now()
+            end_date = datetime.now(timezone.utc)
             start_date = end_date - timedelta(days=days)
             
-            # Get quiz scores
-            quiz_scores = await self._get_quiz_scores(user_id, start_date, end_date)
-            
-            # Get tutor sessions
-            tutor_sessions = await self._get_tutor_sessions(user_id, start_date, end_date)
-            
-            # Get topics studied
-            topics_studied = await self._get_topics_studied(user_id, start_date, end_date)
-            
-            # Calculate total study time
-            total_study_time = await self._calculate_total_study_time(user_id, start_date, end_date)
+            try:
+                # One round trip: the database aggregates all four parts
+                result = await asyncio.to_thread(lambda: self.supabase.rpc("get_user_progress", {
+                    "p_user_id": user_id,
+                    "p_start": start_date.isoformat(),
+                    "p_end": end_date.isoformat()
+                }).execute())
+                return ProgressData(**result.data)
+            except APIError as e:
+                if e.code not in MISSING_FUNCTION_CODES:
+                    raise
+                logger.warning(f"get_user_progress RPC not deployed, querying tables directly: {e.message}")
+            
+            quiz_scores, tutor_sessions, (topics_studied, total_study_time) = await asyncio.gather(
+                self._get_quiz_scores(user_id, start_date, end_date),
+                self._get_tutor_sessions(user_id, start_date, end_date),
+                self._summarize_progress_logs(user_id, start_date, end_date)
+            )
             
             progress_data = ProgressData(
                 quiz_scores=quiz_scores,
@@ -44,10 +56,10 @@ class ProgressService:
     async def _get_quiz_scores(self, user_id: str, start_date: datetime, end_date: datetime) -> list:
         """Get quiz scores within date range"""
         try:
-            result = self.supabase.table("quiz_results").select("""
+            result = await asyncio.to_thread(lambda: self.supabase.table("quiz_results").select("""
                 score, total_questions, percentage, created_at,
                 quizzes(topic, difficulty)
-            """).eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).order("created_at").execute()
+            """).eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).order("created_at").execute())
             
             return result.data
         except Exception as e:
@@ -57,70 +69,38 @@ class ProgressService:
     async def _get_tutor_sessions(self, user_id: str, start_date: datetime, end_date: datetime) -> list:
         """Get tutor sessions within date range"""
         try:
-            result = self.supabase.table("tutor_sessions").select("*").eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).order("created_at").execute()
+            result = await asyncio.to_thread(lambda: self.supabase.table("tutor_sessions").select("*").eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).order("created_at").execute())
             
             return result.data
         except Exception as e:
             logger.error(f"Error getting tutor sessions: {e}")
             return []
     
-    async def _get_topics_studied(self, user_id: str, start_date: datetime, end_date: datetime) -> list:
-        """Get unique topics studied within date range"""
-        try:
-            result = self.supabase.table("progress_logs").select("topic").eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).execute()
-            
-            topics = list(set([log["topic"] for log in result.data if log["topic"]]))
-            return topics
-        except Exception as e:
-            logger.error(f"Error getting topics studied: {e}")
-            return []
-    
-    async def _calculate_total_study_time(self, user_id: str, start_date: datetime, end_date: datetime) -> int:
-        """Calculate total study time in seconds"""
+    async def _summarize_progress_logs(self, user_id: str, start_date: datetime, end_date: datetime) -> tuple:
+        """Get unique topics studied and total study time (seconds) from one scan of progress logs"""
         try:
-            result = self.supabase.table("progress_logs").select("duration").eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).execute()
+            result = await asyncio.to_thread(lambda: self.supabase.table("progress_logs").select("topic, duration").eq("user_id", user_id).gte("created_at", start_date.isoformat()).lte("created_at", end_date.isoformat()).execute())
             
-            total_time = sum([log["duration"] or 0 for log in result.data])
-            return total_time
+            topics = set()
+            total_time = 0
+            for log in result.data:
+                if log["topic"]:
+                    topics.add(log["topic"])
+                total_time += log["duration"] or 0
+            return list(topics), total_time
         except Exception as e:
-            logger.error(f"Error calculating study time: {e}")
-            return 0
+            logger.error(f"Error summarizing progress logs: {e}")
+            return [], 0
     
     async def get_learning_streaks(self, user_id: str) -> dict:
-        """Get learning streak information"""
+        """Get learning streak information from the daily activity rollup"""
         try:
-            # Get activity for the last 30 days
-            end_date = datetime.now()
-            start_date = end_date - timedelta(days=30)
-            
-            result = self.supabase.table("progress_logs").select("created_at").eq("user_id", user_id).gte("created_at", start_date.isoformat()).order("created_at", desc=True).execute()
+            result = await asyncio.to_thread(lambda: self.supabase.table("user_daily_activity").select("activity_date").eq("user_id", user_id).execute())
             
             if not result.data:
                 return {"current_streak": 0, "longest_streak": 0}
             
-            # Calculate streaks
-            activity_dates = set()
-            for log in result.data:
-                # Handle different datetime formats
-                created_at = log["created_at"]
-                if created_at.endswith('Z'):
-                    created_at = created_at.replace('Z', '+00:00')
-                
-                # Handle microseconds that are too long (more than 6 digits)
-                if '.' in created_at and '+' in created_at:
-                    base_with_micro, timezone_part = created_at.rsplit('+', 1)
-                    if '.' in base_with_micro:
-                        base, microseconds = base_with_micro.split('.')
-                        # Limit microseconds to 6 digits
-                        microseconds = microseconds[:6].ljust(6, '0')
-                        created_at = f"{base}.{microseconds}+{timezone_part}"
-                
-                try:
-                    date = datetime.fromisoformat(created_at).date()
-                    activity_dates.add(date)
-                except ValueError as e:
-                    logger.warning(f"Could not parse date {log['created_at']}: {e}")
-                    continue
+            activity_dates = {date.fromisoformat(row["activity_date"]) for row in result.data}
             
             current_streak = self._calculate_current_streak(activity_dates)
             longest_streak = self._calculate_longest_streak(activity_dates)
@@ -139,7 +119,8 @@ class ProgressService:
         if not activity_dates:
             return 0
         
-        today = datetime.now().date()
+        # Rollup days are UTC dates
+        today = datetime.now(timezone.utc).date()
         streak = 0
         current_date = today
         
@@ -168,32 +149,20 @@ class ProgressService:
         return longest_streak
     
     async def get_performance_analytics(self, user_id: str) -> dict:
-        """Get performance analytics"""
+        """Get performance analytics from the per-topic score rollup"""
         try:
-            # Get quiz performance by topic
-            quiz_result = self.supabase.table("quiz_results").select("""
-                percentage, quizzes(topic, difficulty)
-            """).eq("user_id", user_id).execute()
+            result = await asyncio.to_thread(lambda: self.supabase.table("user_topic_scores").select("topic, quiz_count, total_percentage").eq("user_id", user_id).execute())
             
             # Calculate average scores by topic
-            topic_performance = {}
-            for result in quiz_result.data:
-                topic = result["quizzes"]["topic"]
-                percentage = result["percentage"]
-                
-                if topic not in topic_performance:
-                    topic_performance[topic] = []
-                topic_performance[topic].append(percentage)
-            
-            # Calculate averages
             topic_averages = {
-                topic: sum(scores) / len(scores)
-                for topic, scores in topic_performance.items()
+                row["topic"]: float(row["total_percentage"]) / row["quiz_count"]
+                for row in result.data if row["quiz_count"]
             }
             
             # Get overall statistics
-            total_quizzes = len(quiz_result.data)
-            average_score = sum([r["percentage"] for r in quiz_result.data]) / total_quizzes if total_quizzes > 0 else 0
+            total_quizzes = sum(row["quiz_count"] for row in result.data)
+            total_percentage = sum(float(row["total_percentage"]) for row in result.data)
+            average_score = total_percentage / total_quizzes if total_quizzes > 0 else 0
             
             return {
                 "total_quizzes": total_quizzes,
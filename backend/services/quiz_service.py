@@ -1,7 +1,10 @@
+import asyncio
 import uuid
 from utils.database import get_supabase_admin
+from utils.write_batch import progress_writer
 from utils.chroma_client import chroma_client
 from utils.mistral_client import ai_client
+from utils.config import QUIZ_POOL_SIZE, QUIZ_POOL_REFILL_BELOW, QUIZ_POOL_BATCH, QUIZ_POOL_CONCURRENCY, QUIZ_POOL_PREFILL_DIFFICULTIES
 from models.schemas import QuizRequest, QuizSubmission, Quiz, QuizResult
 import logging
 
@@ -10,32 +13,35 @@ logger = logging.getLogger(__name__)
 class QuizService:
     def __init__(self):
         self.supabase = get_supabase_admin()
+        self._pool_fills = {}  # (user_id, topic_key, difficulty) -> running fill task
+        self._pool_semaphore = asyncio.Semaphore(QUIZ_POOL_CONCURRENCY)
     
     async def generate_quiz(self, quiz_request: QuizRequest, user_id: str) -> Quiz:
-        """Generate a quiz based on topic and difficulty"""
+        """Generate a quiz based on topic and difficulty
+        
+        Questions come from the pre-generated pool when it holds enough;
+        otherwise they are generated live. Either way the pool is topped
+        up in the background.
+        """
         try:
-            # Get relevant chunks from ChromaDB
-            query_embedding = await ai_client.generate_embeddings([quiz_request.topic])
-            
-            results = chroma_client.query_documents(
-                query_embeddings=query_embedding,
-                n_results=10,
-                where={"user_id": user_id}
+            questions, remaining = await self._take_from_pool(
+                user_id, quiz_request.topic, quiz_request.difficulty, quiz_request.num_questions
             )
             
-            if not results['documents'][0]:
-                raise Exception(f"No study material found for topic: {quiz_request.topic}")
-            
-            # Combine relevant chunks
-            context = "\n\n".join(results['documents'][0])
+            if questions is None:
+                # Get relevant chunks from ChromaDB
+                chunks = await self._get_topic_chunks(quiz_request.topic, user_id)
+                
+                # Generate questions using LLM
+                questions = await ai_client.generate_quiz_questions_sharded(
+                    context_chunks=chunks,
+                    topic=quiz_request.topic,
+                    difficulty=quiz_request.difficulty,
+                    num_questions=quiz_request.num_questions
+                )
             
-            # Generate questions using LLM
-            questions = await ai_client.generate_quiz_questions(
-                context=context,
-                topic=quiz_request.topic,
-                difficulty=quiz_request.difficulty,
-                num_questions=quiz_request.num_questions
-            )
+            if remaining < QUIZ_POOL_REFILL_BELOW:
+                self.schedule_pool_fill(user_id, quiz_request.topic, quiz_request.difficulty)
             
             # Create quiz record
             quiz_id = str(uuid.uuid4())
@@ -99,8 +105,6 @@ class QuizService:
                 "answers": submission.answers
             }
             
-            self.supabase.table("quiz_results").insert(result_record).execute()
-            
             # Log progress
             progress_record = {
                 "id": str(uuid.uuid4()),
@@ -115,7 +119,8 @@ class QuizService:
                 }
             }
             
-            self.supabase.table("progress_logs").insert(progress_record).execute()
+            self.supabase.table("quiz_results").insert(result_record).execute()
+            progress_writer.insert("progress_logs", progress_record)
             
             result = QuizResult(
                 quiz_id=submission.quiz_id,
@@ -132,6 +137,121 @@ class QuizService:
             logger.error(f"Error submitting quiz: {e}")
             raise
     
+    def prefill_pools(self, user_id: str, topics: list, document_id: str = None):
+        """Queue background pool fills for newly extracted topics"""
+        for topic in topics:
+            for difficulty in QUIZ_POOL_PREFILL_DIFFICULTIES:
+                self.schedule_pool_fill(user_id, topic, difficulty, document_id)
+    
+    def schedule_pool_fill(self, user_id: str, topic: str, difficulty: str, document_id: str = None):
+        """Start a background fill of a question pool unless one is already running"""
+        key = (user_id, self.topic_key(topic), difficulty)
+        if key in self._pool_fills:
+            return
+        task = asyncio.create_task(self._fill_pool(user_id, topic, difficulty, document_id))
+        self._pool_fills[key] = task
+        task.add_done_callback(lambda _: self._pool_fills.pop(key, None))
+    
+    async def _fill_pool(self, user_id: str, topic: str, difficulty: str, document_id: str = None):
+        """Top a (user, topic, difficulty) question pool up towards its target size
+        
+        Pooled questions are tied to a document so deleting it removes them;
+        topics that match none of the user's documents are not pooled.
+        """
+        topic_key = self.topic_key(topic)
+        try:
+            if document_id is None:
+                document_id = await self._topic_document_id(user_id, topic_key)
+                if document_id is None:
+                    logger.info(f"Not pooling questions for topic {topic}: no document has this topic")
+                    return
+            
+            # Bounded so background fills never crowd out interactive LLM calls
+            async with self._pool_semaphore:
+                result = await asyncio.to_thread(
+                    lambda: self.supabase.table("quiz_question_pool").select("id", count="exact", head=True).eq("user_id", user_id).eq("topic_key", topic_key).eq("difficulty", difficulty).execute()
+                )
+                needed = QUIZ_POOL_SIZE - (result.count or 0)
+                if needed <= 0:
+                    return
+                
+                chunks = await self._get_topic_chunks(topic, user_id)
+                questions = await ai_client.generate_quiz_questions_sharded(
+                    context_chunks=chunks,
+                    topic=topic,
+                    difficulty=difficulty,
+                    num_questions=min(needed, QUIZ_POOL_BATCH)
+                )
+                
+                # Another worker may have filled the pool meanwhile; the database caps it at QUIZ_POOL_SIZE
+                result = await asyncio.to_thread(
+                    lambda: self.supabase.rpc("add_quiz_pool_questions", {
+                        "p_user_id": user_id,
+                        "p_document_id": document_id,
+                        "p_topic": topic,
+                        "p_topic_key": topic_key,
+                        "p_difficulty": difficulty,
+                        "p_questions": questions,
+                        "p_max_size": QUIZ_POOL_SIZE
+                    }).execute()
+                )
+                
+                logger.info(f"Added {result.data or 0} of {len(questions)} questions to the {difficulty} pool for topic: {topic}")
+                
+        except Exception as e:
+            logger.error(f"Error filling quiz pool for topic {topic}: {e}")
+    
+    async def _take_from_pool(self, user_id: str, topic: str, difficulty: str, num_questions: int):
+        """Draw random questions from the pool, returning (questions or None, questions left)
+        
+        The draw and the delete happen in one database call that skips rows
+        locked by a concurrent draw, so two quizzes never share questions.
+        """
+        try:
+            result = await asyncio.to_thread(
+                lambda: self.supabase.rpc("take_quiz_pool_questions", {
+                    "p_user_id": user_id,
+                    "p_topic_key": self.topic_key(topic),
+                    "p_difficulty": difficulty,
+                    "p_count": num_questions
+                }).execute()
+            )
+            drawn = result.data or {}
+            return drawn.get("questions"), drawn.get("remaining", 0)
+            
+        except Exception as e:
+            logger.error(f"Error reading quiz pool: {e}")
+            return None, 0
+    
+    async def _topic_document_id(self, user_id: str, topic_key: str):
+        """The user's most recent document with a matching topic, or None"""
+        result = await asyncio.to_thread(
+            lambda: self.supabase.table("topics").select("document_id, name").eq("user_id", user_id).order("created_at", desc=True).execute()
+        )
+        for row in result.data or []:
+            if row.get("document_id") and self.topic_key(row["name"]) == topic_key:
+                return row["document_id"]
+        return None
+    
+    async def _get_topic_chunks(self, topic: str, user_id: str) -> list:
+        """Get the study material chunks most relevant to a topic"""
+        query_embedding = await ai_client.generate_embeddings([topic])
+        
+        results = await chroma_client.query_documents(
+            query_embeddings=query_embedding,
+            n_results=10,
+            where={"user_id": user_id}
+        )
+        
+        if not results['documents'][0]:
+            raise Exception(f"No study material found for topic: {topic}")
+        
+        return results['documents'][0]
+    
+    def topic_key(self, topic: str) -> str:
+        """Normalised topic name: case and whitespace differences map to the same key"""
+        return " ".join(topic.lower().split())
+    
     def _calculate_new_difficulty(self, percentage: float, current_difficulty: str) -> str:
         """Calculate new difficulty based on performance"""
         if percentage >= 80:
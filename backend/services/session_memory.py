@@ -0,0 +1,150 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+import logging
+
+from utils.config import (
+    SESSION_MEMORY_TURNS,
+    SESSION_MEMORY_HISTORY_TOKENS,
+    SESSION_MEMORY_SUMMARY_TOKENS,
+    SESSION_MEMORY_MAX_SESSIONS,
+    SESSION_MEMORY_IDLE_SECONDS
+)
+from utils.mistral_client import ai_client, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = """You maintain a running summary of a tutoring conversation between a student and an AI tutor.
+Update the summary with the new exchanges below. Keep the topics covered, what the student understood or struggled with,
+and any facts or preferences the student stated. Write at most {max_words} words of plain prose."""
+
+class SessionMemory:
+    """Token-budgeted conversation history for one tutor session
+
+    The most recent turns are kept verbatim within a token budget; turns
+    pushed out of it are folded into a rolling summary, one batch at a
+    time, so summarising never re-reads the whole conversation.
+    """
+
+    def __init__(self, max_turns: int, history_tokens: int, summary_tokens: int):
+        self.max_turns = max_turns
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.turns = deque()
+        self._turn_tokens = 0
+        self._evicted = []
+        self._evicted_tokens = 0
+        self._lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+
+    def messages(self) -> list:
+        """Chat messages carrying the summary and recent turns"""
+        self.last_used = time.monotonic()
+        messages = []
+        if self.summary:
+            messages.append({
+                "role": "system",
+                "content": f"Summary of the earlier conversation:\n{self.summary}"
+            })
+        for user_message, assistant_message, _ in self.turns:
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": assistant_message})
+        return messages
+
+    def add_turn(self, user_message: str, assistant_message: str):
+        """Record a completed turn, evicting the oldest turns past the budget"""
+        self.last_used = time.monotonic()
+        tokens = estimate_tokens(user_message) + estimate_tokens(assistant_message)
+        self.turns.append((user_message, assistant_message, tokens))
+        self._turn_tokens += tokens
+
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self._turn_tokens > self.history_tokens):
+            evicted = self.turns.popleft()
+            self._turn_tokens -= evicted[2]
+            self._evicted.append(evicted)
+            self._evicted_tokens += evicted[2]
+
+        # Hard cap: if summarising falls behind, the oldest unsummarised turns are dropped
+        while self._evicted and self._evicted_tokens > self.history_tokens:
+            dropped = self._evicted.pop(0)
+            self._evicted_tokens -= dropped[2]
+
+    @property
+    def needs_summary(self) -> bool:
+        return bool(self._evicted)
+
+    async def summarize(self):
+        """Fold evicted turns into the rolling summary"""
+        async with self._lock:
+            if not self._evicted:
+                return
+            evicted, self._evicted, self._evicted_tokens = self._evicted, [], 0
+
+            exchanges = "\n\n".join(
+                f"Student: {user_message}\nTutor: {assistant_message}"
+                for user_message, assistant_message, _ in evicted
+            )
+            messages = [
+                {"role": "system", "content": SUMMARY_PROMPT.format(max_words=int(self.summary_tokens * 0.75))},
+                {"role": "user", "content": f"Current summary:\n{self.summary or '(none)'}\n\nNew exchanges:\n{exchanges}"}
+            ]
+            try:
+                summary = await ai_client.chat_completion(messages, max_tokens=self.summary_tokens)
+                # Enforce the cap even if the model overruns it
+                self.summary = summary.strip()[:self.summary_tokens * 4]
+            except Exception as e:
+                logger.error(f"Error summarising conversation: {e}")
+                self._evicted = evicted + self._evicted
+                self._evicted_tokens = sum(turn[2] for turn in self._evicted)
+
+class SessionMemoryStore:
+    """Bounded registry of session memories shared by the text and voice tutors
+
+    Memories are keyed by (user_id, session_id), so a session id sent by
+    another user never reaches the owner's conversation.
+    """
+
+    def __init__(self):
+        self._sessions = OrderedDict()
+        self._pending = set()
+
+    def get(self, user_id: str, session_id: str) -> Optional[SessionMemory]:
+        """Get a user's session memory if it is held in this process"""
+        key = (user_id, session_id)
+        memory = self._sessions.get(key)
+        if memory is not None:
+            self._sessions.move_to_end(key)
+        return memory
+
+    def get_or_create(self, user_id: str, session_id: str) -> SessionMemory:
+        """Get a user's session memory, creating an empty one if needed"""
+        memory = self.get(user_id, session_id)
+        if memory is None:
+            self._evict_idle()
+            memory = SessionMemory(SESSION_MEMORY_TURNS, SESSION_MEMORY_HISTORY_TOKENS, SESSION_MEMORY_SUMMARY_TOKENS)
+            self._sessions[(user_id, session_id)] = memory
+            while len(self._sessions) > SESSION_MEMORY_MAX_SESSIONS:
+                self._sessions.popitem(last=False)
+        return memory
+
+    def record_turn(self, user_id: str, session_id: str, user_message: str, assistant_message: str):
+        """Add a turn and update the rolling summary in the background if needed"""
+        memory = self.get_or_create(user_id, session_id)
+        memory.add_turn(user_message, assistant_message)
+        if memory.needs_summary:
+            task = asyncio.create_task(memory.summarize())
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    def discard(self, user_id: str, session_id: str):
+        """Forget a user's session memory"""
+        self._sessions.pop((user_id, session_id), None)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - SESSION_MEMORY_IDLE_SECONDS
+        for key in [key for key, memory in self._sessions.items() if memory.last_used < cutoff]:
+            del self._sessions[key]
+
+session_memory = SessionMemoryStore()
@@ -87,7 +87,8 @@ class TTSService:
             }
             
             logger.info("Sending text to ElevenLabs TTS...")
-            response = requests.post(url, json=data, headers=headers, timeout=30)
+            # Off the event loop so sentence-by-sentence synthesis overlaps with LLM streaming
+            response = await asyncio.to_thread(requests.post, url, json=data, headers=headers, timeout=30)
             
             if response.status_code == 200:
                 audio_bytes = response.content
@@ -124,7 +125,7 @@ class TTSService:
             )
             
             # Synthesize speech
-            result = synthesizer.speak_text_async(text).get()
+            result = await asyncio.to_thread(lambda: synthesizer.speak_text_async(text).get())
             
             if result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
                 logger.info(f"Azure TTS successful: {len(result.audio_data)} bytes")
@@ -155,7 +156,7 @@ class TTSService:
             
             try:
                 # Save TTS to file
-                tts.save(temp_file_path)
+                await asyncio.to_thread(tts.save, temp_file_path)
                 
                 # Read file as bytes
                 with open(temp_file_path, 'rb') as f:
@@ -1,7 +1,13 @@
+import asyncio
+import time
 import uuid
 from utils.database import get_supabase_admin
+from utils.write_batch import progress_writer
+from utils.session_stats import session_stats
+from services.session_memory import session_memory
+from utils.semantic_cache import semantic_cache
 from utils.chroma_client import chroma_client
-from utils.mistral_client import ai_client
+from utils.mistral_client import ai_client, estimate_tokens
 from models.schemas import TutorMessage, TutorResponse
 import logging
 
@@ -10,6 +16,7 @@ logger = logging.getLogger(__name__)
 class TutorService:
     def __init__(self):
         self.supabase = get_supabase_admin()
+        self._pending_writes = {}  # session_id -> turn writes still running
     
     async def start_session(self, user_id: str, session_type: str = "text") -> str:
         """Start a new tutor session"""
@@ -30,29 +37,35 @@ class TutorService:
             raise
     
     async def process_message(self, message: TutorMessage, user_id: str) -> TutorResponse:
-        """Process a tutor message and generate response"""
+        """Process a tutor message and generate response
+        
+        The assistant message and session stats are persisted in the
+        background, so the response does not wait for them.
+        """
         try:
+            started = time.monotonic()
             session_id = message.session_id
             if not session_id:
                 session_id = await self.start_session(user_id)
             
-            # Store user message
-            await self._store_message(session_id, user_id, "user", message.message)
-            
-            # Get relevant context from user's documents
-            context = await self._get_relevant_context(message.message, user_id)
-            
-            # Generate response using LLM
-            response_text = await self._generate_response(message.message, context)
+            context, memory, query_embedding, cached, cache_version = await self._prepare_turn(
+                session_id, user_id, message.message
+            )
             
-            # Store assistant response
-            await self._store_message(session_id, user_id, "assistant", response_text)
+            if cached:
+                response_text, sources = cached["response"], cached["sources"]
+            else:
+                # Generate response using LLM
+                response_text = await self._generate_response(message.message, context, memory.messages())
+                sources = self._extract_sources(context) if context else None
             
-            # Update session message count
-            await self._update_session_stats(session_id)
+            latency_ms = int((time.monotonic() - started) * 1000)
+            if not cached:
+                self._cache_response(user_id, memory, query_embedding, response_text, sources, latency_ms, cache_version)
+            session_memory.record_turn(user_id, session_id, message.message, response_text)
             
-            # Extract sources from context
-            sources = self._extract_sources(context) if context else None
+            # Store assistant response and update session stats
+            self._finish_in_background(session_id, user_id, message.message, response_text, latency_ms)
             
             response = TutorResponse(
                 response=response_text,
@@ -67,15 +80,121 @@ class TutorService:
             logger.error(f"Error processing tutor message: {e}")
             raise
     
-    async def _get_relevant_context(self, query: str, user_id: str) -> str:
+    async def process_message_stream(self, message: TutorMessage, user_id: str):
+        """Process a tutor message, yielding response events as tokens arrive
+        
+        Yields dicts with a "type" of "session", "token", "done" or "error".
+        The assembled assistant message is stored once the stream finishes.
+        """
+        session_id = message.session_id
+        started = time.monotonic()
+        try:
+            if not session_id:
+                session_id = await self.start_session(user_id)
+            
+            yield {"type": "session", "session_id": session_id}
+            
+            context, memory, query_embedding, cached, cache_version = await self._prepare_turn(
+                session_id, user_id, message.message
+            )
+            
+            if cached:
+                response_text, sources = cached["response"], cached["sources"]
+                yield {"type": "token", "content": response_text}
+            else:
+                # Stream response tokens from the LLM
+                messages = self._build_messages(message.message, context, memory.messages())
+                response_parts = []
+                async for token in ai_client.chat_completion_stream(messages, max_tokens=800):
+                    response_parts.append(token)
+                    yield {"type": "token", "content": token}
+                response_text = "".join(response_parts)
+                sources = self._extract_sources(context) if context else None
+            
+            # Store assembled assistant response without holding up the final event;
+            # a task survives the client disconnecting once it has the response
+            latency_ms = int((time.monotonic() - started) * 1000)
+            if not cached:
+                self._cache_response(user_id, memory, query_embedding, response_text, sources, latency_ms, cache_version)
+            session_memory.record_turn(user_id, session_id, message.message, response_text)
+            self._finish_in_background(session_id, user_id, message.message, response_text, latency_ms)
+            
+            logger.info(f"Streamed tutor message for session {session_id}")
+            yield {
+                "type": "done",
+                "session_id": session_id,
+                "response": response_text,
+                "sources": sources
+            }
+            
+        except Exception as e:
+            logger.error(f"Error streaming tutor message: {e}")
+            yield {"type": "error", "session_id": session_id, "detail": str(e)}
+    
+    async def _prepare_turn(self, session_id: str, user_id: str, user_message: str):
+        """Store the user message and gather what the reply needs
+        
+        Returns (context, memory, query_embedding, cached, cache_version).
+        On a semantic cache hit, cached holds the stored answer and
+        retrieval is skipped; cache_version is passed back when storing.
+        """
+        _, query_embedding, memory, cache_version = await asyncio.gather(
+            self._store_message(session_id, user_id, "user", user_message),
+            self._embed_query(user_message),
+            self._get_memory(session_id, user_id),
+            self._get_cache_version(user_id)
+        )
+        
+        if cache_version is not None and query_embedding and self._is_standalone(memory):
+            cached = semantic_cache.lookup(user_id, query_embedding, cache_version)
+            if cached:
+                logger.info(f"Semantic cache hit for session {session_id} (similarity {cached['similarity']:.3f})")
+                return "", memory, query_embedding, cached, cache_version
+        
+        context = await self._get_relevant_context(user_message, user_id, query_embedding)
+        return context, memory, query_embedding, None, cache_version
+    
+    async def _get_cache_version(self, user_id: str):
+        """The user's semantic cache version, or None when the cache is off or unreachable"""
+        if not semantic_cache:
+            return None
+        try:
+            return await semantic_cache.version(user_id)
+        except Exception as e:
+            logger.error(f"Error reading semantic cache version: {e}")
+            return None
+    
+    def _is_standalone(self, memory) -> bool:
+        """A turn without earlier conversation can reuse or seed a cached answer"""
+        return not memory.turns and not memory.summary
+    
+    def _cache_response(self, user_id: str, memory, query_embedding: list, response_text: str, sources: list,
+                        latency_ms: int, cache_version: int = None):
+        # Answers to follow-up questions depend on the conversation, so only standalone turns are cached
+        if cache_version is not None and query_embedding and response_text and self._is_standalone(memory):
+            semantic_cache.store(user_id, query_embedding, response_text, sources, latency_ms, cache_version)
+    
+    async def _embed_query(self, query: str):
+        """Embed a query, returning None on failure"""
+        try:
+            embeddings = await ai_client.generate_embeddings([query])
+            return embeddings[0] if embeddings else None
+        except Exception as e:
+            logger.error(f"Error embedding query: {e}")
+            return None
+    
+    async def _get_relevant_context(self, query: str, user_id: str, query_embedding: list = None) -> str:
         """Get relevant context from user's documents"""
         try:
             # Generate embedding for the query
-            query_embedding = await ai_client.generate_embeddings([query])
+            if query_embedding is None:
+                query_embedding = await self._embed_query(query)
+            if query_embedding is None:
+                return ""
             
             # Search for relevant chunks
-            results = chroma_client.query_documents(
-                query_embeddings=query_embedding,
+            results = await chroma_client.query_documents(
+                query_embeddings=[query_embedding],
                 n_results=5,
                 where={"user_id": user_id}
             )
@@ -89,34 +208,73 @@ class TutorService:
             logger.error(f"Error getting relevant context: {e}")
             return ""
     
-    async def _generate_response(self, user_message: str, context: str) -> str:
-        """Generate tutor response using LLM"""
+    async def generate_reply(self, user_message: str, user_id: str, session_id: str) -> str:
+        """Answer a message with document context and session memory, without storing it"""
+        context, memory = await asyncio.gather(
+            self._get_relevant_context(user_message, user_id),
+            self._get_memory(session_id, user_id)
+        )
+        response_text = await self._generate_response(user_message, context, memory.messages())
+        session_memory.record_turn(user_id, session_id, user_message, response_text)
+        return response_text
+    
+    async def _get_memory(self, session_id: str, user_id: str):
+        """Get a session's conversation memory, rebuilding recent turns from the database if needed"""
+        memory = session_memory.get(user_id, session_id)
+        if memory is not None:
+            return memory
+        
+        memory = session_memory.get_or_create(user_id, session_id)
         try:
-            system_prompt = """You are Kashar AI, a helpful and knowledgeable study tutor. Your role is to:
-            1. Help students understand concepts from their study materials
-            2. Answer questions clearly and concisely
-            3. Provide explanations and examples when needed
-            4. Encourage learning and critical thinking
-            5. Stay focused on educational content
-            
-            If you have relevant study material context, use it to provide accurate answers.
-            If you don't have relevant context, provide general educational guidance."""
-            
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            
-            if context:
-                messages.append({
-                    "role": "system", 
-                    "content": f"Relevant study material:\n{context}"
-                })
-            
+            result = await asyncio.to_thread(
+                lambda: self.supabase.table("tutor_messages").select("role, content").eq("session_id", session_id).eq("user_id", user_id).order("created_at", desc=True).limit(memory.max_turns * 2).execute()
+            )
+            rows = list(reversed(result.data or []))
+            # Only completed user/assistant pairs become turns
+            for previous, row in zip(rows, rows[1:]):
+                if previous.get("role") == "user" and row.get("role") == "assistant":
+                    memory.add_turn(previous["content"], row["content"])
+        except Exception as e:
+            logger.error(f"Error loading conversation memory: {e}")
+        return memory
+    
+    def _build_messages(self, user_message: str, context: str, history: list = None) -> list:
+        """Build the LLM message list for a tutor turn"""
+        system_prompt = """You are Kashar AI, a helpful and knowledgeable study tutor. Your role is to:
+        1. Help students understand concepts from their study materials
+        2. Answer questions clearly and concisely
+        3. Provide explanations and examples when needed
+        4. Encourage learning and critical thinking
+        5. Stay focused on educational content
+        
+        If you have relevant study material context, use it to provide accurate answers.
+        If you don't have relevant context, provide general educational guidance."""
+        
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        
+        if context:
             messages.append({
-                "role": "user", 
-                "content": user_message
+                "role": "system", 
+                "content": f"Relevant study material:\n{context}"
             })
-            
+        
+        # Summary of earlier turns and the recent turns verbatim
+        if history:
+            messages.extend(history)
+        
+        messages.append({
+            "role": "user", 
+            "content": user_message
+        })
+        
+        return messages
+    
+    async def _generate_response(self, user_message: str, context: str, history: list = None) -> str:
+        """Generate tutor response using LLM"""
+        try:
+            messages = self._build_messages(user_message, context, history)
             response = await ai_client.chat_completion(messages, max_tokens=800)
             return response
             
@@ -135,26 +293,44 @@ class TutorService:
                 "content": content
             }
             
-            self.supabase.table("tutor_messages").insert(message_record).execute()
+            await asyncio.to_thread(
+                lambda: self.supabase.table("tutor_messages").insert(message_record).execute()
+            )
             
         except Exception as e:
             logger.error(f"Error storing message: {e}")
             raise
     
-    async def _update_session_stats(self, session_id: str):
-        """Update session statistics"""
+    async def _finish_turn(self, session_id: str, user_id: str, user_message: str, response_text: str, latency_ms: int):
+        """Persist the assistant message and record the turn in the session stats"""
         try:
-            # Get current message count
-            result = self.supabase.table("tutor_messages").select("id").eq("session_id", session_id).execute()
-            message_count = len(result.data)
-            
-            # Update session
-            self.supabase.table("tutor_sessions").update({
-                "message_count": message_count
-            }).eq("id", session_id).execute()
-            
+            await self._store_message(session_id, user_id, "assistant", response_text)
+            self._update_session_stats(session_id, user_message, response_text, latency_ms)
         except Exception as e:
-            logger.error(f"Error updating session stats: {e}")
+            logger.error(f"Error finishing tutor turn for session {session_id}: {e}")
+    
+    def _finish_in_background(self, session_id: str, user_id: str, user_message: str, response_text: str, latency_ms: int):
+        """Run _finish_turn as a task tracked per session, so end_session can wait for it"""
+        task = asyncio.create_task(self._finish_turn(session_id, user_id, user_message, response_text, latency_ms))
+        pending = self._pending_writes.setdefault(session_id, set())
+        pending.add(task)
+        
+        def finished(_):
+            pending.discard(task)
+            if not pending and self._pending_writes.get(session_id) is pending:
+                del self._pending_writes[session_id]
+        
+        task.add_done_callback(finished)
+    
+    def _update_session_stats(self, session_id: str, user_message: str, response_text: str, latency_ms: int):
+        """Update session statistics"""
+        # Counted in memory and flushed in bulk, so a turn never reads the session's messages
+        session_stats.record_turn(
+            session_id,
+            messages=2,
+            tokens=estimate_tokens(user_message) + estimate_tokens(response_text),
+            latency_ms=latency_ms
+        )
     
     def _extract_sources(self, context: str) -> list:
         """Extract source information from context"""
@@ -167,8 +343,14 @@ class TutorService:
     async def end_session(self, session_id: str, user_id: str):
         """End a tutor session"""
         try:
-            # Calculate session duration (simplified)
-            session_result = self.supabase.table("tutor_sessions").select("created_at, message_count").eq("id", session_id).eq("user_id", user_id).execute()
+            session_memory.discard(user_id, session_id)
+            
+            # Let in-flight turns record their stats, then apply them so the totals below are current
+            pending = self._pending_writes.get(session_id)
+            if pending:
+                await asyncio.gather(*list(pending), return_exceptions=True)
+            await session_stats.flush()
+            session_result = self.supabase.table("tutor_sessions").select("created_at, message_count, duration").eq("id", session_id).eq("user_id", user_id).execute()
             
             if session_result.data:
                 session_data = session_result.data[0]
@@ -183,14 +365,14 @@ class TutorService:
                     "id": str(uuid.uuid4()),
                     "user_id": user_id,
                     "activity_type": "tutor",
-                    "duration": 0,  # Would calculate actual duration
+                    "duration": session_data.get("duration") or 0,
                     "metadata": {
                         "session_id": session_id,
                         "message_count": session_data.get("message_count", 0)
                     }
                 }
                 
-                self.supabase.table("progress_logs").insert(progress_record).execute()
+                progress_writer.insert("progress_logs", progress_record)
                 
         except Exception as e:
             logger.error(f"Error ending session: {e}")
@@ -0,0 +1,246 @@
+"""
+Voice WebSocket Service
+One persistent, authenticated connection per voice session carrying binary audio both ways
+"""
+import asyncio
+import json
+import logging
+from typing import Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from services.auth_service import auth_service
+from services.voice_tutor_service import voice_tutor_service
+from utils.config import VOICE_WS_AUTH_TIMEOUT_SECONDS, VOICE_WS_MAX_UTTERANCE_BYTES, VOICE_WS_IDLE_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Application close codes (4000-4999)
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_FORBIDDEN = 4403
+CLOSE_SESSION_NOT_FOUND = 4404
+CLOSE_IDLE = 4408
+CLOSE_MESSAGE_TOO_BIG = 1009
+
+class VoiceSocketService:
+    """Runs voice turns over a WebSocket instead of one multipart POST per turn
+
+    Protocol, after the server accepts the connection:
+
+    - The client's first message must be {"type": "auth", "token": ...}.
+      The server answers {"type": "ready"}. Auth is checked once per
+      connection and re-checked (from the verified-token cache) per turn.
+    - Binary frames are chunks of one utterance. {"type": "end_utterance",
+      "format": "webm"} runs the turn on everything buffered so far.
+    - {"type": "text", "text": ...} runs a typed turn.
+    - {"type": "cancel"} stops the running turn; starting a new turn while
+      one is running also cancels it (barge-in).
+    - {"type": "auth", "token": ...} swaps in a refreshed token, and
+      {"type": "ping"} is answered with {"type": "pong"}.
+
+    Turn events are the JSON events of process_voice_message_stream,
+    except that each "audio" event carries a "bytes" length instead of
+    the audio and is followed immediately by one binary frame holding it.
+    """
+
+    def __init__(self):
+        self.open_connections = 0
+        self.connections = 0
+        self.turns = 0
+        self.cancelled_turns = 0
+        self.rejected = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    async def serve(self, websocket: WebSocket, session_id: str):
+        """Handle one voice session connection until the client goes away"""
+        await websocket.accept()
+        try:
+            credentials = await self._authenticate(websocket, session_id)
+        except Exception as e:
+            logger.error(f"Voice socket authentication error: {e}")
+            await websocket.close(1011, "Internal error")
+            credentials = None
+        if not credentials:
+            self.rejected += 1
+            return
+
+        self.open_connections += 1
+        self.connections += 1
+        connection = _Connection(websocket, session_id, *credentials)
+        try:
+            await connection.send_json({"type": "ready", "session_id": session_id})
+            await self._receive_loop(connection)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            logger.error(f"Voice socket error for session {session_id}: {e}")
+            await connection.close(1011, "Internal error")
+        finally:
+            await connection.cancel_turn()
+            self.open_connections -= 1
+            logger.info(f"Voice socket closed for session {session_id}")
+
+    async def _authenticate(self, websocket: WebSocket, session_id: str) -> Optional[tuple]:
+        """Wait for the auth message and check the user owns the session, returning (token, user_id) or closing the socket"""
+        try:
+            message = await asyncio.wait_for(websocket.receive_text(), VOICE_WS_AUTH_TIMEOUT_SECONDS)
+            control = json.loads(message)
+            token = control.get("token") if control.get("type") == "auth" else None
+        except (asyncio.TimeoutError, ValueError, KeyError, AttributeError):
+            token = None
+        except WebSocketDisconnect:
+            return None
+
+        user = await auth_service.get_user_from_token(token) if token else None
+        if not user:
+            await websocket.close(CLOSE_UNAUTHORIZED, "Authentication failed")
+            return None
+
+        try:
+            await voice_tutor_service.get_owned_session(session_id, user.id)
+        except LookupError:
+            await websocket.close(CLOSE_SESSION_NOT_FOUND, "Invalid or expired session")
+            return None
+        except PermissionError:
+            await websocket.close(CLOSE_FORBIDDEN, "Session belongs to another user")
+            return None
+        return token, user.id
+
+    async def _receive_loop(self, connection: "_Connection"):
+        utterance = bytearray()
+        while True:
+            try:
+                message = await asyncio.wait_for(connection.websocket.receive(), VOICE_WS_IDLE_TIMEOUT_SECONDS)
+            except asyncio.TimeoutError:
+                await connection.close(CLOSE_IDLE, "Idle timeout")
+                return
+            if message["type"] == "websocket.disconnect":
+                return
+
+            if message.get("bytes") is not None:
+                self.bytes_in += len(message["bytes"])
+                if len(utterance) + len(message["bytes"]) > VOICE_WS_MAX_UTTERANCE_BYTES:
+                    await connection.close(CLOSE_MESSAGE_TOO_BIG, "Utterance too large")
+                    return
+                utterance += message["bytes"]
+                continue
+
+            try:
+                control = json.loads(message.get("text") or "")
+                kind = control["type"]
+            except (ValueError, KeyError, TypeError):
+                await connection.send_json({"type": "error", "detail": "Expected a JSON message with a type"})
+                continue
+
+            if kind == "end_utterance":
+                if not utterance:
+                    await connection.send_json({"type": "error", "detail": "No audio data received"})
+                    continue
+                audio, utterance = bytes(utterance), bytearray()
+                events = voice_tutor_service.process_voice_message_stream(
+                    connection.session_id, connection.user_id, audio, control.get("format", "webm")
+                )
+                if not await self._start_turn(connection, events):
+                    return
+            elif kind == "text":
+                text = str(control.get("text") or "").strip()
+                if not text:
+                    await connection.send_json({"type": "error", "detail": "Message text is required"})
+                    continue
+                events = voice_tutor_service.process_text_message_stream(connection.session_id, connection.user_id, text)
+                if not await self._start_turn(connection, events):
+                    return
+            elif kind == "cancel":
+                utterance.clear()
+                if await connection.cancel_turn():
+                    self.cancelled_turns += 1
+                await connection.send_json({"type": "cancelled"})
+            elif kind == "auth":
+                user = await auth_service.get_user_from_token(control.get("token")) if control.get("token") else None
+                if not user or user.id != connection.user_id:
+                    await connection.close(CLOSE_UNAUTHORIZED, "Authentication failed")
+                    return
+                connection.token = control["token"]
+            elif kind == "ping":
+                await connection.send_json({"type": "pong"})
+            else:
+                await connection.send_json({"type": "error", "detail": f"Unknown message type: {kind}"})
+
+    async def _start_turn(self, connection: "_Connection", events) -> bool:
+        """Start a turn in the background, returning False if the connection's token is no longer valid"""
+        if not await auth_service.get_user_from_token(connection.token):
+            await events.aclose()
+            await connection.close(CLOSE_UNAUTHORIZED, "Token expired or revoked")
+            return False
+        if await connection.cancel_turn():
+            self.cancelled_turns += 1
+        self.turns += 1
+        connection.turn = asyncio.create_task(self._relay(connection, events))
+        return True
+
+    async def _relay(self, connection: "_Connection", events):
+        """Forward one turn's events, sending audio as binary frames"""
+        try:
+            async for event in events:
+                if event["type"] != "audio":
+                    await connection.send_json(event)
+                    continue
+                header = {key: value for key, value in event.items() if key != "audio"}
+                header["bytes"] = len(event["audio"])
+                await connection.send_json(header, event["audio"])
+                self.bytes_out += len(event["audio"])
+        except (WebSocketDisconnect, RuntimeError):
+            # Client went away mid-turn; the receive loop handles cleanup
+            pass
+        finally:
+            await events.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "open_connections": self.open_connections,
+            "connections": self.connections,
+            "rejected": self.rejected,
+            "turns": self.turns,
+            "cancelled_turns": self.cancelled_turns,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out
+        }
+
+class _Connection:
+    """Per-socket state: the running turn and a lock keeping audio headers next to their frames"""
+
+    def __init__(self, websocket: WebSocket, session_id: str, token: str, user_id: str):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.token = token
+        self.user_id = user_id
+        self.turn: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+
+    async def send_json(self, event: dict, binary: Optional[bytes] = None):
+        """Send a JSON event, followed by a binary frame when one belongs to it"""
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(event))
+            if binary is not None:
+                await self.websocket.send_bytes(binary)
+
+    async def cancel_turn(self) -> bool:
+        """Cancel the running turn, returning whether one was running"""
+        turn, self.turn = self.turn, None
+        if not turn or turn.done():
+            return False
+        turn.cancel()
+        try:
+            await turn
+        except asyncio.CancelledError:
+            pass
+        return True
+
+    async def close(self, code: int, reason: str):
+        try:
+            await self.websocket.close(code, reason)
+        except RuntimeError:
+            pass
+
+voice_socket_service = VoiceSocketService()
@@ -1,4 +1,5 @@
 import asyncio
+import time
 import uuid
 import json
 import logging
@@ -11,6 +12,10 @@ from utils.mistral_client import ai_client
 from services.stt_service import stt_service
 from services.tts_service import tts_service
 from services.agora_service import agora_service
+from services.session_memory import session_memory
+from utils.session_registry import create_session_registry
+from utils.sentence_segmenter import SentenceSegmenter
+from utils.config import VOICE_SEGMENT_MIN_CHARS, VOICE_SEGMENT_MAX_CHARS, VOICE_TTS_CONCURRENCY
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +24,9 @@ class VoiceTutorService:
     
     def __init__(self):
         self.supabase = get_supabase_admin()
-        self.active_sessions = {}  # Store active voice sessions
+        # Active voice sessions, shared across workers and expired after inactivity
+        self.sessions = create_session_registry("voice")
+        self._pending_writes = set()
     
     async def start_voice_session(self, user_id: str, channel_name: Optional[str] = None) -> Dict[str, Any]:
         """
@@ -59,13 +66,13 @@ class VoiceTutorService:
             # Store in database
             self.supabase.table("tutor_sessions").insert(session_db_data).execute()
             
-            # Store in memory for quick access
-            self.active_sessions[session_id] = {
+            # Register the session for quick access from any worker
+            await self.sessions.create(session_id, {
                 "user_id": user_id,
                 "channel_name": channel_name,
-                "created_at": datetime.utcnow(),
+                "created_at": datetime.utcnow().isoformat(),
                 "message_count": 0
-            }
+            })
             
             logger.info(f"Started voice tutor session: {session_id} for user: {user_id}")
             
@@ -95,12 +102,10 @@ class VoiceTutorService:
         """
         try:
             # Validate session
-            if session_id not in self.active_sessions:
+            session = await self.sessions.get(session_id)
+            if not session:
                 raise Exception("Invalid or expired session")
             
-            session = self.active_sessions[session_id]
-            user_id = session["user_id"]
-            
             logger.info(f"Processing voice message for session: {session_id}")
             
             # Step 1: Speech-to-Text
@@ -117,7 +122,7 @@ class VoiceTutorService:
             
             # Step 2: Process through text pipeline (same as regular tutor)
             logger.info("Step 2: Processing through AI pipeline...")
-            response_data = await self._process_text_message(session_id, user_text)
+            response_data = await self._process_text_message(session_id, session["user_id"], user_text)
             
             # Step 3: Text-to-Speech for AI response
             logger.info("Step 3: Converting AI response to speech...")
@@ -136,7 +141,7 @@ class VoiceTutorService:
                 response_data["has_audio"] = False
             
             # Update session stats
-            session["message_count"] += 1
+            await self.sessions.increment(session_id, "message_count")
             
             logger.info(f"Voice message processed successfully for session: {session_id}")
             return response_data
@@ -161,13 +166,14 @@ class VoiceTutorService:
         """
         try:
             # Validate session
-            if session_id not in self.active_sessions:
+            session = await self.sessions.get(session_id)
+            if not session:
                 raise Exception("Invalid or expired session")
             
             logger.info(f"Processing text message for session: {session_id}")
             
             # Process through text pipeline
-            response_data = await self._process_text_message(session_id, message)
+            response_data = await self._process_text_message(session_id, session["user_id"], message)
             
             # Optionally generate audio response for text messages too
             ai_text = response_data.get("response", "")
@@ -182,8 +188,7 @@ class VoiceTutorService:
                     response_data["has_audio"] = False
             
             # Update session stats
-            session = self.active_sessions[session_id]
-            session["message_count"] += 1
+            await self.sessions.increment(session_id, "message_count")
             
             return response_data
             
@@ -194,18 +199,178 @@ class VoiceTutorService:
                 "session_id": session_id
             }
     
-    async def _process_text_message(self, session_id: str, user_message: str) -> Dict[str, Any]:
+    async def get_owned_session(self, session_id: str, user_id: str) -> Dict[str, Any]:
+        """Get a live session, raising LookupError if it has expired and PermissionError if it is another user's"""
+        session = await self.sessions.get(session_id)
+        if not session:
+            raise LookupError("Invalid or expired session")
+        if session["user_id"] != user_id:
+            raise PermissionError("Session belongs to another user")
+        return session
+    
+    async def process_voice_message_stream(self, session_id: str, user_id: str, audio_data: bytes, audio_format: str = "wav"):
         """
-        Internal method to process text through the AI pipeline
+        Process a voice message as a pipeline, yielding events as each stage produces output
+        
+        The LLM reply streams into a sentence segmenter and every completed
+        segment is sent to TTS straight away, so the first sentence can play
+        while the rest of the answer is still being generated.
+        
+        Yields dicts with a "type" of "transcript", "token", "audio" (raw
+        bytes of one segment, in order), "done" or "error".
         """
-        session = self.active_sessions[session_id]
-        user_id = session["user_id"]
+        started = time.monotonic()
+        try:
+            session = await self.get_owned_session(session_id, user_id)
+            
+            user_text = await stt_service.transcribe_audio(audio_data, audio_format)
+            if not user_text:
+                yield {
+                    "type": "error",
+                    "session_id": session_id,
+                    "detail": "Could not understand the audio. Please try speaking more clearly."
+                }
+                return
+            
+            yield {"type": "transcript", "session_id": session_id, "text": user_text}
+            
+            async for event in self._stream_turn(session_id, session["user_id"], user_text, started):
+                yield event
+            
+        except Exception as e:
+            logger.error(f"Error streaming voice message: {e}")
+            yield {"type": "error", "session_id": session_id, "detail": str(e)}
+    
+    async def process_text_message_stream(self, session_id: str, user_id: str, text_message: str):
+        """Process a typed message in a voice session, yielding the same events as process_voice_message_stream"""
+        started = time.monotonic()
+        try:
+            session = await self.get_owned_session(session_id, user_id)
+            
+            async for event in self._stream_turn(session_id, session["user_id"], text_message, started):
+                yield event
+            
+        except Exception as e:
+            logger.error(f"Error streaming text message: {e}")
+            yield {"type": "error", "session_id": session_id, "detail": str(e)}
+    
+    async def _stream_turn(self, session_id: str, user_id: str, user_message: str, started: float):
+        """Stream LLM tokens and per-segment TTS audio for one turn"""
+        stt_ms = int((time.monotonic() - started) * 1000)
+        context = await self._get_relevant_context(user_message, user_id)
+        history = session_memory.get_or_create(user_id, session_id).messages()
+        messages = self._build_messages(user_message, context, history)
+        
+        events = asyncio.Queue()
+        segments = asyncio.Queue()  # (text, TTS task) in reply order; None ends it
+        segmenter = SentenceSegmenter(VOICE_SEGMENT_MIN_CHARS, VOICE_SEGMENT_MAX_CHARS)
+        limiter = asyncio.Semaphore(VOICE_TTS_CONCURRENCY)
+        synth_tasks = []
+        timing = {"stt_ms": stt_ms}
+        
+        async def synthesize(text: str):
+            async with limiter:
+                return await tts_service.synthesize_speech(text)
+        
+        def queue_segments(texts: list):
+            for text in texts:
+                task = asyncio.create_task(synthesize(text))
+                synth_tasks.append(task)
+                segments.put_nowait((text, task))
+        
+        async def generate() -> str:
+            parts = []
+            try:
+                async for token in ai_client.chat_completion_stream(messages, max_tokens=800):
+                    if not parts:
+                        timing["first_token_ms"] = int((time.monotonic() - started) * 1000)
+                    parts.append(token)
+                    events.put_nowait({"type": "token", "content": token})
+                    queue_segments(segmenter.feed(token))
+                queue_segments(segmenter.flush())
+            finally:
+                segments.put_nowait(None)
+            return "".join(parts)
+        
+        async def deliver():
+            index = 0
+            while (item := await segments.get()) is not None:
+                text, task = item
+                try:
+                    audio = await task
+                except Exception as e:
+                    logger.error(f"Error synthesizing voice segment for session {session_id}: {e}")
+                    audio = None
+                if not audio:
+                    # Report the failed segment now; its text still arrives in the token stream
+                    timing["tts_failures"] = timing.get("tts_failures", 0) + 1
+                    events.put_nowait({
+                        "type": "audio_error",
+                        "text": text,
+                        "detail": "Speech synthesis failed for part of the reply"
+                    })
+                    continue
+                if index == 0:
+                    timing["first_audio_ms"] = int((time.monotonic() - started) * 1000)
+                events.put_nowait({"type": "audio", "index": index, "text": text, "format": "mp3", "audio": audio})
+                index += 1
+        
+        def finished(task: asyncio.Task):
+            # A failed stage ends the turn straight away instead of after the other stage drains
+            failed = not task.cancelled() and task.exception() is not None
+            if failed or (generator.done() and deliverer.done()):
+                events.put_nowait(None)
+        
+        generator = asyncio.create_task(generate())
+        deliverer = asyncio.create_task(deliver())
+        generator.add_done_callback(finished)
+        deliverer.add_done_callback(finished)
+        try:
+            while (event := await events.get()) is not None:
+                yield event
+            for task in (deliverer, generator):
+                if task.done() and not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+            response_text = generator.result()
+        finally:
+            # Client went away or a stage failed: stop the rest of the pipeline
+            for task in [generator, deliverer, *synth_tasks]:
+                task.cancel()
+        
+        if not response_text:
+            response_text = "I'm sorry, I'm having trouble generating a response right now. Please try again."
+        session_memory.record_turn(user_id, session_id, user_message, response_text)
+        store = asyncio.create_task(self._finish_streamed_turn(session_id, user_id, user_message, response_text))
+        self._pending_writes.add(store)
+        store.add_done_callback(self._pending_writes.discard)
         
+        timing["total_ms"] = int((time.monotonic() - started) * 1000)
+        logger.info(f"Streamed voice reply for session {session_id}: {timing}")
+        yield {
+            "type": "done",
+            "session_id": session_id,
+            "user_message": user_message,
+            "response": response_text,
+            "context_used": bool(context),
+            "timing": timing,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+    
+    async def _finish_streamed_turn(self, session_id: str, user_id: str, user_message: str, ai_response: str):
+        await self._store_interaction(session_id, user_message, ai_response, user_id)
+        await self.sessions.increment(session_id, "message_count")
+    
+    async def _process_text_message(self, session_id: str, user_id: str, user_message: str) -> Dict[str, Any]:
+        """
+        Internal method to process text through the AI pipeline
+        """
         # Get relevant context from documents
         context = await self._get_relevant_context(user_message, user_id)
         
-        # Generate AI response
-        ai_response = await self._generate_response(user_message, context, user_id)
+        # Generate AI response with the session's conversation memory
+        history = session_memory.get_or_create(user_id, session_id).messages()
+        ai_response = await self._generate_response(user_message, context, user_id, history)
+        session_memory.record_turn(user_id, session_id, user_message, ai_response)
         
         # Store interaction in database
         await self._store_interaction(session_id, user_message, ai_response, user_id)
@@ -228,7 +393,7 @@ class VoiceTutorService:
                 return ""
             
             # Search for relevant documents
-            results = chroma_client.query_documents(
+            results = await chroma_client.query_documents(
                 query_embeddings=[query_embedding[0]],
                 n_results=5,
                 where={"user_id": user_id}
@@ -248,11 +413,9 @@ class VoiceTutorService:
             logger.error(f"Error getting relevant context: {e}")
             return ""
     
-    async def _generate_response(self, user_message: str, context: str, user_id: str) -> str:
-        """Generate AI response using LLM"""
-        try:
-            # Prepare messages for the AI
-            system_prompt = """You are Kashar AI, a helpful and knowledgeable tutor. You help students learn by:
+    def _build_messages(self, user_message: str, context: str, history: list = None) -> list:
+        """Build the LLM message list for a voice turn"""
+        system_prompt = """You are Kashar AI, a helpful and knowledgeable tutor. You help students learn by:
 
 1. Answering questions clearly and concisely
 2. Using the provided study material context when relevant
@@ -261,20 +424,29 @@ class VoiceTutorService:
 5. Keeping responses focused and not too lengthy for voice delivery
 
 If you have relevant study material context, use it to provide accurate, detailed answers. If not, provide general educational guidance and suggest the student upload relevant materials."""
-            
-            messages = [
-                {"role": "system", "content": system_prompt}
-            ]
-            
-            # Add context if available
-            if context:
-                context_message = f"Here is relevant study material context:\n\n{context}\n\nBased on this context and your knowledge, please answer the student's question."
-                messages.append({"role": "system", "content": context_message})
-            
-            # Add user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Generate response
+        
+        messages = [
+            {"role": "system", "content": system_prompt}
+        ]
+        
+        # Add context if available
+        if context:
+            context_message = f"Here is relevant study material context:\n\n{context}\n\nBased on this context and your knowledge, please answer the student's question."
+            messages.append({"role": "system", "content": context_message})
+        
+        # Add conversation summary and recent turns
+        if history:
+            messages.extend(history)
+        
+        # Add user message
+        messages.append({"role": "user", "content": user_message})
+        
+        return messages
+    
+    async def _generate_response(self, user_message: str, context: str, user_id: str, history: list = None) -> str:
+        """Generate AI response using LLM"""
+        try:
+            messages = self._build_messages(user_message, context, history)
             response = await ai_client.chat_completion(messages)
             
             if not response:
@@ -309,18 +481,12 @@ If you have relevant study material context, use it to provide accurate, detaile
     async def end_voice_session(self, session_id: str) -> bool:
         """End a voice tutor session"""
         try:
-            if session_id not in self.active_sessions:
+            # Remove from active sessions
+            session = await self.sessions.get(session_id)
+            if not session or not await self.sessions.delete(session_id):
                 logger.warning(f"Attempted to end non-existent session: {session_id}")
                 return False
-            
-            session = self.active_sessions[session_id]
-            
-            # Update session in database (using existing schema)
-            # Note: Only updating if there are compatible fields
-            # The session end is tracked in memory for now
-            
-            # Remove from active sessions
-            del self.active_sessions[session_id]
+            session_memory.discard(session["user_id"], session_id)
             
             logger.info(f"Ended voice session: {session_id}")
             return True
@@ -329,17 +495,16 @@ If you have relevant study material context, use it to provide accurate, detaile
             logger.error(f"Error ending voice session: {e}")
             return False
     
-    def get_active_sessions(self, user_id: str) -> list:
+    async def get_active_sessions(self, user_id: str) -> list:
         """Get active sessions for a user"""
         return [
             {
-                "session_id": sid,
+                "session_id": session["session_id"],
                 "channel_name": session["channel_name"],
-                "created_at": session["created_at"].isoformat(),
+                "created_at": session["created_at"],
                 "message_count": session["message_count"]
             }
-            for sid, session in self.active_sessions.items()
-            if session["user_id"] == user_id
+            for session in await self.sessions.list(user_id)
         ]
 
 # Global voice tutor service instance
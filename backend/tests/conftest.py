@@ -0,0 +1,84 @@
+"""Test setup: an isolated configuration, applied before any backend module is imported
+
+Service endpoints point at unroutable .test hosts, so anything a test
+does not replace with a mock transport fails fast instead of reaching a
+real service. On-disk state goes to a temporary directory.
+"""
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import pytest
+from jose import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+TEST_JWT_SECRET = "test-jwt-secret"
+STATE_DIR = tempfile.mkdtemp(prefix="kashar-tests-")
+
+os.environ.update({
+    "OPENROUTER_API_KEY": "test-openrouter-key",
+    "OPENROUTER_BASE_URL": "http://openrouter.test/api/v1",
+    "SUPABASE_URL": "http://supabase.test",
+    "SUPABASE_KEY": "test-anon-key",
+    "SUPABASE_SERVICE_KEY": "test-service-key",
+    "SUPABASE_JWT_SECRET": TEST_JWT_SECRET,
+    "AUTH_REVALIDATE_SECONDS": "0",
+    "AGORA_APP_ID": "test-agora-app",
+    "AGORA_APP_CERTIFICATE": "test-agora-certificate",
+    "PARSING_SERVICE_URL": "http://parsing.test",
+    "CHROMA_DB_PATH": os.path.join(STATE_DIR, "chroma"),
+    "EMBEDDING_CACHE_PATH": os.path.join(STATE_DIR, "embeddings.sqlite3"),
+    "INGESTION_DB_PATH": os.path.join(STATE_DIR, "jobs.sqlite3"),
+    "INGESTION_UPLOAD_DIR": os.path.join(STATE_DIR, "uploads"),
+    "SESSION_REGISTRY_BACKEND": "memory",
+    "AI_HTTP2": "false"
+})
+
+@pytest.fixture
+def mock_ai(monkeypatch):
+    """Route an AIClient (the shared one by default) through an httpx mock handler, sync or async"""
+    from utils.mistral_client import ai_client
+
+    def install(handler, client=ai_client):
+        transport_client = httpx.AsyncClient(
+            base_url=client.base_url,
+            headers=client.headers,
+            transport=httpx.MockTransport(handler)
+        )
+        monkeypatch.setattr(client, "_client", transport_client)
+        monkeypatch.setattr(client, "embedding_cache", None)
+        return client
+
+    return install
+
+@pytest.fixture
+def make_token():
+    """Sign Supabase-style HS256 access tokens with the test JWT secret"""
+    def sign(user_id="user-1", expires_in=3600, **claims):
+        payload = {
+            "sub": user_id,
+            "email": f"{user_id}@example.com",
+            "role": "authenticated",
+            "aud": "authenticated",
+            "exp": int(time.time()) + expires_in,
+            **claims
+        }
+        return jwt.encode(payload, TEST_JWT_SECRET, algorithm="HS256")
+
+    return sign
+
+@pytest.fixture
+def mock_postgrest():
+    """Build a Supabase client whose PostgREST requests go to an httpx mock handler"""
+    from supabase import create_client
+    from supabase.lib.client_options import SyncClientOptions
+
+    def build(handler):
+        http_client = httpx.Client(transport=httpx.MockTransport(handler))
+        return create_client("http://supabase.test", "test-service-key", options=SyncClientOptions(httpx_client=http_client))
+
+    return build
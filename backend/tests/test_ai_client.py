@@ -0,0 +1,81 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from utils.config import AI_MAX_CONNECTIONS, AI_MAX_KEEPALIVE_CONNECTIONS
+from utils.mistral_client import AIClient
+
+LATENCY = 0.2
+
+async def slow_provider(request: httpx.Request) -> httpx.Response:
+    """Fake OpenRouter: answers chat and embedding requests after a fixed delay"""
+    await asyncio.sleep(LATENCY)
+    body = json.loads(request.content)
+    if request.url.path.endswith("/embeddings"):
+        return httpx.Response(200, json={"data": [{"embedding": [float(len(text)), 1.0]} for text in body["input"]]})
+    return httpx.Response(200, json={"choices": [{"message": {"content": f"echo: {body['messages'][-1]['content']}"}}]})
+
+def test_client_is_shared_and_bounded():
+    async def run():
+        client = AIClient()
+        first = client._get_client()
+        assert client._get_client() is first
+        pool = first._transport._pool
+        assert pool._max_connections == AI_MAX_CONNECTIONS
+        assert pool._max_keepalive_connections == AI_MAX_KEEPALIVE_CONNECTIONS
+        assert first.headers["Authorization"] == f"Bearer {client.api_key}"
+
+        await client.close()
+        assert first.is_closed
+        assert client._get_client() is not first
+        await client.close()
+
+    asyncio.run(run())
+
+def test_concurrent_chat_requests_overlap(mock_ai):
+    client = mock_ai(slow_provider, AIClient())
+
+    async def run():
+        started = time.monotonic()
+        replies = await asyncio.gather(*[
+            client.chat_completion([{"role": "user", "content": f"question {i}"}]) for i in range(20)
+        ])
+        return replies, time.monotonic() - started
+
+    replies, elapsed = asyncio.run(run())
+    assert replies == [f"echo: question {i}" for i in range(20)]
+    # Sequential calls would take 20 x LATENCY
+    assert elapsed < LATENCY * 4, f"20 concurrent calls took {elapsed:.2f}s"
+
+def test_requests_do_not_block_the_event_loop(mock_ai):
+    client = mock_ai(slow_provider, AIClient())
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        await client.generate_embeddings(["a", "bb"])
+        task.cancel()
+        return ticks
+
+    # The loop keeps running other work (about LATENCY / 10ms ticks) while the request is in flight
+    assert asyncio.run(run()) >= 10
+
+def test_embeddings_keep_input_order(mock_ai):
+    client = mock_ai(slow_provider, AIClient())
+    embeddings = asyncio.run(client.generate_embeddings(["a", "bbb", "cc"]))
+    assert [embedding[0] for embedding in embeddings] == [1.0, 3.0, 2.0]
+
+def test_provider_errors_are_raised(mock_ai):
+    client = mock_ai(lambda request: httpx.Response(503, json={"error": "overloaded"}), AIClient())
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(client.chat_completion([{"role": "user", "content": "hi"}]))
@@ -0,0 +1,126 @@
+import asyncio
+
+import chromadb
+import pytest
+from chromadb.config import Settings
+
+from utils import chroma_client as chroma_module
+from utils.chroma_client import AsyncChromaClient, ChromaDBClient
+
+DIM = 8
+
+def vector(seed: float) -> list:
+    return [seed] + [0.1] * (DIM - 1)
+
+def chunks(user_id: str, title: str, count: int = 3) -> dict:
+    return {
+        "documents": [f"{user_id} {title} chunk {i}" for i in range(count)],
+        "embeddings": [vector(float(i)) for i in range(count)],
+        "metadatas": [{"user_id": user_id, "document_title": title, "chunk_index": i} for i in range(count)],
+        "ids": [f"{user_id}_{title}_{i}" for i in range(count)]
+    }
+
+@pytest.fixture
+def make_store(tmp_path, monkeypatch):
+    """Build ChromaDBClients over a fresh directory, optionally hash-sharded"""
+    monkeypatch.setattr(chroma_module, "CHROMA_DB_PATH", str(tmp_path / "chroma"))
+
+    def build(shards: int = 0) -> ChromaDBClient:
+        monkeypatch.setattr(chroma_module, "CHROMA_SHARDS", shards)
+        return ChromaDBClient()
+
+    return build
+
+def user_documents(store, user_id, **where) -> list:
+    filters = [{"user_id": user_id}] + [{key: value} for key, value in where.items()]
+    results = store.query_documents(
+        query_embeddings=[vector(0.0)],
+        n_results=10,
+        where=filters[0] if len(filters) == 1 else {"$and": filters}
+    )
+    return sorted(results["documents"][0])
+
+@pytest.mark.parametrize("shards", [0, 2])
+def test_queries_only_see_the_callers_documents(make_store, shards):
+    store = make_store(shards)
+    for user_id in ("alice", "bob", "carol"):
+        store.add_documents(**chunks(user_id, "biology"))
+
+    for user_id in ("alice", "bob", "carol"):
+        assert user_documents(store, user_id) == [f"{user_id} biology chunk {i}" for i in range(3)]
+
+    names = {collection.name for collection in store.client.list_collections()}
+    if shards:
+        assert len(names) <= shards
+    else:
+        assert names == {store._partition_name(user_id) for user_id in ("alice", "bob", "carol")}
+
+@pytest.mark.parametrize("shards", [0, 2])
+def test_extra_filters_apply_inside_the_partition(make_store, shards):
+    store = make_store(shards)
+    store.add_documents(**chunks("alice", "biology"))
+    store.add_documents(**chunks("alice", "history", count=2))
+    store.add_documents(**chunks("bob", "history"))
+
+    assert user_documents(store, "alice", document_title="history") == ["alice history chunk 0", "alice history chunk 1"]
+    assert user_documents(store, "alice", document_title={"$eq": "biology"}) == [f"alice biology chunk {i}" for i in range(3)]
+
+def test_users_without_documents_get_empty_results(make_store):
+    store = make_store()
+    store.add_documents(**chunks("alice", "biology"))
+
+    results = store.query_documents(query_embeddings=[vector(0.0)], n_results=5, where={"user_id": "nobody"})
+    assert results["documents"] == [[]]
+    assert results["ids"] == [[]]
+
+def test_queries_must_name_a_user(make_store):
+    store = make_store()
+    with pytest.raises(ValueError):
+        store.query_documents(query_embeddings=[vector(0.0)], where={"document_title": "biology"})
+    with pytest.raises(ValueError):
+        store.add_documents(documents=["x"], embeddings=[vector(0.0)], metadatas=[{}], ids=["x"])
+
+@pytest.mark.parametrize("shards", [0, 2])
+def test_deletes_stay_within_one_user(make_store, shards):
+    store = make_store(shards)
+    store.add_documents(**chunks("alice", "biology"))
+    store.add_documents(**chunks("alice", "history"))
+    store.add_documents(**chunks("bob", "biology"))
+
+    store.delete_user_documents("alice", "biology")
+    assert user_documents(store, "alice") == [f"alice history chunk {i}" for i in range(3)]
+
+    store.delete_user_documents("alice")
+    assert user_documents(store, "alice") == []
+    assert user_documents(store, "bob") == [f"bob biology chunk {i}" for i in range(3)]
+
+def test_shared_collection_is_migrated_into_partitions(make_store, tmp_path):
+    legacy = chromadb.PersistentClient(path=str(tmp_path / "chroma"), settings=Settings(anonymized_telemetry=False))
+    shared = legacy.get_or_create_collection(name="kashar_documents")
+    for user_id in ("alice", "bob"):
+        shared.add(**chunks(user_id, "biology"))
+
+    store = make_store()
+
+    assert "kashar_documents" not in {collection.name for collection in store.client.list_collections()}
+    assert user_documents(store, "alice") == [f"alice biology chunk {i}" for i in range(3)]
+    assert user_documents(store, "bob") == [f"bob biology chunk {i}" for i in range(3)]
+
+def test_async_facade_keeps_the_store_api(make_store):
+    facade = AsyncChromaClient(make_store())
+
+    async def run():
+        await facade.add_documents(**chunks("alice", "biology"))
+        results = await facade.query_documents(query_embeddings=[vector(0.0)], n_results=2, where={"user_id": "alice"})
+        await facade.delete_user_documents("alice")
+        remaining = await facade.query_documents(query_embeddings=[vector(0.0)], where={"user_id": "alice"})
+        return results, remaining
+
+    try:
+        results, remaining = asyncio.run(run())
+    finally:
+        facade.close()
+
+    assert results["documents"] == [["alice biology chunk 0", "alice biology chunk 1"]]
+    assert remaining["documents"] == [[]]
+    assert facade.stats()["query"]["completed"] == 2
@@ -0,0 +1,49 @@
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import documents as document_routes
+from routes.auth import get_current_user
+from services.ingestion_service import ingestion_service
+
+PDF = ("notes.pdf", b"%PDF-1.4\n%%EOF\n", "application/pdf")
+
+@pytest.fixture
+def client(monkeypatch):
+    submitted = []
+
+    async def submit_upload(**kwargs):
+        submitted.append(kwargs)
+        return {"id": "job-1", "status": "queued"}
+
+    monkeypatch.setattr(ingestion_service, "submit_upload", submit_upload)
+    app = FastAPI()
+    app.include_router(document_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1")
+    with TestClient(app) as client:
+        client.submitted = submitted
+        yield client
+
+def test_unknown_chunk_strategy_is_rejected(client):
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": PDF},
+        data={"title": "Notes", "chunk_strategy": "bogus"}
+    )
+
+    assert response.status_code == 400
+    assert "Invalid chunk strategy" in response.json()["detail"]
+    assert client.submitted == []
+
+def test_upload_with_known_chunk_strategy_is_queued(client):
+    response = client.post(
+        "/api/documents/upload",
+        files={"file": PDF},
+        data={"title": "Notes", "chunk_strategy": "sentence"}
+    )
+
+    assert response.status_code == 202
+    assert response.json()["job"]["id"] == "job-1"
+    assert client.submitted[0]["chunk_strategy"] == "sentence"
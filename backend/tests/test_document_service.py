@@ -0,0 +1,30 @@
+import asyncio
+import json
+import uuid
+
+import httpx
+
+from services.document_service import document_service
+
+DOCUMENT_ID = "5b0c2a1e-8f3d-4c55-9b7a-2f6f1d0c9e11"
+
+def test_repeated_topics_are_saved_once(mock_postgrest, monkeypatch):
+    writes = {}
+
+    def postgrest(request: httpx.Request) -> httpx.Response:
+        table = request.url.path.rsplit("/", 1)[-1]
+        rows = json.loads(request.content)
+        writes[table] = rows if isinstance(rows, list) else [rows]
+        return httpx.Response(201, json=writes[table])
+
+    monkeypatch.setattr(document_service, "supabase", mock_postgrest(postgrest))
+    topics = ["Cell Biology", "Photosynthesis", "cell  biology", "Photosynthesis", " PHOTOSYNTHESIS "]
+
+    result = asyncio.run(document_service.save_document(DOCUMENT_ID, "user-1", "Biology", "bio.pdf", topics, 12))
+
+    assert result["topics"] == ["Cell Biology", "Photosynthesis"]
+    assert writes["documents"][0]["topics"] == ["Cell Biology", "Photosynthesis"]
+    assert [row["name"] for row in writes["topics"]] == ["Cell Biology", "Photosynthesis"]
+    # One primary key per topic, stable across casing and spacing
+    assert len({row["id"] for row in writes["topics"]}) == 2
+    assert writes["topics"][0]["id"] == str(uuid.uuid5(uuid.UUID(DOCUMENT_ID), "cell biology"))
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import time
+
+from utils.embedding_cache import EmbeddingCache
+
+MODEL = "test-model"
+
+def test_memory_hits_do_not_wait_for_disk_writes(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "embeddings.sqlite3"))
+    cache.put_many(MODEL, ["warm"], [[1.0, 2.0]])
+    writing = threading.Event()
+    release = threading.Event()
+
+    def slow_write():
+        with cache._db_lock:
+            writing.set()
+            release.wait(5)
+
+    # Hold the connection as a long write on the writer thread would
+    cache._writer.submit(slow_write)
+    assert writing.wait(5)
+    try:
+        started = time.monotonic()
+        assert asyncio.run(cache.get_many(MODEL, ["warm"])) == [[1.0, 2.0]]
+        cache.put_many(MODEL, ["new"], [[3.0]])
+        assert time.monotonic() - started < 0.5
+    finally:
+        release.set()
+        cache.close()
+
+def test_embeddings_survive_a_restart_via_disk(tmp_path):
+    path = str(tmp_path / "embeddings.sqlite3")
+    cache = EmbeddingCache(path)
+    cache.put_many(MODEL, ["a", "b"], [[0.5, 1.5], [2.5]])
+    cache.close()
+
+    reopened = EmbeddingCache(path)
+    try:
+        assert asyncio.run(reopened.get_many(MODEL, ["b", "missing", "a"])) == [[2.5], None, [0.5, 1.5]]
+        stats = reopened.stats()
+        assert (stats["disk_hits"], stats["misses"], stats["disk_items"]) == (2, 1, 2)
+    finally:
+        reopened.close()
@@ -0,0 +1,58 @@
+import asyncio
+import logging
+
+import httpx
+import pytest
+from postgrest.exceptions import APIError
+
+from services.progress_service import progress_service
+
+PROGRESS = {"quiz_scores": [], "tutor_sessions": [], "topics_studied": ["Cells"], "total_study_time": 90}
+
+def rpc_failing_with(status: int, code: str, requests: list):
+    def postgrest(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        if request.url.path.endswith("/rpc/get_user_progress"):
+            return httpx.Response(status, json={"code": code, "message": f"error {code}", "details": None, "hint": None})
+        if request.url.path.endswith("/progress_logs"):
+            return httpx.Response(200, json=[{"topic": "Cells", "duration": 90}])
+        return httpx.Response(200, json=[])
+    return postgrest
+
+def test_progress_is_read_in_one_rpc(mock_postgrest, monkeypatch):
+    requests = []
+
+    def postgrest(request: httpx.Request) -> httpx.Response:
+        requests.append(request.url.path)
+        return httpx.Response(200, json=PROGRESS)
+
+    monkeypatch.setattr(progress_service, "supabase", mock_postgrest(postgrest))
+
+    progress = asyncio.run(progress_service.get_user_progress("user-1"))
+
+    assert progress.topics_studied == ["Cells"]
+    assert requests == ["/rest/v1/rpc/get_user_progress"]
+
+@pytest.mark.parametrize("status, code", [(404, "PGRST202"), (404, "42883")])
+def test_missing_rpc_falls_back_to_table_queries(mock_postgrest, monkeypatch, caplog, status, code):
+    requests = []
+    monkeypatch.setattr(progress_service, "supabase", mock_postgrest(rpc_failing_with(status, code, requests)))
+
+    with caplog.at_level(logging.WARNING, logger="services.progress_service"):
+        progress = asyncio.run(progress_service.get_user_progress("user-1"))
+
+    assert progress.topics_studied == ["Cells"]
+    assert progress.total_study_time == 90
+    assert {"/rest/v1/quiz_results", "/rest/v1/tutor_sessions", "/rest/v1/progress_logs"} <= set(requests)
+    assert [record.levelname for record in caplog.records] == ["WARNING"]
+
+def test_other_rpc_errors_are_not_hidden_by_the_fallback(mock_postgrest, monkeypatch):
+    requests = []
+    # Statement timeout: retrying as three more queries would only add load
+    monkeypatch.setattr(progress_service, "supabase", mock_postgrest(rpc_failing_with(500, "57014", requests)))
+
+    with pytest.raises(APIError) as error:
+        asyncio.run(progress_service.get_user_progress("user-1"))
+
+    assert error.value.code == "57014"
+    assert requests == ["/rest/v1/rpc/get_user_progress"]
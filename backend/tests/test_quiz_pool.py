@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import httpx
+
+from services import quiz_service as quiz_module
+from services.quiz_service import quiz_service
+from utils.config import QUIZ_POOL_SIZE
+
+USER_ID = "user-1"
+DOCUMENT_ID = "5b0c2a1e-8f3d-4c55-9b7a-2f6f1d0c9e11"
+
+class PoolStandIn:
+    """PostgREST stand-in reporting a pool of pool_count questions"""
+
+    def __init__(self, pool_count: int, added: int = 0):
+        self.pool_count = pool_count
+        self.added = added
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        if request.url.path.endswith("/rpc/add_quiz_pool_questions"):
+            return httpx.Response(200, json=self.added)
+        return httpx.Response(200, headers={"Content-Range": f"*/{self.pool_count}"})
+
+def fill(monkeypatch, mock_postgrest, postgrest, generated):
+    requested = []
+
+    async def generate(context_chunks, topic, difficulty, num_questions):
+        requested.append(num_questions)
+        return generated[:num_questions]
+
+    async def topic_chunks(topic, user_id):
+        return ["chunk"]
+
+    monkeypatch.setattr(quiz_service, "supabase", mock_postgrest(postgrest))
+    monkeypatch.setattr(quiz_service, "_get_topic_chunks", topic_chunks)
+    monkeypatch.setattr(quiz_service, "_pool_semaphore", asyncio.Semaphore(1))
+    monkeypatch.setattr(quiz_module.ai_client, "generate_quiz_questions_sharded", generate)
+    asyncio.run(quiz_service._fill_pool(USER_ID, "Cell Biology", "easy", DOCUMENT_ID))
+    return requested
+
+def test_pool_size_is_counted_without_loading_rows(mock_postgrest, monkeypatch):
+    postgrest = PoolStandIn(pool_count=QUIZ_POOL_SIZE)
+
+    requested = fill(monkeypatch, mock_postgrest, postgrest, [])
+
+    assert requested == []
+    assert len(postgrest.requests) == 1
+    count = postgrest.requests[0]
+    assert count.method == "HEAD"
+    assert "count=exact" in count.headers["prefer"]
+    assert count.url.params["select"] == "id"
+    assert count.url.params["topic_key"] == "eq.cell biology"
+
+def test_new_questions_are_capped_by_the_database(mock_postgrest, monkeypatch):
+    postgrest = PoolStandIn(pool_count=QUIZ_POOL_SIZE - 2, added=1)
+    generated = [{"question": f"Q{i}"} for i in range(5)]
+
+    requested = fill(monkeypatch, mock_postgrest, postgrest, generated)
+
+    assert requested == [2]
+    add = postgrest.requests[-1]
+    assert add.method == "POST"
+    assert add.url.path.endswith("/rpc/add_quiz_pool_questions")
+    body = json.loads(add.content)
+    assert body["p_max_size"] == QUIZ_POOL_SIZE
+    assert body["p_questions"] == generated[:2]
+    assert body["p_topic_key"] == "cell biology"
+    assert body["p_document_id"] == DOCUMENT_ID
+    # No rows are inserted directly; only the capped function writes to the pool
+    assert not any(request.url.path.endswith("/quiz_question_pool") and request.method == "POST" for request in postgrest.requests)
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.session_memory import session_memory
+from services.tutor_service import tutor_service
+
+class FakeMessagesTable:
+    """Records tutor_messages filters and returns the rows stored for the filtered user"""
+
+    def __init__(self, rows_by_user):
+        self.rows_by_user = rows_by_user
+        self.filters = []
+
+    def table(self, name):
+        assert name == "tutor_messages"
+        self.filters.append({})
+        return self
+
+    def select(self, columns):
+        return self
+
+    def eq(self, column, value):
+        self.filters[-1][column] = value
+        return self
+
+    def order(self, column, desc=False):
+        return self
+
+    def limit(self, count):
+        return self
+
+    def execute(self):
+        return SimpleNamespace(data=list(self.rows_by_user.get(self.filters[-1].get("user_id"), [])))
+
+@pytest.fixture
+def database(monkeypatch):
+    table = FakeMessagesTable({})
+    monkeypatch.setattr(tutor_service, "supabase", table)
+    yield table
+    for user_id in ("user-a", "user-b"):
+        session_memory.discard(user_id, "shared-session")
+
+def test_store_is_keyed_by_user_and_session():
+    session_memory.record_turn("user-a", "session-1", "What is osmosis?", "Water moving across a membrane.")
+    try:
+        assert session_memory.get("user-b", "session-1") is None
+        assert session_memory.get_or_create("user-b", "session-1").messages() == []
+        assert len(session_memory.get("user-a", "session-1").messages()) == 2
+
+        session_memory.discard("user-b", "session-1")
+        assert session_memory.get("user-a", "session-1") is not None
+    finally:
+        session_memory.discard("user-a", "session-1")
+        session_memory.discard("user-b", "session-1")
+
+def test_other_users_cannot_read_a_warm_session(database):
+    session_memory.record_turn("user-a", "shared-session", "My exam is on Friday", "Let's plan your revision.")
+
+    memory = asyncio.run(tutor_service._get_memory("shared-session", "user-b"))
+
+    assert memory.messages() == []
+    # The miss goes to the database, filtered on the caller
+    assert database.filters == [{"session_id": "shared-session", "user_id": "user-b"}]
+    # The owner's memory is untouched
+    owner = asyncio.run(tutor_service._get_memory("shared-session", "user-a"))
+    assert [m["content"] for m in owner.messages()] == ["My exam is on Friday", "Let's plan your revision."]
+    assert len(database.filters) == 1
+
+def test_cold_rebuild_only_loads_the_callers_turns(database):
+    database.rows_by_user["user-a"] = [
+        {"role": "assistant", "content": "Let's plan your revision."},
+        {"role": "user", "content": "My exam is on Friday"}
+    ]
+
+    assert asyncio.run(tutor_service._get_memory("shared-session", "user-b")).messages() == []
+    owner = asyncio.run(tutor_service._get_memory("shared-session", "user-a"))
+    assert [m["content"] for m in owner.messages()] == ["My exam is on Friday", "Let's plan your revision."]
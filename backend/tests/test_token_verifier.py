@@ -0,0 +1,203 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from jose import JWTError, jwk, jwt
+
+from conftest import TEST_JWT_SECRET
+from routes import auth as auth_routes
+from services import auth_service as auth_module
+from services.auth_service import auth_service
+from utils.token_verifier import TokenVerifier
+
+JWKS_URL = "http://supabase.test/auth/v1/.well-known/jwks.json"
+
+def hs256_verifier(**kwargs) -> TokenVerifier:
+    options = {"secret": TEST_JWT_SECRET, "jwks_url": None, "audience": "authenticated", "ttl": 60, "max_entries": 100}
+    options.update(kwargs)
+    return TokenVerifier(**options)
+
+@pytest.fixture(scope="module")
+def rsa_keys():
+    """An RS256 signing key and the JWKS publishing its public half"""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    public_jwk = jwk.construct(public_pem, "RS256").to_dict()
+    public_jwk.update({"kid": "test-key", "use": "sig"})
+    return private_pem, {"keys": [public_jwk]}
+
+@pytest.fixture
+def jwks_server(monkeypatch, rsa_keys):
+    """Serve the JWKS through httpx.get after a short delay, counting fetches"""
+    calls = []
+
+    def get(url, timeout=None):
+        calls.append(threading.current_thread().name)
+        time.sleep(0.1)
+        if getattr(get, "fail", False):
+            raise httpx.ConnectError("auth server down")
+        return httpx.Response(200, json=rsa_keys[1], request=httpx.Request("GET", url))
+
+    monkeypatch.setattr(httpx, "get", get)
+    get.calls = calls
+    return get
+
+def rs256_token(private_pem, user_id="user-1", **claims) -> str:
+    payload = {"sub": user_id, "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode(payload, private_pem, algorithm="RS256", headers={"kid": "test-key"})
+
+def test_hs256_tokens_are_verified_locally(make_token):
+    verifier = hs256_verifier()
+    claims = asyncio.run(verifier.verify(make_token("user-7")))
+    assert claims["sub"] == "user-7"
+    assert verifier.stats()["verifications"] == 1
+
+@pytest.mark.parametrize("bad_token", [
+    lambda sign: sign(expires_in=-60),
+    lambda sign: sign(aud="anon"),
+    lambda sign: sign(sub=""),
+    lambda sign: sign()[:-4] + "AAAA",
+    lambda sign: jwt.encode({"sub": "user-1", "aud": "authenticated"}, "another-secret", algorithm="HS256")
+], ids=["expired", "wrong-audience", "no-subject", "tampered", "wrong-secret"])
+def test_invalid_tokens_are_rejected(make_token, bad_token):
+    verifier = hs256_verifier()
+    with pytest.raises(JWTError):
+        asyncio.run(verifier.verify(bad_token(make_token)))
+    assert verifier.stats()["failures"] == 1
+
+def test_algorithms_without_a_configured_key_are_rejected(rsa_keys):
+    with pytest.raises(JWTError):
+        asyncio.run(hs256_verifier().verify(rs256_token(rsa_keys[0])))
+
+def test_cache_hits_expire_with_the_ttl_or_the_token(make_token):
+    verifier = hs256_verifier(ttl=60)
+    token = make_token()
+    assert verifier.get_cached(token) is None
+
+    entry = verifier.cache(token, "user", expires_at=time.time() + 3600)
+    assert verifier.get_cached(token) is entry
+    assert verifier.stats()["cache_hits"] == 1
+    assert entry["expires_at"] <= time.time() + 60
+
+    # Never cached past the token's own expiry
+    verifier.cache(token, "user", expires_at=time.time() - 1)
+    assert verifier.get_cached(token) is None
+
+def test_cache_is_bounded(make_token):
+    verifier = hs256_verifier(max_entries=3)
+    tokens = [make_token(f"user-{i}") for i in range(5)]
+    for token in tokens:
+        verifier.cache(token, token)
+    assert [verifier.get_cached(token) is not None for token in tokens] == [False, False, True, True, True]
+
+def test_revoked_tokens_are_evicted_and_rejected(make_token):
+    verifier = hs256_verifier()
+    token = make_token()
+    claims = asyncio.run(verifier.verify(token))
+    verifier.cache(token, "user", claims["exp"])
+
+    verifier.revoke(token, claims["exp"])
+    assert verifier.get_cached(token) is None
+    with pytest.raises(JWTError, match="revoked"):
+        asyncio.run(verifier.verify(token))
+
+def test_revalidation_is_due_once_per_interval(make_token):
+    verifier = hs256_verifier()
+    token = make_token()
+    # First sight is the local verification itself
+    assert verifier.due_for_revalidation(token, 0.05) is False
+    assert verifier.due_for_revalidation(token, 0.05) is False
+    time.sleep(0.06)
+    assert verifier.due_for_revalidation(token, 0.05) is True
+    assert verifier.due_for_revalidation(token, 0.05) is False
+
+def test_concurrent_requests_share_one_jwks_fetch(rsa_keys, jwks_server):
+    verifier = hs256_verifier(secret=None, jwks_url=JWKS_URL)
+    tokens = [rs256_token(rsa_keys[0], f"user-{i}") for i in range(20)]
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        claims = await asyncio.gather(*[verifier.verify(token) for token in tokens])
+        task.cancel()
+        return claims, ticks
+
+    claims, ticks = asyncio.run(run())
+    assert [c["sub"] for c in claims] == [f"user-{i}" for i in range(20)]
+    assert len(jwks_server.calls) == 1
+    # The fetch ran on a worker thread while the event loop kept running
+    assert jwks_server.calls[0] != threading.main_thread().name
+    assert ticks >= 5
+
+def test_failed_jwks_refresh_keeps_the_previous_keys(rsa_keys, jwks_server):
+    verifier = hs256_verifier(secret=None, jwks_url=JWKS_URL)
+    token = rs256_token(rsa_keys[0])
+    asyncio.run(verifier.verify(token))
+
+    jwks_server.fail = True
+    verifier._jwks_fetched_at = 0.0
+    assert asyncio.run(verifier.verify(token))["sub"] == "user-1"
+    # The failed refresh is not retried on every request
+    asyncio.run(verifier.verify(token))
+    assert len(jwks_server.calls) == 2
+
+    with pytest.raises(JWTError, match="unavailable"):
+        asyncio.run(hs256_verifier(secret=None, jwks_url=JWKS_URL).verify(token))
+
+class AuthRejected(Exception):
+    status = 401
+
+def test_tokens_rejected_on_revalidation_are_revoked(make_token, monkeypatch):
+    checks = []
+
+    def get_user(token):
+        checks.append(token)
+        raise AuthRejected("session revoked")
+
+    monkeypatch.setattr(auth_service, "supabase", SimpleNamespace(auth=SimpleNamespace(get_user=get_user)))
+    monkeypatch.setattr(auth_module, "AUTH_REVALIDATE_SECONDS", 0.05)
+    token = make_token("user-revoked")
+
+    async def run():
+        user = await auth_service.get_user_from_token(token)
+        assert user.id == "user-revoked" and checks == []
+        await asyncio.sleep(0.06)
+        # Still served from the cache while the background check runs
+        assert (await auth_service.get_user_from_token(token)).id == "user-revoked"
+        await asyncio.gather(*auth_service._revalidations)
+        return await auth_service.get_user_from_token(token)
+
+    assert asyncio.run(run()) is None
+    assert checks == [token]
+
+def test_get_current_user_route(make_token):
+    app = FastAPI()
+    app.include_router(auth_routes.router)
+
+    with TestClient(app) as client:
+        response = client.get("/api/auth/me", headers={"Authorization": f"Bearer {make_token('user-9')}"})
+        assert response.status_code == 200
+        assert response.json() == {"user": {"id": "user-9", "email": "user-9@example.com"}}
+
+        expired = make_token("user-9", expires_in=-60)
+        assert client.get("/api/auth/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+        assert client.get("/api/auth/me").status_code in (401, 403)
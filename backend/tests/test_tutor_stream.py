@@ -0,0 +1,120 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from models.schemas import TutorMessage
+from routes import tutor as tutor_routes
+from routes.auth import get_current_user
+from services.tutor_service import tutor_service
+
+TOKENS = ["Osmosis", " is", " the", " movement", " of", " water."]
+TOKEN_DELAY = 0.1
+
+def sse_provider(tokens=TOKENS, delay=TOKEN_DELAY):
+    """Fake streaming OpenRouter: one SSE chunk per token, with keep-alives and a usage-only chunk"""
+    async def events():
+        yield b": OPENROUTER PROCESSING\n\n"
+        for token in tokens:
+            await asyncio.sleep(delay)
+            yield f"data: {json.dumps({'choices': [{'delta': {'content': token}}]})}\n\n".encode()
+        yield b'data: {"choices": [], "usage": {"total_tokens": 12}}\n\n'
+        yield b"data: [DONE]\n\n"
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+    return handler
+
+@pytest.fixture
+def stored_messages(monkeypatch):
+    """Record tutor_messages writes and skip retrieval, so turns need no database or vector store"""
+    stored = []
+
+    async def store_message(session_id, user_id, role, content):
+        stored.append({"session_id": session_id, "user_id": user_id, "role": role, "content": content})
+
+    async def no_context(*args, **kwargs):
+        return ""
+
+    async def no_embedding(query):
+        return None
+
+    monkeypatch.setattr(tutor_service, "_store_message", store_message)
+    monkeypatch.setattr(tutor_service, "_get_relevant_context", no_context)
+    monkeypatch.setattr(tutor_service, "_embed_query", no_embedding)
+    return stored
+
+def test_chat_completion_stream_yields_tokens(mock_ai):
+    client = mock_ai(sse_provider(delay=0))
+
+    async def collect():
+        return [token async for token in client.chat_completion_stream([{"role": "user", "content": "hi"}])]
+
+    assert asyncio.run(collect()) == TOKENS
+
+def test_tokens_arrive_before_the_reply_finishes(mock_ai, stored_messages):
+    mock_ai(sse_provider())
+    message = TutorMessage(message="What is osmosis?", session_id="session-ttft")
+
+    async def run():
+        started = time.monotonic()
+        arrivals = []
+        async for event in tutor_service.process_message_stream(message, "user-1"):
+            arrivals.append((event["type"], time.monotonic() - started))
+        await asyncio.gather(*tutor_service._pending_writes.get("session-ttft", set()))
+        return arrivals
+
+    arrivals = asyncio.run(run())
+    token_times = [elapsed for kind, elapsed in arrivals if kind == "token"]
+    done_time = next(elapsed for kind, elapsed in arrivals if kind == "done")
+
+    assert len(token_times) == len(TOKENS)
+    # First token after about one token delay, not after the whole reply
+    assert token_times[0] < TOKEN_DELAY * 2.5
+    assert done_time >= TOKEN_DELAY * len(TOKENS)
+    assert token_times[0] < done_time / 2
+
+def test_stream_route_emits_ndjson_and_stores_the_reply(mock_ai, stored_messages):
+    mock_ai(sse_provider(delay=0))
+    app = FastAPI()
+    app.include_router(tutor_routes.router)
+    app.dependency_overrides[get_current_user] = lambda: SimpleNamespace(id="user-1")
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/api/tutor/message/stream",
+            json={"message": "What is osmosis?", "session_id": "session-route"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/x-ndjson")
+        events = [json.loads(line) for line in response.text.splitlines()]
+
+        # The assistant message is written in the background once the stream has finished
+        client.portal.call(
+            lambda: asyncio.gather(*tutor_service._pending_writes.get("session-route", set()))
+        )
+
+    assert [event["type"] for event in events] == ["session"] + ["token"] * len(TOKENS) + ["done"]
+    assert events[-1]["response"] == "".join(TOKENS)
+    assert [(row["role"], row["content"]) for row in stored_messages] == [
+        ("user", "What is osmosis?"),
+        ("assistant", "".join(TOKENS))
+    ]
+
+def test_provider_failure_ends_the_stream_with_an_error(mock_ai, stored_messages):
+    mock_ai(lambda request: httpx.Response(502, json={"error": "upstream"}))
+    message = TutorMessage(message="What is osmosis?", session_id="session-error")
+
+    async def run():
+        return [event async for event in tutor_service.process_message_stream(message, "user-1")]
+
+    events = asyncio.run(run())
+    assert events[-1]["type"] == "error"
+    assert not any(row["role"] == "assistant" for row in stored_messages)
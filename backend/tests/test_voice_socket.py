@@ -0,0 +1,193 @@
+import asyncio
+import uuid
+from contextlib import contextmanager
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from routes import tutor as tutor_routes
+from services import voice_socket_service as socket_module
+from services import voice_tutor_service as voice_module
+from services.voice_socket_service import voice_socket_service
+from services.voice_tutor_service import voice_tutor_service
+from utils.token_verifier import token_verifier
+
+REPLY = ["Osmosis moves water ", "across a membrane. ", "It follows the ", "concentration gradient."]
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Fake STT, LLM and TTS stages; settings["token_delay"] slows the reply down"""
+    settings = {"token_delay": 0.0, "heard": []}
+
+    async def transcribe(audio_data, audio_format):
+        settings["heard"].append((audio_data, audio_format))
+        return "What is osmosis?"
+
+    async def reply(messages, max_tokens=800):
+        for token in REPLY:
+            await asyncio.sleep(settings["token_delay"])
+            yield token
+
+    async def synthesize(text):
+        return b"mp3:" + text.encode()
+
+    async def no_context(*args):
+        return ""
+
+    async def no_store(*args):
+        return None
+
+    monkeypatch.setattr(voice_module.stt_service, "transcribe_audio", transcribe)
+    monkeypatch.setattr(voice_module.ai_client, "chat_completion_stream", reply)
+    monkeypatch.setattr(voice_module.tts_service, "synthesize_speech", synthesize)
+    monkeypatch.setattr(voice_tutor_service, "_get_relevant_context", no_context)
+    monkeypatch.setattr(voice_tutor_service, "_store_interaction", no_store)
+    return settings
+
+@pytest.fixture
+def client(pipeline):
+    app = FastAPI()
+    app.include_router(tutor_routes.router)
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture
+def session(client):
+    """A live voice session owned by user-1"""
+    session_id = f"voice-{uuid.uuid4().hex[:8]}"
+    client.portal.call(voice_tutor_service.sessions.create, session_id, {"user_id": "user-1", "message_count": 0})
+    yield session_id
+    client.portal.call(voice_tutor_service.sessions.delete, session_id)
+
+@contextmanager
+def connect(client, session_id, token):
+    """Open a socket and authenticate, yielding it after the ready event"""
+    with client.websocket_connect(f"/api/tutor/voice/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token})
+        assert ws.receive_json() == {"type": "ready", "session_id": session_id}
+        yield ws
+
+def receive_until(ws, *kinds):
+    """Collect events up to one of the given types, pairing each audio header with its binary frame"""
+    events = []
+    while True:
+        event = ws.receive_json()
+        if event["type"] == "audio":
+            event["audio"] = ws.receive_bytes()
+        events.append(event)
+        if event["type"] in kinds:
+            return events
+
+def close_code(ws) -> int:
+    with pytest.raises(WebSocketDisconnect) as closed:
+        ws.receive_text()
+    return closed.value.code
+
+@pytest.mark.parametrize("token_for, target, code", [
+    (lambda sign: "not-a-valid-token", "session", 4401),
+    (lambda sign: sign("user-1", expires_in=-60), "session", 4401),
+    (lambda sign: sign("user-2"), "session", 4403),
+    (lambda sign: sign("user-1"), "missing", 4404)
+], ids=["garbage", "expired", "other-user", "missing-session"])
+def test_authentication_failures_close_the_socket(client, session, make_token, token_for, target, code):
+    session_id = session if target == "session" else "no-such-session"
+    with client.websocket_connect(f"/api/tutor/voice/ws/{session_id}") as ws:
+        ws.send_json({"type": "auth", "token": token_for(make_token)})
+        assert close_code(ws) == code
+
+def test_first_message_must_be_auth(client, session):
+    with client.websocket_connect(f"/api/tutor/voice/ws/{session}") as ws:
+        ws.send_json({"type": "ping"})
+        assert close_code(ws) == 4401
+
+def test_voice_turn_sends_audio_as_binary_frames(client, session, pipeline, make_token):
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_bytes(b"a" * 1000)
+        ws.send_bytes(b"b" * 500)
+        ws.send_json({"type": "end_utterance", "format": "ogg"})
+        events = receive_until(ws, "done", "error")
+
+    # The binary frames are joined into one utterance
+    assert pipeline["heard"] == [(b"a" * 1000 + b"b" * 500, "ogg")]
+    assert events[0] == {"type": "transcript", "session_id": session, "text": "What is osmosis?"}
+    assert "".join(e["content"] for e in events if e["type"] == "token") == "".join(REPLY)
+
+    audio = [e for e in events if e["type"] == "audio"]
+    assert [e["index"] for e in audio] == list(range(len(audio)))
+    assert all(e["audio"] == b"mp3:" + e["text"].encode() and e["bytes"] == len(e["audio"]) for e in audio)
+    assert "".join(e["text"] for e in audio).split() == "".join(REPLY).split()
+    assert events[-1]["type"] == "done" and events[-1]["response"] == "".join(REPLY)
+
+def test_text_turns_update_the_session(client, session, make_token):
+    with connect(client, session, make_token("user-1")) as ws:
+        for _ in range(2):
+            ws.send_json({"type": "text", "text": "Tell me about osmosis"})
+            assert receive_until(ws, "done", "error")[-1]["type"] == "done"
+
+    client.portal.call(lambda: asyncio.gather(*voice_tutor_service._pending_writes))
+    assert client.portal.call(voice_tutor_service.sessions.get, session)["message_count"] == 2
+
+def test_cancel_stops_the_running_turn(client, session, pipeline, make_token):
+    pipeline["token_delay"] = 0.2
+    cancelled_before = voice_socket_service.cancelled_turns
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_json({"type": "text", "text": "Tell me about osmosis"})
+        ws.send_json({"type": "cancel"})
+        events = receive_until(ws, "cancelled", "done")
+        ws.send_json({"type": "ping"})
+        events += receive_until(ws, "pong", "done")
+
+    assert [e["type"] for e in events][-2:] == ["cancelled", "pong"]
+    assert not any(e["type"] == "done" for e in events)
+    assert voice_socket_service.cancelled_turns == cancelled_before + 1
+
+def test_new_turn_barges_in_on_the_running_one(client, session, pipeline, make_token):
+    pipeline["token_delay"] = 0.2
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_json({"type": "text", "text": "first question"})
+        pipeline["token_delay"] = 0.0
+        ws.send_json({"type": "text", "text": "second question"})
+        events = receive_until(ws, "done")
+        ws.send_json({"type": "ping"})
+        events += receive_until(ws, "pong", "done")
+
+    done = [e for e in events if e["type"] == "done"]
+    assert [e["user_message"] for e in done] == ["second question"]
+
+def test_control_message_errors_keep_the_socket_open(client, session, make_token):
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_text("not json")
+        assert ws.receive_json()["type"] == "error"
+        ws.send_json({"type": "bogus"})
+        assert ws.receive_json() == {"type": "error", "detail": "Unknown message type: bogus"}
+        ws.send_json({"type": "end_utterance"})
+        assert ws.receive_json() == {"type": "error", "detail": "No audio data received"}
+        ws.send_json({"type": "text", "text": "  "})
+        assert ws.receive_json() == {"type": "error", "detail": "Message text is required"}
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+def test_token_swap_must_keep_the_same_user(client, session, make_token):
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_json({"type": "auth", "token": make_token("user-1", expires_in=7200)})
+        ws.send_json({"type": "ping"})
+        assert ws.receive_json() == {"type": "pong"}
+
+        ws.send_json({"type": "auth", "token": make_token("user-2")})
+        assert close_code(ws) == 4401
+
+def test_revoked_token_ends_the_connection_on_the_next_turn(client, session, make_token):
+    token = make_token("user-1", jti=uuid.uuid4().hex)
+    with connect(client, session, token) as ws:
+        token_verifier.revoke(token)
+        ws.send_json({"type": "text", "text": "Tell me about osmosis"})
+        assert close_code(ws) == 4401
+
+def test_oversized_utterances_are_rejected(client, session, make_token, monkeypatch):
+    monkeypatch.setattr(socket_module, "VOICE_WS_MAX_UTTERANCE_BYTES", 1024)
+    with connect(client, session, make_token("user-1")) as ws:
+        ws.send_bytes(b"a" * 1000)
+        ws.send_bytes(b"a" * 100)
+        assert close_code(ws) == 1009
@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+
+from utils.write_batch import BufferedWriter, WriteBatch
+
+class PostgrestStandIn:
+    """Records PostgREST requests and answers them, failing the ones `fail` says to"""
+
+    def __init__(self, fail=lambda request, rows: False):
+        self.fail = fail
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        rows = json.loads(request.content)
+        self.requests.append({
+            "table": request.url.path.rsplit("/", 1)[-1],
+            "prefer": request.headers.get("prefer", ""),
+            "rows": rows,
+            "thread": threading.current_thread().name
+        })
+        if self.fail(request, rows):
+            return httpx.Response(503, json={"message": "unavailable", "code": "503"})
+        return httpx.Response(201, json=rows)
+
+def test_batch_sends_one_request_per_table_off_the_event_loop(mock_postgrest):
+    server = PostgrestStandIn()
+    client = mock_postgrest(server)
+
+    async def save():
+        async with WriteBatch(client) as batch:
+            batch.upsert("documents", {"id": "doc-1"})
+            batch.upsert("topics", [{"id": "t-1"}, {"id": "t-2"}])
+            batch.upsert("topics", {"id": "t-3"})
+            batch.insert("progress_logs", [])
+
+    asyncio.run(save())
+    assert [(r["table"], [row["id"] for row in r["rows"]]) for r in server.requests] == [
+        ("documents", ["doc-1"]),
+        ("topics", ["t-1", "t-2", "t-3"])
+    ]
+    assert all("resolution=merge-duplicates" in r["prefer"] for r in server.requests)
+    assert all(r["thread"] != threading.main_thread().name for r in server.requests)
+
+def test_batch_is_dropped_when_the_block_raises(mock_postgrest):
+    server = PostgrestStandIn()
+
+    async def save():
+        async with WriteBatch(mock_postgrest(server)) as batch:
+            batch.upsert("documents", {"id": "doc-1"})
+            raise ValueError("extraction failed")
+
+    with pytest.raises(ValueError):
+        asyncio.run(save())
+    assert server.requests == []
+
+def test_batch_errors_are_raised(mock_postgrest):
+    server = PostgrestStandIn(fail=lambda request, rows: True)
+
+    async def save():
+        async with WriteBatch(mock_postgrest(server)) as batch:
+            batch.upsert("documents", {"id": "doc-1"})
+
+    with pytest.raises(Exception):
+        asyncio.run(save())
+
+def test_buffered_rows_share_one_insert(mock_postgrest):
+    server = PostgrestStandIn()
+    writer = BufferedWriter(mock_postgrest(server), window=0.05, max_rows=100)
+
+    async def log():
+        for i in range(5):
+            writer.insert("progress_logs", {"id": f"log-{i}"})
+        await asyncio.sleep(0.1)
+        await writer.flush()
+
+    asyncio.run(log())
+    assert len(server.requests) == 1
+    assert [row["id"] for row in server.requests[0]["rows"]] == [f"log-{i}" for i in range(5)]
+    assert writer.stats()["rows_written"] == 5
+
+def test_failed_flush_is_retried_without_duplicating_rows(mock_postgrest):
+    attempts = []
+    server = PostgrestStandIn(fail=lambda request, rows: attempts.append(1) or len(attempts) == 1)
+    writer = BufferedWriter(mock_postgrest(server), window=1, max_rows=100, retries=2, retry_delay=0.01)
+
+    async def log():
+        writer.insert("progress_logs", [{"id": "log-1"}, {"id": "log-2"}])
+        await writer.flush()
+
+    asyncio.run(log())
+    assert len(server.requests) == 2
+    # The retry skips rows the failed attempt may already have written
+    assert "resolution=ignore-duplicates" in server.requests[1]["prefer"]
+    assert server.requests[1]["rows"] == server.requests[0]["rows"]
+    assert writer.stats() == {"pending_rows": 0, "flushes": 1, "rows_written": 2, "rows_retried": 2, "rows_failed": 0}
+
+def test_a_bad_row_does_not_sink_the_batch(mock_postgrest):
+    server = PostgrestStandIn(fail=lambda request, rows: any(row["id"] == "bad" for row in rows))
+    writer = BufferedWriter(mock_postgrest(server), window=1, max_rows=100, retries=1, retry_delay=0.01)
+
+    async def log():
+        writer.insert("progress_logs", [{"id": "log-1"}, {"id": "bad"}, {"id": "log-2"}])
+        await writer.flush()
+
+    asyncio.run(log())
+    written = [r["rows"][0]["id"] for r in server.requests if len(r["rows"]) == 1 and r["rows"][0]["id"] != "bad"]
+    assert written == ["log-1", "log-2"]
+    assert writer.stats()["rows_written"] == 2
+    assert writer.stats()["rows_failed"] == 1
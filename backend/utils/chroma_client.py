@@ -1,98 +1,213 @@
 import chromadb
 from chromadb.config import Settings
-from utils.config import CHROMA_DB_PATH
+from utils.config import (
+    CHROMA_DB_PATH,
+    CHROMA_SHARDS,
+    CHROMA_QUERY_WORKERS,
+    CHROMA_WRITE_WORKERS,
+    CHROMA_QUERY_TIMEOUT,
+    CHROMA_WRITE_TIMEOUT,
+    CHROMA_WRITE_BATCH
+)
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+COLLECTION_METADATA = {"description": "Kashar AI document embeddings with OpenAI embeddings"}
+
 class ChromaDBClient:
+    """Vector store partitioned by user
+
+    Each user's chunks live in their own collection (or, with CHROMA_SHARDS
+    set, in one of a fixed number of collections picked by hashing the user
+    id), so a query only searches that user's vectors. Callers keep passing
+    ``user_id`` in metadata and ``where`` filters; routing happens here.
+    """
+
     def __init__(self):
         # Ensure ChromaDB directory exists with proper permissions
         import os
         os.makedirs(CHROMA_DB_PATH, exist_ok=True)
         os.chmod(CHROMA_DB_PATH, 0o755)
-        
+
         self.client = chromadb.PersistentClient(
             path=CHROMA_DB_PATH,
             settings=Settings(anonymized_telemetry=False)
         )
         self.collection_name = "kashar_documents"
-        self.collection = None
-        self._initialize_collection()
-    
-    def _initialize_collection(self):
-        """Initialize or get existing collection"""
-        try:
-            # Try to get existing collection first
+        self.shards = CHROMA_SHARDS
+        self._collections = {}
+        self._lock = threading.Lock()
+        self._migrate_shared_collection()
+
+    def _partition_name(self, user_id: str) -> str:
+        """Collection name for a user's partition"""
+        digest = hashlib.sha256(str(user_id).encode("utf-8")).hexdigest()
+        if self.shards:
+            return f"{self.collection_name}_shard_{int(digest, 16) % self.shards:04d}"
+        return f"kashar_user_{digest[:40]}"
+
+    def _get_collection(self, name: str, create: bool = True):
+        """Get a cached collection handle, creating the collection if asked"""
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is not None:
+                return collection
+
+            if create:
+                collection = self.client.get_or_create_collection(name=name, metadata=COLLECTION_METADATA)
+            else:
+                try:
+                    collection = self.client.get_collection(name=name)
+                except Exception:
+                    return None
+
+            self._collections[name] = collection
+            return collection
+
+    def _drop_collection(self, name: str):
+        with self._lock:
+            self._collections.pop(name, None)
             try:
-                self.collection = self.client.get_collection(name=self.collection_name)
-                logger.info(f"ChromaDB collection '{self.collection_name}' found")
+                self.client.delete_collection(name=name)
             except Exception:
-                # Collection doesn't exist, create new one
-                self.collection = self.client.create_collection(
-                    name=self.collection_name,
-                    metadata={"description": "Kashar AI document embeddings with OpenAI embeddings"}
-                )
-                logger.info(f"ChromaDB collection '{self.collection_name}' created")
-                
-        except Exception as e:
-            # If there's a dimension mismatch, delete and recreate collection
-            logger.warning(f"Collection issue detected: {e}")
-            try:
-                self.client.delete_collection(name=self.collection_name)
-                logger.info(f"Deleted existing collection '{self.collection_name}' due to dimension mismatch")
-            except:
                 pass
-            
-            # Create new collection
-            self.collection = self.client.create_collection(
-                name=self.collection_name,
-                metadata={"description": "Kashar AI document embeddings with OpenAI embeddings"}
-            )
-            logger.info(f"ChromaDB collection '{self.collection_name}' recreated with correct dimensions")
-    
-    def add_documents(self, documents: list, embeddings: list, metadatas: list, ids: list):
-        """Add documents to the collection"""
+
+    def _split_user_filter(self, where: dict):
+        """Pull the user_id condition out of a where filter
+
+        Returns the user id (or None) and the filter still needed inside the
+        user's partition. Shards hold several users, so they keep the full filter.
+        """
+        if not where:
+            return None, where
+
+        user_id = None
+        remaining = []
+        clauses = where["$and"] if list(where) == ["$and"] else [{key: value} for key, value in where.items()]
+        for clause in clauses:
+            value = clause.get("user_id") if len(clause) == 1 else None
+            if isinstance(value, dict) and list(value) == ["$eq"]:
+                value = value["$eq"]
+            if user_id is None and isinstance(value, str):
+                user_id = value
+            else:
+                remaining.append(clause)
+
+        if user_id is None or self.shards:
+            return user_id, where
+        if not remaining:
+            return user_id, None
+        return user_id, remaining[0] if len(remaining) == 1 else {"$and": remaining}
+
+    def _migrate_shared_collection(self):
+        """Move chunks from the old single shared collection into user partitions"""
+        try:
+            shared = self.client.get_collection(name=self.collection_name)
+        except Exception:
+            return
+
+        try:
+            total = shared.count()
+            logger.info(f"Migrating {total} chunks from '{self.collection_name}' into per-user partitions")
+
+            offset = 0
+            while offset < total:
+                batch = shared.get(limit=500, offset=offset, include=["documents", "embeddings", "metadatas"])
+                offset += len(batch["ids"])
+                if not batch["ids"]:
+                    break
+
+                partitions = {}
+                for i, metadata in enumerate(batch["metadatas"]):
+                    if not metadata or not metadata.get("user_id"):
+                        logger.warning(f"Skipping chunk {batch['ids'][i]} without a user_id")
+                        continue
+                    partitions.setdefault(self._partition_name(metadata["user_id"]), []).append(i)
+
+                for name, positions in partitions.items():
+                    self._get_collection(name).upsert(
+                        documents=[batch["documents"][i] for i in positions],
+                        embeddings=[batch["embeddings"][i] for i in positions],
+                        metadatas=[batch["metadatas"][i] for i in positions],
+                        ids=[batch["ids"][i] for i in positions]
+                    )
+
+            self.client.delete_collection(name=self.collection_name)
+            logger.info(f"Migrated shared collection '{self.collection_name}' into per-user partitions")
+
+        except Exception as e:
+            logger.error(f"Error migrating shared ChromaDB collection: {e}")
+
+    def _add_to_partition(self, name: str, documents: list, embeddings: list, metadatas: list, ids: list):
+        """Add documents to one partition, recreating it on a dimension mismatch"""
         try:
-            self.collection.add(
+            self._get_collection(name).add(
                 documents=documents,
                 embeddings=embeddings,
                 metadatas=metadatas,
                 ids=ids
             )
-            logger.info(f"Added {len(documents)} documents to ChromaDB")
         except Exception as e:
             # Check if it's a dimension mismatch error
             if "dimension" in str(e).lower():
                 logger.warning(f"Dimension mismatch detected: {e}")
-                # Recreate collection and try again
+                # Recreate the partition and try again
                 try:
-                    self.client.delete_collection(name=self.collection_name)
-                    self.collection = self.client.create_collection(
-                        name=self.collection_name,
-                        metadata={"description": "Kashar AI document embeddings with OpenAI embeddings"}
-                    )
-                    logger.info(f"Recreated collection '{self.collection_name}' with correct dimensions")
-                    
-                    # Try adding documents again
-                    self.collection.add(
+                    self._drop_collection(name)
+                    self._get_collection(name).add(
                         documents=documents,
                         embeddings=embeddings,
                         metadatas=metadatas,
                         ids=ids
                     )
-                    logger.info(f"Added {len(documents)} documents to ChromaDB after recreation")
+                    logger.info(f"Recreated collection '{name}' with correct dimensions")
                 except Exception as retry_error:
                     logger.error(f"Error adding documents after recreation: {retry_error}")
                     raise
             else:
-                logger.error(f"Error adding documents to ChromaDB: {e}")
                 raise
-    
+
+    def add_documents(self, documents: list, embeddings: list, metadatas: list, ids: list):
+        """Add documents to the partition of each document's user"""
+        try:
+            partitions = {}
+            for i, metadata in enumerate(metadatas):
+                if not metadata.get("user_id"):
+                    raise ValueError(f"Document {ids[i]} has no user_id metadata")
+                partitions.setdefault(self._partition_name(metadata["user_id"]), []).append(i)
+
+            for name, positions in partitions.items():
+                self._add_to_partition(
+                    name,
+                    documents=[documents[i] for i in positions],
+                    embeddings=[embeddings[i] for i in positions],
+                    metadatas=[metadatas[i] for i in positions],
+                    ids=[ids[i] for i in positions]
+                )
+            logger.info(f"Added {len(documents)} documents to ChromaDB")
+        except Exception as e:
+            logger.error(f"Error adding documents to ChromaDB: {e}")
+            raise
+
     def query_documents(self, query_embeddings: list, n_results: int = 5, where: dict = None):
-        """Query documents from the collection"""
+        """Query documents from the partition selected by the user_id filter"""
         try:
-            results = self.collection.query(
+            user_id, where = self._split_user_filter(where)
+            if user_id is None:
+                raise ValueError("ChromaDB queries must filter on user_id")
+
+            collection = self._get_collection(self._partition_name(user_id), create=False)
+            if collection is None:
+                # User has no indexed documents yet
+                empty = [[] for _ in query_embeddings]
+                return {"ids": empty, "documents": empty, "metadatas": empty, "distances": empty}
+
+            results = collection.query(
                 query_embeddings=query_embeddings,
                 n_results=n_results,
                 where=where
@@ -101,21 +216,130 @@ class ChromaDBClient:
         except Exception as e:
             logger.error(f"Error querying ChromaDB: {e}")
             raise
-    
+
     def delete_user_documents(self, user_id: str, document_title: str = None):
         """Delete documents for a specific user, optionally filtered by document title"""
         try:
+            name = self._partition_name(user_id)
             if document_title:
-                # Delete specific document by title using AND operator
-                self.collection.delete(where={"$and": [{"user_id": {"$eq": user_id}}, {"document_title": {"$eq": document_title}}]})
+                # Delete specific document by title within the user's partition
+                collection = self._get_collection(name, create=False)
+                if collection is not None:
+                    collection.delete(where={"$and": [{"user_id": {"$eq": user_id}}, {"document_title": {"$eq": document_title}}]})
                 logger.info(f"Deleted document '{document_title}' for user {user_id}")
+            elif self.shards:
+                # Shards are shared with other users
+                collection = self._get_collection(name, create=False)
+                if collection is not None:
+                    collection.delete(where={"user_id": user_id})
+                logger.info(f"Deleted all documents for user {user_id}")
             else:
-                # Delete all documents for user
-                self.collection.delete(where={"user_id": user_id})
+                # Delete the user's whole partition
+                self._drop_collection(name)
                 logger.info(f"Deleted all documents for user {user_id}")
         except Exception as e:
             logger.error(f"Error deleting user documents: {e}")
             raise
 
+class _OffloadPool:
+    """Bounded thread pool that records queue depth and outcomes"""
+
+    def __init__(self, name: str, workers: int, timeout: float):
+        self.name = name
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"chroma-{name}")
+        self.workers = workers
+        self._lock = threading.Lock()
+        self.queued = 0
+        self.running = 0
+        self.max_queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+
+    async def run(self, func, *args, **kwargs):
+        """Run func on the pool, giving up on the result after the timeout"""
+        def task():
+            with self._lock:
+                self.queued -= 1
+                self.running += 1
+            try:
+                return func(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.running -= 1
+
+        with self._lock:
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+        future = self._executor.submit(task)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            self.completed += 1
+            return result
+        except asyncio.TimeoutError:
+            # A running Chroma call cannot be interrupted; only the wait is abandoned
+            if future.cancel():
+                with self._lock:
+                    self.queued -= 1
+            self.timeouts += 1
+            raise TimeoutError(f"ChromaDB {self.name} operation timed out after {self.timeout}s")
+        except Exception:
+            self.failed += 1
+            raise
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "max_queued": self.max_queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "timeouts": self.timeouts
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+class AsyncChromaClient:
+    """Async facade over ChromaDBClient
+
+    Queries and writes run on separate bounded thread pools so the event
+    loop never blocks on Chroma, and a bulk ingest cannot hold up the
+    workers serving tutor queries. Large inserts are split into batches so
+    queries interleave with them.
+    """
+
+    def __init__(self, store: ChromaDBClient):
+        self.store = store
+        self._queries = _OffloadPool("query", CHROMA_QUERY_WORKERS, CHROMA_QUERY_TIMEOUT)
+        self._writes = _OffloadPool("write", CHROMA_WRITE_WORKERS, CHROMA_WRITE_TIMEOUT)
+
+    async def add_documents(self, documents: list, embeddings: list, metadatas: list, ids: list):
+        """Add documents in batches on the write pool"""
+        for start in range(0, len(documents), CHROMA_WRITE_BATCH):
+            end = start + CHROMA_WRITE_BATCH
+            await self._writes.run(
+                self.store.add_documents,
+                documents[start:end], embeddings[start:end], metadatas[start:end], ids[start:end]
+            )
+
+    async def query_documents(self, query_embeddings: list, n_results: int = 5, where: dict = None):
+        """Query documents on the query pool"""
+        return await self._queries.run(self.store.query_documents, query_embeddings, n_results, where)
+
+    async def delete_user_documents(self, user_id: str, document_title: str = None):
+        """Delete documents on the write pool"""
+        await self._writes.run(self.store.delete_user_documents, user_id, document_title)
+
+    def stats(self) -> dict:
+        """Queue depth and outcome counters per pool"""
+        return {"query": self._queries.stats(), "write": self._writes.stats()}
+
+    def close(self):
+        self._queries.shutdown()
+        self._writes.shutdown()
+
 # Global ChromaDB client instance
-chroma_client = ChromaDBClient()
+chroma_client = AsyncChromaClient(ChromaDBClient())
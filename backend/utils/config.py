@@ -8,10 +8,30 @@ SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
 
+# Local access token verification: HS256 with the project JWT secret and/or
+# asymmetric keys from the project JWKS. With neither set, tokens are checked
+# against Supabase Auth on every cache miss.
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+AUTH_TOKEN_CACHE_TTL = float(os.getenv("AUTH_TOKEN_CACHE_TTL", "60"))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000"))
+# Re-check locally verified tokens with Supabase Auth in the background this often (0 disables)
+AUTH_REVALIDATE_SECONDS = float(os.getenv("AUTH_REVALIDATE_SECONDS", "300"))
+
 # OpenRouter AI Configuration
 OPENROUTER_API_KEY = os.getenv("OPENROUTER_API_KEY")
 if not OPENROUTER_API_KEY:
     raise ValueError("OPENROUTER_API_KEY environment variable is required")
+OPENROUTER_BASE_URL = os.getenv("OPENROUTER_BASE_URL", "https://openrouter.ai/api/v1")
+
+# Shared AI HTTP client settings (timeouts in seconds)
+AI_CONNECT_TIMEOUT = float(os.getenv("AI_CONNECT_TIMEOUT", "5"))
+AI_EMBEDDING_TIMEOUT = float(os.getenv("AI_EMBEDDING_TIMEOUT", "30"))
+AI_CHAT_TIMEOUT = float(os.getenv("AI_CHAT_TIMEOUT", "60"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "100"))
+AI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("AI_MAX_KEEPALIVE_CONNECTIONS", "20"))
+AI_HTTP2 = os.getenv("AI_HTTP2", "true").lower() == "true"
 
 # Agora Configuration
 AGORA_APP_ID = os.getenv("AGORA_APP_ID")
@@ -19,9 +39,87 @@ AGORA_APP_CERTIFICATE = os.getenv("AGORA_APP_CERTIFICATE")
 
 # ChromaDB Configuration
 CHROMA_DB_PATH = os.getenv("CHROMA_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "chroma_db"))
+# 0 gives every user their own collection; N > 0 hashes users into N shared shards
+CHROMA_SHARDS = int(os.getenv("CHROMA_SHARDS", "0"))
+CHROMA_QUERY_WORKERS = int(os.getenv("CHROMA_QUERY_WORKERS", "4"))
+CHROMA_WRITE_WORKERS = int(os.getenv("CHROMA_WRITE_WORKERS", "1"))
+CHROMA_QUERY_TIMEOUT = float(os.getenv("CHROMA_QUERY_TIMEOUT", "10"))
+CHROMA_WRITE_TIMEOUT = float(os.getenv("CHROMA_WRITE_TIMEOUT", "120"))
+CHROMA_WRITE_BATCH = int(os.getenv("CHROMA_WRITE_BATCH", "256"))
+
+# Embedding cache (in-process LRU in front of an on-disk SQLite tier)
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "5000"))
+EMBEDDING_CACHE_DISK_ITEMS = int(os.getenv("EMBEDDING_CACHE_DISK_ITEMS", "200000"))
+
+# Semantic tutor response cache (opt-in)
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "3600"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+SEMANTIC_CACHE_MAX_USERS = int(os.getenv("SEMANTIC_CACHE_MAX_USERS", "10000"))
+
+# Per-user cache of document and topic listings (0 disables); invalidation is shared
+# across workers through the SESSION_REGISTRY_BACKEND store
+LISTING_CACHE_TTL_SECONDS = float(os.getenv("LISTING_CACHE_TTL_SECONDS", "300"))
+LISTING_CACHE_MAX_USERS = int(os.getenv("LISTING_CACHE_MAX_USERS", "10000"))
+
+# Batched embedding of large documents during ingestion
+EMBEDDING_BATCH_TOKENS = int(os.getenv("EMBEDDING_BATCH_TOKENS", "8000"))
+EMBEDDING_BATCH_MAX_ITEMS = int(os.getenv("EMBEDDING_BATCH_MAX_ITEMS", "128"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+
+# Quiz/flashcard generation fan-out
+GENERATION_SHARD_SIZE = int(os.getenv("GENERATION_SHARD_SIZE", "5"))
+GENERATION_DUPLICATE_SIMILARITY = float(os.getenv("GENERATION_DUPLICATE_SIMILARITY", "0.85"))
+GENERATION_REPAIR_ATTEMPTS = int(os.getenv("GENERATION_REPAIR_ATTEMPTS", "1"))
 
 # Flask parsing service
 PARSING_SERVICE_URL = os.getenv("PARSING_SERVICE_URL", "http://localhost:5001")
+PARSING_SERVICE_TIMEOUT = float(os.getenv("PARSING_SERVICE_TIMEOUT", "300"))
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50"))
+
+# Buffered Supabase writes (append-only logs)
+SUPABASE_WRITE_WINDOW_MS = int(os.getenv("SUPABASE_WRITE_WINDOW_MS", "250"))
+SUPABASE_WRITE_MAX_ROWS = int(os.getenv("SUPABASE_WRITE_MAX_ROWS", "500"))
+SUPABASE_WRITE_RETRIES = int(os.getenv("SUPABASE_WRITE_RETRIES", "3"))
+SUPABASE_WRITE_RETRY_DELAY_MS = int(os.getenv("SUPABASE_WRITE_RETRY_DELAY_MS", "500"))
+SESSION_STATS_FLUSH_SECONDS = float(os.getenv("SESSION_STATS_FLUSH_SECONDS", "5"))
+
+# Tutor conversation memory (recent turns verbatim plus a rolling summary)
+SESSION_MEMORY_TURNS = int(os.getenv("SESSION_MEMORY_TURNS", "6"))
+SESSION_MEMORY_HISTORY_TOKENS = int(os.getenv("SESSION_MEMORY_HISTORY_TOKENS", "1500"))
+SESSION_MEMORY_SUMMARY_TOKENS = int(os.getenv("SESSION_MEMORY_SUMMARY_TOKENS", "300"))
+SESSION_MEMORY_MAX_SESSIONS = int(os.getenv("SESSION_MEMORY_MAX_SESSIONS", "1000"))
+SESSION_MEMORY_IDLE_SECONDS = int(os.getenv("SESSION_MEMORY_IDLE_SECONDS", "3600"))
+
+# Pre-generated quiz question pools per (user, topic, difficulty)
+QUIZ_POOL_SIZE = int(os.getenv("QUIZ_POOL_SIZE", "15"))
+QUIZ_POOL_REFILL_BELOW = int(os.getenv("QUIZ_POOL_REFILL_BELOW", "10"))
+QUIZ_POOL_BATCH = int(os.getenv("QUIZ_POOL_BATCH", "10"))
+QUIZ_POOL_CONCURRENCY = int(os.getenv("QUIZ_POOL_CONCURRENCY", "2"))
+QUIZ_POOL_PREFILL_DIFFICULTIES = [d.strip() for d in os.getenv("QUIZ_POOL_PREFILL_DIFFICULTIES", "medium").split(",") if d.strip()]
+
+# Document chunking (strategy: token, sentence, paragraph or heading)
+CHUNK_STRATEGY = os.getenv("CHUNK_STRATEGY", "paragraph")
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "300"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+
+# Background document ingestion
+INGESTION_DB_PATH = os.getenv("INGESTION_DB_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "jobs.sqlite3"))
+INGESTION_UPLOAD_DIR = os.getenv("INGESTION_UPLOAD_DIR", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "uploads"))
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+# Seconds a claimed job stays reserved without a heartbeat before another process may take it
+INGESTION_LEASE_SECONDS = float(os.getenv("INGESTION_LEASE_SECONDS", "60"))
+
+# Voice session registry and shared cache versions: memory (single worker), sqlite (workers on one host) or redis (shared)
+SESSION_REGISTRY_BACKEND = os.getenv("SESSION_REGISTRY_BACKEND", "sqlite").lower()
+SESSION_REGISTRY_PATH = os.getenv("SESSION_REGISTRY_PATH", os.path.join(os.path.dirname(os.path.dirname(__file__)), "cache", "sessions.sqlite3"))
+SESSION_REGISTRY_REDIS_URL = os.getenv("SESSION_REGISTRY_REDIS_URL", "redis://localhost:6379/0")
+VOICE_SESSION_TTL_SECONDS = float(os.getenv("VOICE_SESSION_TTL_SECONDS", "1800"))
+SESSION_REAPER_INTERVAL_SECONDS = float(os.getenv("SESSION_REAPER_INTERVAL_SECONDS", "60"))
 
 # Audio Services Configuration
 AZURE_SPEECH_KEY = os.getenv("AZURE_SPEECH_KEY")
@@ -35,6 +133,20 @@ TTS_SERVICE = os.getenv("TTS_SERVICE", "elevenlabs")  # elevenlabs, azure, or gt
 AUDIO_SAMPLE_RATE = int(os.getenv("AUDIO_SAMPLE_RATE", "16000"))
 AUDIO_CHUNK_SIZE = int(os.getenv("AUDIO_CHUNK_SIZE", "1024"))
 
+# Streaming voice replies: the LLM answer is split into segments of at least
+# VOICE_SEGMENT_MIN_CHARS, each synthesised as soon as it completes
+VOICE_SEGMENT_MIN_CHARS = int(os.getenv("VOICE_SEGMENT_MIN_CHARS", "40"))
+VOICE_SEGMENT_MAX_CHARS = int(os.getenv("VOICE_SEGMENT_MAX_CHARS", "300"))
+VOICE_TTS_CONCURRENCY = int(os.getenv("VOICE_TTS_CONCURRENCY", "2"))
+
+# Voice WebSocket: seconds to send the auth message, largest buffered utterance, idle close
+VOICE_WS_AUTH_TIMEOUT_SECONDS = float(os.getenv("VOICE_WS_AUTH_TIMEOUT_SECONDS", "10"))
+VOICE_WS_MAX_UTTERANCE_BYTES = int(os.getenv("VOICE_WS_MAX_UTTERANCE_BYTES", str(10 * 1024 * 1024)))
+VOICE_WS_IDLE_TIMEOUT_SECONDS = float(os.getenv("VOICE_WS_IDLE_TIMEOUT_SECONDS", "300"))
+
+# Operational metrics: served to loopback callers, or to anyone sending this key as X-Metrics-Key
+METRICS_API_KEY = os.getenv("METRICS_API_KEY", "")
+
 # Validate required environment variables
 required_vars = [
     "SUPABASE_URL", "SUPABASE_KEY", 
@@ -0,0 +1,190 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Disk hits are recorded in memory and their last_used written in batches of this size
+TOUCH_BATCH = 256
+
+class EmbeddingCache:
+    """Two-tier embedding cache keyed by (model, sha256(text))
+
+    An in-process LRU sits in front of a size-bounded SQLite table so
+    repeated texts are embedded once, across requests and restarts.
+    Vectors are held as float32 arrays in both tiers. Disk reads run in a
+    worker thread and all disk writes, including batched last_used
+    updates, go through one writer thread, so the event loop never waits
+    on SQLite. The connection has its own lock; the lock taken on the
+    event loop only guards the in-memory tier.
+    """
+
+    def __init__(self, path: str, memory_items: int = 5000, disk_items: int = 200000):
+        self.memory_items = memory_items
+        self.disk_items = disk_items
+        self._memory = OrderedDict()
+        self._touches = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embedding-cache")
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.write_errors = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, embedding BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._disk_count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    @staticmethod
+    def make_key(model: str, text: str) -> str:
+        return f"{model}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    async def get_many(self, model: str, texts: list) -> List[Optional[list]]:
+        """Look up embeddings for texts, returning None for each miss"""
+        keys = [self.make_key(model, text) for text in texts]
+        results = [None] * len(texts)
+        disk_lookup = {}
+
+        with self._lock:
+            for i, key in enumerate(keys):
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    results[i] = self._memory[key].tolist()
+                    self.memory_hits += 1
+                else:
+                    disk_lookup.setdefault(key, []).append(i)
+
+        if disk_lookup:
+            found = await asyncio.to_thread(self._read_disk, list(disk_lookup))
+            with self._lock:
+                for key, positions in disk_lookup.items():
+                    vector = found.get(key)
+                    if vector is None:
+                        self.misses += len(positions)
+                        continue
+                    self.disk_hits += len(positions)
+                    self._remember(key, vector)
+                    embedding = vector.tolist()
+                    for i in positions:
+                        results[i] = embedding
+            if found:
+                self._touch(found)
+
+        return results
+
+    def put_many(self, model: str, texts: list, embeddings: list):
+        """Store embeddings in memory now and on disk in the background"""
+        now = time.time()
+        rows = []
+        with self._lock:
+            for text, embedding in zip(texts, embeddings):
+                key = self.make_key(model, text)
+                vector = array("f", embedding)
+                self._remember(key, vector)
+                rows.append((key, vector.tobytes(), now))
+            touches, self._touches = self._touches, {}
+        self._writer.submit(self._write_disk, rows, touches)
+
+    def close(self):
+        """Write out pending last_used updates and wait for queued writes"""
+        with self._lock:
+            touches, self._touches = self._touches, {}
+        if touches:
+            self._writer.submit(self._write_disk, [], touches)
+        self._writer.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes"""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "memory_items": len(self._memory),
+            "disk_items": self._disk_count,
+            "write_errors": self.write_errors
+        }
+
+    def _remember(self, key: str, vector: array):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _touch(self, keys):
+        now = time.time()
+        with self._lock:
+            for key in keys:
+                self._touches[key] = now
+            if len(self._touches) < TOUCH_BATCH:
+                return
+            touches, self._touches = self._touches, {}
+        self._writer.submit(self._write_disk, [], touches)
+
+    def _read_disk(self, keys: list) -> dict:
+        found = {}
+        try:
+            with self._db_lock:
+                # Stay well under SQLite's bound-parameter limit
+                for start in range(0, len(keys), 500):
+                    batch = keys[start:start + 500]
+                    placeholders = ",".join("?" * len(batch))
+                    rows = self._conn.execute(
+                        f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                        batch
+                    ).fetchall()
+                    for key, blob in rows:
+                        found[key] = array("f", blob)
+        except sqlite3.Error as e:
+            logger.error(f"Error reading embedding cache: {e}")
+        return found
+
+    def _write_disk(self, rows: list, touches: dict):
+        """Runs on the writer thread: insert new rows and apply batched last_used updates"""
+        try:
+            with self._db_lock:
+                before = self._conn.total_changes
+                if rows:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO embeddings (key, embedding, last_used) VALUES (?, ?, ?)",
+                        rows
+                    )
+                    self._disk_count += self._conn.total_changes - before
+                if touches:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                        [(used, key) for key, used in touches.items()]
+                    )
+                self._evict_disk()
+                self._conn.commit()
+        except sqlite3.Error as e:
+            self.write_errors += 1
+            logger.error(f"Error writing embedding cache: {e}")
+
+    def _evict_disk(self):
+        overflow = self._disk_count - self.disk_items
+        if overflow <= 0:
+            return
+        self._conn.execute(
+            "DELETE FROM embeddings WHERE key IN "
+            "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+            (overflow,)
+        )
+        self._disk_count -= overflow
@@ -0,0 +1,179 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+class JobQueue:
+    """Local SQLite-backed queue for multi-stage background jobs
+
+    Each job records its payload, per-stage progress and any intermediate
+    state, so work interrupted by a restart can resume from the last
+    completed stage.
+
+    Several processes may share the database. A claim is a conditional
+    UPDATE, so only one process wins each job, and it holds a lease that
+    its worker renews with heartbeat(). Only jobs whose lease has expired
+    are handed back to the queue. Methods block, so async callers run
+    them with asyncio.to_thread.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                stages TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                error TEXT,
+                claimed_by TEXT,
+                lease_expires_at REAL,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL
+            )"""
+        )
+        # Databases created before leases were added
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "claimed_by" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN claimed_by TEXT")
+        if "lease_expires_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN lease_expires_at REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        self._conn.commit()
+
+    def enqueue(self, job_id: str, user_id: str, kind: str, stages: list, payload: dict) -> dict:
+        """Add a queued job with every stage pending"""
+        now = datetime.utcnow().isoformat()
+        stage_progress = {stage: {"status": "pending"} for stage in stages}
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_id, kind, status, stages, payload, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?, ?)",
+                (job_id, user_id, kind, json.dumps(stage_progress), json.dumps(payload), now, now)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+
+    def claim_next(self) -> Optional[dict]:
+        """Claim the oldest queued job for this process and return it, or None if the queue is empty"""
+        while True:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if not row:
+                    return None
+                # Another process may claim the same row between the SELECT and the UPDATE
+                cursor = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', claimed_by = ?, lease_expires_at = ?, updated_at = ? "
+                    "WHERE id = ? AND status = 'queued'",
+                    (self.owner, time.time() + self.lease_seconds, datetime.utcnow().isoformat(), row["id"])
+                )
+                self._conn.commit()
+            if cursor.rowcount == 1:
+                return self.get(row["id"])
+
+    def heartbeat(self, job_id: str) -> bool:
+        """Extend this process's lease on a running job, returning False if the lease was lost"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = 'running' AND claimed_by = ?",
+                (time.time() + self.lease_seconds, job_id, self.owner)
+            )
+            self._conn.commit()
+        return cursor.rowcount == 1
+
+    def update_stage(self, job_id: str, stage: str, status: str, state: Optional[dict] = None, **progress):
+        """Record a stage's status (plus optional progress fields and job state) on a job this process holds"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT stages FROM jobs WHERE id = ? AND claimed_by = ?", (job_id, self.owner)
+            ).fetchone()
+            if not row:
+                return
+            stages = json.loads(row["stages"])
+            stages[stage] = {"status": status, **progress}
+
+            if state is None:
+                self._conn.execute(
+                    "UPDATE jobs SET stages = ?, updated_at = ? WHERE id = ? AND claimed_by = ?",
+                    (json.dumps(stages), datetime.utcnow().isoformat(), job_id, self.owner)
+                )
+            else:
+                self._conn.execute(
+                    "UPDATE jobs SET stages = ?, state = ?, updated_at = ? WHERE id = ? AND claimed_by = ?",
+                    (json.dumps(stages), json.dumps(state), datetime.utcnow().isoformat(), job_id, self.owner)
+                )
+            self._conn.commit()
+
+    def complete(self, job_id: str, result: dict):
+        """Mark a job completed and drop its intermediate state"""
+        self._finish(job_id, "completed", result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        """Mark a job failed"""
+        self._finish(job_id, "failed", error=error)
+
+    def requeue_expired(self) -> int:
+        """Return running jobs whose lease has expired (their process died) to the queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', claimed_by = NULL, lease_expires_at = NULL, updated_at = ? "
+                "WHERE status = 'running' AND (lease_expires_at IS NULL OR lease_expires_at < ?)",
+                (datetime.utcnow().isoformat(), time.time())
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def get(self, job_id: str, user_id: Optional[str] = None) -> Optional[dict]:
+        """Get a job, optionally scoped to its owner"""
+        with self._lock:
+            if user_id is None:
+                row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT * FROM jobs WHERE id = ? AND user_id = ?", (job_id, user_id)
+                ).fetchone()
+        if not row:
+            return None
+
+        return {
+            "id": row["id"],
+            "user_id": row["user_id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "stages": json.loads(row["stages"]),
+            "payload": json.loads(row["payload"]),
+            "state": json.loads(row["state"]),
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def _finish(self, job_id: str, status: str, result: Optional[str] = None, error: Optional[str] = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, state = '{}', result = ?, error = ?, lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND claimed_by = ?",
+                (status, result, error, datetime.utcnow().isoformat(), job_id, self.owner)
+            )
+            self._conn.commit()
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+import logging
+
+from utils.config import LISTING_CACHE_TTL_SECONDS, LISTING_CACHE_MAX_USERS
+from utils.shared_versions import VersionStore, create_version_store
+
+logger = logging.getLogger(__name__)
+
+class ListingCache:
+    """Per-user read-through cache for listings that change only on upload and delete
+
+    Each entry carries a content hash used as its ETag, so a client holding
+    the current ETag can be answered with 304 without touching the
+    database. Entries are held per process but tagged with the user's
+    version in a shared VersionStore; writers bump that version, so an
+    upload handled by one worker invalidates the listing in all of them.
+    """
+
+    def __init__(self, ttl: float, max_users: int, versions: VersionStore):
+        self.ttl = ttl
+        self.max_users = max_users
+        self.versions = versions
+        self._users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.invalidations = 0
+
+    async def match(self, user_id: str, key: str, if_none_match: Optional[str]) -> Optional[str]:
+        """ETag of the cached listing if the client already holds it, else None"""
+        if not if_none_match:
+            return None
+        entry = await self._get_entry(user_id, key)
+        if entry and etag_matches(if_none_match, entry["etag"]):
+            self.not_modified += 1
+            return entry["etag"]
+        return None
+
+    async def get(self, user_id: str, key: str, loader: Callable[[], Awaitable]) -> tuple:
+        """Get a listing and its ETag, loading it on a miss"""
+        version = await self.versions.get(user_id)
+        entry = self._get_entry_at(user_id, key, version)
+        if entry:
+            self.hits += 1
+            return entry["value"], entry["etag"]
+
+        self.misses += 1
+        value = await loader()
+        etag = make_etag(value)
+
+        # Tagged with the version read before loading, so a write that lands
+        # mid-load leaves the entry already stale
+        if self.ttl > 0:
+            self._users.setdefault(user_id, {})[key] = {
+                "value": value,
+                "etag": etag,
+                "version": version,
+                "expires_at": time.monotonic() + self.ttl
+            }
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        return value, etag
+
+    async def invalidate_user(self, user_id: str):
+        """Drop every cached listing for a user, in this worker and all others"""
+        self._users.pop(user_id, None)
+        self.invalidations += 1
+        try:
+            await self.versions.bump(user_id)
+            logger.info(f"Invalidated listing cache for user {user_id}")
+        except Exception as e:
+            # The write itself succeeded; other workers fall back to the TTL
+            logger.error(f"Error bumping listing version for user {user_id}: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses + self.not_modified
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": round((self.hits + self.not_modified) / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+            "users": len(self._users)
+        }
+
+    async def _get_entry(self, user_id: str, key: str) -> Optional[dict]:
+        if not self._users.get(user_id):
+            return None
+        return self._get_entry_at(user_id, key, await self.versions.get(user_id))
+
+    def _get_entry_at(self, user_id: str, key: str, version: int) -> Optional[dict]:
+        entries = self._users.get(user_id)
+        entry = entries.get(key) if entries else None
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.monotonic() or entry["version"] != version:
+            del entries[key]
+            return None
+        self._users.move_to_end(user_id)
+        return entry
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header names the ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+def make_etag(value) -> str:
+    """Strong ETag from the JSON form of a value"""
+    payload = json.dumps(value, sort_keys=True, default=str).encode()
+    return '"' + hashlib.sha256(payload).hexdigest()[:32] + '"'
+
+listing_cache = ListingCache(LISTING_CACHE_TTL_SECONDS, LISTING_CACHE_MAX_USERS, create_version_store("listings"))
@@ -1,13 +1,153 @@
-import requests
-from utils.config import OPENROUTER_API_KEY
+import asyncio
+import json
+import re
+import httpx
+from utils.config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_BASE_URL,
+    AI_CONNECT_TIMEOUT,
+    AI_EMBEDDING_TIMEOUT,
+    AI_CHAT_TIMEOUT,
+    AI_MAX_CONNECTIONS,
+    AI_MAX_KEEPALIVE_CONNECTIONS,
+    AI_HTTP2,
+    EMBEDDING_CACHE_ENABLED,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_CACHE_MEMORY_ITEMS,
+    EMBEDDING_CACHE_DISK_ITEMS,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_BATCH_MAX_ITEMS,
+    EMBEDDING_CONCURRENCY,
+    EMBEDDING_MAX_RETRIES,
+    GENERATION_SHARD_SIZE,
+    GENERATION_DUPLICATE_SIMILARITY,
+    GENERATION_REPAIR_ATTEMPTS
+)
+from utils.embedding_cache import EmbeddingCache
+from models.schemas import QuizQuestion, Flashcard
+from pydantic import ValidationError
 import logging
 
 logger = logging.getLogger(__name__)
 
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting requests (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (installed via httpx[http2])"""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+class JSONArrayStreamParser:
+    """Incrementally extracts the elements of the first JSON array in a text stream
+    
+    Anything before the array (markdown fences, preamble) or after it is
+    ignored. Each element is parsed as soon as it is complete; an element
+    that is not valid JSON is counted and skipped instead of failing the
+    whole array, and a truncated final element is dropped.
+    """
+    
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0  # 0 = before the array, 1 = between its elements
+        self._in_string = False
+        self._escaped = False
+        self._item_start = None
+        self.done = False
+        self.invalid = 0
+    
+    def feed(self, text: str) -> list:
+        """Add text, returning the elements completed by it"""
+        items = []
+        if self.done:
+            return items
+        
+        buffer = self._buffer + text
+        i = self._pos
+        while i < len(buffer):
+            char = buffer[i]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._depth == 0:
+                if char == "[":
+                    self._depth = 1
+            elif char in "{[":
+                if self._depth == 1 and self._item_start is None:
+                    self._item_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._item_start is not None:
+                    self._emit(buffer[self._item_start:i + 1], items)
+                elif self._depth == 0:
+                    # End of the array; a pending scalar element ends here too
+                    if self._item_start is not None:
+                        self._emit(buffer[self._item_start:i], items)
+                    self.done = True
+                    break
+            elif char == "," and self._depth == 1:
+                if self._item_start is not None:
+                    self._emit(buffer[self._item_start:i], items)
+            elif not char.isspace() and self._depth == 1 and self._item_start is None:
+                # Scalar element (string, number, literal)
+                self._item_start = i
+                if char == '"':
+                    self._in_string = True
+            elif char == '"':
+                self._in_string = True
+            i += 1
+        
+        # Keep only the unfinished element
+        keep_from = i if self._item_start is None else self._item_start
+        self._buffer = buffer[keep_from:]
+        self._pos = i - keep_from
+        if self._item_start is not None:
+            self._item_start = 0
+        return items
+    
+    def close(self):
+        """Finish the stream, counting a truncated trailing element as invalid"""
+        if not self.done and self._item_start is not None:
+            self.invalid += 1
+        self.done = True
+    
+    def _emit(self, text: str, items: list):
+        self._item_start = None
+        try:
+            items.append(json.loads(text.strip()))
+        except json.JSONDecodeError:
+            self.invalid += 1
+
+def parse_json_array(text: str) -> list:
+    """Tolerantly parse the elements of the first JSON array in text"""
+    parser = JSONArrayStreamParser()
+    items = parser.feed(text)
+    parser.close()
+    return items
+
+def _validate_quiz_question(item):
+    question = QuizQuestion.model_validate(item)
+    if len(question.options) < 2 or not 0 <= question.correct_answer < len(question.options):
+        raise ValueError("correct_answer does not index an option")
+    return question.model_dump()
+
+def _validate_flashcard(item):
+    return Flashcard.model_validate(item).model_dump()
+
 class AIClient:
     def __init__(self):
         self.api_key = OPENROUTER_API_KEY
-        self.base_url = "https://openrouter.ai/api/v1"
+        self.base_url = OPENROUTER_BASE_URL
         self.embedding_model = "text-embedding-3-small"  # OpenAI embedding model via OpenRouter
         self.chat_model = "openai/gpt-3.5-turbo"  # GPT-3.5 Turbo via OpenRouter
         self.headers = {
@@ -16,20 +156,119 @@ class AIClient:
             "HTTP-Referer": "http://localhost:3000",  # Optional: for OpenRouter analytics
             "X-Title": "Kashar AI"  # Optional: for OpenRouter analytics
         }
+        self._client = None
+        self.structured_stats = {"requests": 0, "repair_requests": 0, "valid_items": 0, "invalid_items": 0}
+        self.embedding_cache = EmbeddingCache(
+            EMBEDDING_CACHE_PATH,
+            memory_items=EMBEDDING_CACHE_MEMORY_ITEMS,
+            disk_items=EMBEDDING_CACHE_DISK_ITEMS
+        ) if EMBEDDING_CACHE_ENABLED else None
+    
+    def _get_client(self) -> httpx.AsyncClient:
+        """Get the shared pooled HTTP client, creating it on first use"""
+        if self._client is None or self._client.is_closed:
+            http2 = AI_HTTP2 and _http2_available()
+            if AI_HTTP2 and not http2:
+                logger.warning("h2 package not installed, AI client falling back to HTTP/1.1")
+            
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=self.headers,
+                http2=http2,
+                limits=httpx.Limits(
+                    max_connections=AI_MAX_CONNECTIONS,
+                    max_keepalive_connections=AI_MAX_KEEPALIVE_CONNECTIONS
+                ),
+                timeout=httpx.Timeout(AI_CHAT_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
+            )
+        return self._client
+    
+    async def close(self):
+        """Close the shared HTTP client and its pooled connections"""
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
     
     async def generate_embeddings(self, texts: list) -> list:
-        """Generate embeddings for a list of texts"""
+        """Generate embeddings for a list of texts, serving repeats from the cache"""
+        if self.embedding_cache is None:
+            return await self._request_embeddings(texts)
+        
+        embeddings = await self.embedding_cache.get_many(self.embedding_model, texts)
+        
+        # Only send texts we have never embedded, once each
+        missing = list(dict.fromkeys(text for text, embedding in zip(texts, embeddings) if embedding is None))
+        if missing:
+            fetched = dict(zip(missing, await self._request_embeddings(missing)))
+            self.embedding_cache.put_many(self.embedding_model, missing, [fetched[text] for text in missing])
+            embeddings = [
+                embedding if embedding is not None else fetched[text]
+                for text, embedding in zip(texts, embeddings)
+            ]
+        
+        return embeddings
+    
+    async def generate_embeddings_batched(self, texts: list, progress_callback=None) -> list:
+        """Embed a large list of texts in token-budgeted batches run concurrently
+        
+        Batches are bounded by EMBEDDING_BATCH_TOKENS / EMBEDDING_BATCH_MAX_ITEMS,
+        at most EMBEDDING_CONCURRENCY run at once, and each failed batch is
+        retried on its own. Embeddings are returned in input order.
+        progress_callback, if given, is called (or awaited, if async) with (completed, total) batches.
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for text in texts:
+            tokens = estimate_tokens(text)
+            if current and (current_tokens + tokens > EMBEDDING_BATCH_TOKENS or len(current) >= EMBEDDING_BATCH_MAX_ITEMS):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(text)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        
+        semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+        completed = 0
+        
+        async def embed_batch(index: int, batch: list) -> list:
+            nonlocal completed
+            async with semaphore:
+                for attempt in range(EMBEDDING_MAX_RETRIES + 1):
+                    try:
+                        embeddings = await self.generate_embeddings(batch)
+                        break
+                    except Exception as e:
+                        if attempt == EMBEDDING_MAX_RETRIES:
+                            raise
+                        delay = 2 ** attempt
+                        logger.warning(f"Embedding batch {index} failed ({e}), retrying in {delay}s")
+                        await asyncio.sleep(delay)
+            
+            completed += 1
+            if progress_callback:
+                result = progress_callback(completed, len(batches))
+                if asyncio.iscoroutine(result):
+                    await result
+            return embeddings
+        
+        results = await asyncio.gather(*(embed_batch(i, batch) for i, batch in enumerate(batches)))
+        
+        logger.info(f"Embedded {len(texts)} texts in {len(batches)} batches")
+        return [embedding for batch_embeddings in results for embedding in batch_embeddings]
+    
+    async def _request_embeddings(self, texts: list) -> list:
+        """Request embeddings from the provider"""
         try:
             payload = {
                 "model": self.embedding_model,
                 "input": texts
             }
             
-            response = requests.post(
-                f"{self.base_url}/embeddings",
-                headers=self.headers,
+            response = await self._get_client().post(
+                "/embeddings",
                 json=payload,
-                timeout=30
+                timeout=httpx.Timeout(AI_EMBEDDING_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
             )
             response.raise_for_status()
             
@@ -49,11 +288,10 @@ class AIClient:
                 "temperature": 0.7
             }
             
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
+            response = await self._get_client().post(
+                "/chat/completions",
                 json=payload,
-                timeout=60
+                timeout=httpx.Timeout(AI_CHAT_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
             )
             response.raise_for_status()
             
@@ -63,9 +301,94 @@ class AIClient:
             logger.error(f"Error in chat completion: {e}")
             raise
     
+    async def chat_completion_stream(self, messages: list, max_tokens: int = 1000):
+        """Stream a chat completion, yielding content tokens as they arrive"""
+        payload = {
+            "model": self.chat_model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "temperature": 0.7,
+            "stream": True
+        }
+        
+        try:
+            async with self._get_client().stream(
+                "POST",
+                "/chat/completions",
+                json=payload,
+                timeout=httpx.Timeout(AI_CHAT_TIMEOUT, connect=AI_CONNECT_TIMEOUT)
+            ) as response:
+                response.raise_for_status()
+                
+                # Server-sent events: "data: {json}" lines, ":" comment keep-alives, "[DONE]" terminator
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    
+                    token = (choices[0].get("delta") or {}).get("content")
+                    if token:
+                        yield token
+        except Exception as e:
+            logger.error(f"Error in streaming chat completion: {e}")
+            raise
+    
+    async def stream_json_items(self, messages: list, max_tokens: int = 1000):
+        """Stream a completion, yielding elements of its JSON array as each completes"""
+        parser = JSONArrayStreamParser()
+        try:
+            async for token in self.chat_completion_stream(messages, max_tokens=max_tokens):
+                for item in parser.feed(token):
+                    yield item
+        finally:
+            parser.close()
+            self.structured_stats["invalid_items"] += parser.invalid
+    
+    async def generate_items(self, build_prompt, count: int, validate, max_tokens: int = 1500) -> list:
+        """Generate count schema-valid items, requesting only the missing ones on a shortfall
+        
+        build_prompt(n, existing) returns the prompt asking for n more items
+        given the valid items so far; validate(item) returns the cleaned item
+        or raises.
+        """
+        items = []
+        for attempt in range(GENERATION_REPAIR_ATTEMPTS + 1):
+            if attempt:
+                self.structured_stats["repair_requests"] += 1
+                logger.info(f"Requesting {count - len(items)} missing items")
+            else:
+                self.structured_stats["requests"] += 1
+            
+            messages = [{"role": "user", "content": build_prompt(count - len(items), items)}]
+            async for item in self.stream_json_items(messages, max_tokens=max_tokens):
+                if len(items) >= count:
+                    continue
+                try:
+                    items.append(validate(item))
+                    self.structured_stats["valid_items"] += 1
+                except (ValidationError, ValueError, TypeError) as e:
+                    self.structured_stats["invalid_items"] += 1
+                    logger.warning(f"Discarding invalid generated item: {e}")
+            
+            if len(items) >= count:
+                break
+        
+        if not items:
+            raise ValueError("Model output contained no valid items")
+        return items
+    
     async def generate_quiz_questions(self, context: str, topic: str, difficulty: str, num_questions: int = 5) -> list:
         """Generate quiz questions based on context"""
-        prompt = f"""Based on the following study material about {topic}, create {num_questions} multiple choice questions at {difficulty} difficulty level.
+        def build_prompt(count: int, existing: list) -> str:
+            prompt = f"""Based on the following study material about {topic}, create {count} multiple choice questions at {difficulty} difficulty level.
 
 Study Material:
 {context}
@@ -76,22 +399,20 @@ Format each question as JSON with:
 - "correct_answer": index (0-3) of correct option
 
 Return only a JSON array of questions, no additional text."""
-
+            if existing:
+                prompt += "\n\nDo not repeat these existing questions:\n" + "\n".join(f"- {item['question']}" for item in existing)
+            return prompt
+        
         try:
-            messages = [{"role": "user", "content": prompt}]
-            response = await self.chat_completion(messages, max_tokens=1500)
-            
-            # Parse JSON response
-            import json
-            questions = json.loads(response)
-            return questions
+            return await self.generate_items(build_prompt, num_questions, _validate_quiz_question, max_tokens=1500)
         except Exception as e:
             logger.error(f"Error generating quiz questions: {e}")
             raise
     
     async def generate_flashcards(self, context: str, topic: str, num_cards: int = 10) -> list:
         """Generate flashcards based on context"""
-        prompt = f"""Based on the following study material about {topic}, create {num_cards} flashcards.
+        def build_prompt(count: int, existing: list) -> str:
+            prompt = f"""Based on the following study material about {topic}, create {count} flashcards.
 
 Study Material:
 {context}
@@ -101,18 +422,66 @@ Format each flashcard as JSON with:
 - "answer": the answer or explanation
 
 Return only a JSON array of flashcards, no additional text."""
-
+            if existing:
+                prompt += "\n\nDo not repeat these existing flashcards:\n" + "\n".join(f"- {item['question']}" for item in existing)
+            return prompt
+        
         try:
-            messages = [{"role": "user", "content": prompt}]
-            response = await self.chat_completion(messages, max_tokens=1500)
-            
-            # Parse JSON response
-            import json
-            flashcards = json.loads(response)
-            return flashcards
+            return await self.generate_items(build_prompt, num_cards, _validate_flashcard, max_tokens=1500)
         except Exception as e:
             logger.error(f"Error generating flashcards: {e}")
             raise
+    
+    async def generate_quiz_questions_sharded(self, context_chunks: list, topic: str, difficulty: str, num_questions: int = 5) -> list:
+        """Generate quiz questions in parallel shards over groups of chunks"""
+        return await self._generate_sharded(
+            context_chunks, num_questions,
+            lambda context, count: self.generate_quiz_questions(context, topic, difficulty, count)
+        )
+    
+    async def generate_flashcards_sharded(self, context_chunks: list, topic: str, num_cards: int = 10) -> list:
+        """Generate flashcards in parallel shards over groups of chunks"""
+        return await self._generate_sharded(
+            context_chunks, num_cards,
+            lambda context, count: self.generate_flashcards(context, topic, count)
+        )
+    
+    async def _generate_sharded(self, context_chunks: list, total: int, generate) -> list:
+        """Split a generation into concurrent shards of at most GENERATION_SHARD_SIZE items
+        
+        Each shard sees its own group of chunks, so shards cover different
+        material. Results are merged and de-duplicated by question text;
+        failed shards are skipped as long as at least one succeeds.
+        """
+        shard_count = max(1, -(-total // GENERATION_SHARD_SIZE))
+        shard_count = min(shard_count, max(1, len(context_chunks)))
+        counts = [total // shard_count + (1 if i < total % shard_count else 0) for i in range(shard_count)]
+        # Round-robin keeps the most relevant chunks spread across shards
+        groups = [context_chunks[i::shard_count] for i in range(shard_count)]
+        
+        results = await asyncio.gather(
+            *(generate("\n\n".join(group), count) for group, count in zip(groups, counts)),
+            return_exceptions=True
+        )
+        
+        items, seen, failures = [], [], 0
+        for result in results:
+            if isinstance(result, Exception):
+                failures += 1
+                continue
+            for item in result:
+                # Word-set overlap catches rephrasings without merging questions that differ in a key term
+                words = set(re.findall(r"\w+", str(item.get("question", "")).lower())) if isinstance(item, dict) else set()
+                if words and any(len(words & other) / len(words | other) >= GENERATION_DUPLICATE_SIMILARITY for other in seen):
+                    continue
+                seen.append(words)
+                items.append(item)
+        
+        if failures == len(results):
+            raise results[0]
+        if failures:
+            logger.warning(f"{failures} of {len(results)} generation shards failed; returning {len(items)} items")
+        return items[:total]
 
 # Global AI client instance
 ai_client = AIClient()
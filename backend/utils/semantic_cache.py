@@ -0,0 +1,154 @@
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+import numpy as np
+
+from utils.config import (
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MAX_USERS
+)
+from utils.shared_versions import VersionStore, create_version_store
+
+logger = logging.getLogger(__name__)
+
+class SemanticResponseCache:
+    """Per-user cache of tutor answers keyed by query embedding
+
+    A lookup returns the stored answer of the most similar earlier
+    question when its cosine similarity clears the threshold and the
+    entry is younger than the TTL. Entries are held per process, in an
+    LRU of at most max_users users, and tagged with the user's version in
+    a shared VersionStore. Invalidating a user (on any change to their
+    documents) bumps that version, dropping their entries in every worker.
+    """
+
+    def __init__(self, threshold: float, ttl: float, max_entries: int, max_users: int, versions: VersionStore):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_users = max_users
+        self.versions = versions
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.latency_saved_ms = 0
+
+    async def version(self, user_id: str) -> int:
+        """The user's current cache version, to pass to lookup and store"""
+        return await self.versions.get(user_id)
+
+    def lookup(self, user_id: str, embedding: list, version: int) -> Optional[dict]:
+        """Get a cached response for a similar question, or None"""
+        query = self._normalize(embedding)
+        with self._lock:
+            self.lookups += 1
+            entries = self._live_entries(user_id, version, time.time())
+            if not entries:
+                return None
+
+            similarities = np.stack([entry["embedding"] for entry in entries]) @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                return None
+
+            entry = entries[best]
+            self.hits += 1
+            self.latency_saved_ms += entry["cost_ms"]
+            return {
+                "response": entry["response"],
+                "sources": entry["sources"],
+                "similarity": float(similarities[best])
+            }
+
+    def store(self, user_id: str, embedding: list, response: str, sources: Optional[list], cost_ms: int, version: int):
+        """Cache a response along with the time it took to produce
+
+        version is the one read before the response was generated, so an
+        answer built from documents that changed meanwhile is not kept.
+        """
+        now = time.time()
+        entry = {
+            "embedding": self._normalize(embedding),
+            "response": response,
+            "sources": sources,
+            "cost_ms": cost_ms,
+            "created_at": now
+        }
+        with self._lock:
+            self._reap(now)
+            bucket = self._users.get(user_id)
+            if bucket is not None and bucket["version"] > version:
+                return
+            if bucket is None or bucket["version"] != version:
+                bucket = self._users[user_id] = {"version": version, "entries": []}
+            entries = bucket["entries"]
+            entries[:] = [cached for cached in entries if now - cached["created_at"] < self.ttl]
+            entries.append(entry)
+            if len(entries) > self.max_entries:
+                del entries[0]
+            self._users.move_to_end(user_id)
+            while len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+
+    async def invalidate_user(self, user_id: str):
+        """Drop every cached response for a user, in this worker and all others"""
+        with self._lock:
+            self._users.pop(user_id, None)
+        try:
+            await self.versions.bump(user_id)
+            logger.info(f"Invalidated semantic cache for user {user_id}")
+        except Exception as e:
+            # Other workers keep serving this user's answers until they expire
+            logger.error(f"Error bumping semantic cache version for user {user_id}: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_ratio": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "latency_saved_ms": self.latency_saved_ms,
+            "users": len(self._users),
+            "entries": sum(len(bucket["entries"]) for bucket in self._users.values())
+        }
+
+    def _live_entries(self, user_id: str, version: int, now: float) -> Optional[list]:
+        bucket = self._users.get(user_id)
+        if bucket is None:
+            return None
+        entries = bucket["entries"]
+        entries[:] = [entry for entry in entries if now - entry["created_at"] < self.ttl]
+        if bucket["version"] != version or not entries:
+            del self._users[user_id]
+            return None
+        self._users.move_to_end(user_id)
+        return entries
+
+    def _reap(self, now: float):
+        # Least recently used users first; stop at the first with a live entry
+        while self._users:
+            user_id, bucket = next(iter(self._users.items()))
+            if bucket["entries"] and now - bucket["entries"][-1]["created_at"] < self.ttl:
+                break
+            del self._users[user_id]
+
+    @staticmethod
+    def _normalize(embedding: list) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+# Opt-in: None unless SEMANTIC_CACHE_ENABLED is set
+semantic_cache = SemanticResponseCache(
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL_SECONDS,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_MAX_USERS,
+    create_version_store("semantic")
+) if SEMANTIC_CACHE_ENABLED else None
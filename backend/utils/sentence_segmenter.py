@@ -0,0 +1,64 @@
+import re
+from typing import List
+
+# Terminal punctuation (plus any closing quotes or brackets) followed by whitespace, or a line break
+_BOUNDARY = re.compile(r"[.!?]+[\"')\]]*\s+|\n+")
+_ABBREVIATIONS = {"e.g.", "i.e.", "etc.", "vs.", "mr.", "mrs.", "ms.", "dr.", "prof.", "st.", "fig.", "no.", "approx."}
+_MARKDOWN = re.compile(r"[*_`#>]+|^\s*(?:[-+]|\d+\.)\s+", re.MULTILINE)
+
+class SentenceSegmenter:
+    """Splits streamed LLM text into speakable segments as soon as each one ends
+
+    Segments end at sentence punctuation followed by whitespace or at a
+    line break. Segments shorter than min_chars are merged with the next
+    so TTS is not called for fragments, and text running past max_chars
+    without a boundary is cut at the last comma or space.
+    """
+
+    def __init__(self, min_chars: int = 40, max_chars: int = 300):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """Add streamed text, returning the segments it completed"""
+        self._buffer += text
+        segments = []
+        while True:
+            end = self._find_boundary()
+            if end is None:
+                break
+            segments.extend(self._emit(self._buffer[:end]))
+            self._buffer = self._buffer[end:]
+        return segments
+
+    def flush(self) -> List[str]:
+        """Return whatever text remains at the end of the stream"""
+        remaining, self._buffer = self._buffer, ""
+        return self._emit(remaining)
+
+    def _find_boundary(self):
+        for match in _BOUNDARY.finditer(self._buffer):
+            candidate = self._buffer[:match.end()].strip()
+            last_word = candidate.rsplit(None, 1)[-1].lower() if candidate else ""
+            if last_word in _ABBREVIATIONS:
+                continue
+            if len(speakable(candidate)) >= self.min_chars:
+                return match.end()
+
+        if len(self._buffer) > self.max_chars:
+            window = self._buffer[:self.max_chars]
+            cut = max(window.rfind(", "), window.rfind("; "))
+            if cut <= 0:
+                cut = window.rfind(" ")
+            return cut + 1 if cut > 0 else self.max_chars
+        return None
+
+    @staticmethod
+    def _emit(text: str) -> List[str]:
+        segment = speakable(text)
+        return [segment] if any(char.isalnum() for char in segment) else []
+
+def speakable(text: str) -> str:
+    """Strip markdown markup and collapse whitespace so text reads naturally aloud"""
+    return " ".join(_MARKDOWN.sub("", text).split())
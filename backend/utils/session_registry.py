@@ -0,0 +1,389 @@
+import abc
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+import logging
+
+from utils.config import (
+    SESSION_REGISTRY_BACKEND,
+    SESSION_REGISTRY_PATH,
+    SESSION_REGISTRY_REDIS_URL,
+    SESSION_REAPER_INTERVAL_SECONDS,
+    VOICE_SESSION_TTL_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+class SessionRegistry(abc.ABC):
+    """Voice session state with a sliding TTL, shared by every worker using the same backend
+
+    Sessions are JSON-serialisable dicts carrying at least a user_id. Each
+    read or write extends the session's lifetime; sessions idle past the
+    TTL expire and are removed by a background reaper.
+    """
+
+    backend = None
+
+    def __init__(self, namespace: str, ttl: float, reap_interval: float):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.reap_interval = reap_interval
+        self._task = None
+        self.reaped = 0
+
+    @abc.abstractmethod
+    async def get(self, session_id: str) -> Optional[dict]:
+        """Get a live session, extending its TTL"""
+
+    @abc.abstractmethod
+    async def create(self, session_id: str, data: dict):
+        """Store a new session"""
+
+    @abc.abstractmethod
+    async def update(self, session_id: str, fields: dict) -> Optional[dict]:
+        """Merge fields into a live session, returning it (None if it has expired)"""
+
+    @abc.abstractmethod
+    async def increment(self, session_id: str, field: str, amount: int = 1) -> Optional[int]:
+        """Atomically add to a numeric field of a live session"""
+
+    @abc.abstractmethod
+    async def delete(self, session_id: str) -> bool:
+        """Remove a session, returning whether it existed"""
+
+    @abc.abstractmethod
+    async def list(self, user_id: Optional[str] = None) -> list:
+        """Live sessions, optionally for one user, each with its session_id"""
+
+    async def reap(self) -> int:
+        """Remove expired sessions, returning how many were removed"""
+        return 0
+
+    async def start(self):
+        """Start the periodic reaper"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the reaper"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "ttl": self.ttl, "reaped": self.reaped}
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.reap_interval)
+            try:
+                removed = await self.reap()
+                if removed:
+                    self.reaped += removed
+                    logger.info(f"Reaped {removed} expired {self.namespace} sessions")
+            except Exception as e:
+                logger.error(f"Error reaping {self.namespace} sessions: {e}")
+
+class MemorySessionRegistry(SessionRegistry):
+    """Per-process registry; only valid with a single worker"""
+
+    backend = "memory"
+
+    def __init__(self, namespace: str, ttl: float, reap_interval: float):
+        super().__init__(namespace, ttl, reap_interval)
+        self._sessions = {}
+
+    def _live(self, session_id: str) -> Optional[dict]:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            del self._sessions[session_id]
+            return None
+        entry["expires_at"] = time.time() + self.ttl
+        return entry["data"]
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        data = self._live(session_id)
+        return dict(data) if data is not None else None
+
+    async def create(self, session_id: str, data: dict):
+        self._sessions[session_id] = {"data": dict(data), "expires_at": time.time() + self.ttl}
+
+    async def update(self, session_id: str, fields: dict) -> Optional[dict]:
+        data = self._live(session_id)
+        if data is None:
+            return None
+        data.update(fields)
+        return dict(data)
+
+    async def increment(self, session_id: str, field: str, amount: int = 1) -> Optional[int]:
+        data = self._live(session_id)
+        if data is None:
+            return None
+        data[field] = data.get(field, 0) + amount
+        return data[field]
+
+    async def delete(self, session_id: str) -> bool:
+        return self._sessions.pop(session_id, None) is not None
+
+    async def list(self, user_id: Optional[str] = None) -> list:
+        now = time.time()
+        return [
+            {**entry["data"], "session_id": session_id}
+            for session_id, entry in self._sessions.items()
+            if entry["expires_at"] > now and (user_id is None or entry["data"].get("user_id") == user_id)
+        ]
+
+    async def reap(self) -> int:
+        now = time.time()
+        expired = [session_id for session_id, entry in self._sessions.items() if entry["expires_at"] <= now]
+        for session_id in expired:
+            del self._sessions[session_id]
+        return len(expired)
+
+class SQLiteSessionRegistry(SessionRegistry):
+    """Registry in a local SQLite file, shared by all workers on one host"""
+
+    backend = "sqlite"
+
+    def __init__(self, namespace: str, ttl: float, reap_interval: float, path: str):
+        super().__init__(namespace, ttl, reap_interval)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS sessions (
+                namespace TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                PRIMARY KEY (namespace, session_id)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(namespace, user_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions(expires_at)")
+        self._conn.commit()
+
+    def _execute_sync(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    async def _execute(self, sql: str, params: tuple) -> list:
+        # A busy database can block for up to the connection timeout, so keep it off the event loop
+        return await asyncio.to_thread(self._execute_sync, sql, params)
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        now = time.time()
+        rows = await self._execute(
+            "UPDATE sessions SET expires_at = ? WHERE namespace = ? AND session_id = ? AND expires_at > ? RETURNING data",
+            (now + self.ttl, self.namespace, session_id, now)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def create(self, session_id: str, data: dict):
+        await self._execute(
+            "INSERT OR REPLACE INTO sessions (namespace, session_id, user_id, data, expires_at) VALUES (?, ?, ?, ?, ?)",
+            (self.namespace, session_id, data["user_id"], json.dumps(data), time.time() + self.ttl)
+        )
+
+    async def update(self, session_id: str, fields: dict) -> Optional[dict]:
+        # json_patch merges in one statement, so concurrent workers cannot lose each other's fields
+        now = time.time()
+        rows = await self._execute(
+            "UPDATE sessions SET data = json_patch(data, ?), expires_at = ? "
+            "WHERE namespace = ? AND session_id = ? AND expires_at > ? RETURNING data",
+            (json.dumps(fields), now + self.ttl, self.namespace, session_id, now)
+        )
+        return json.loads(rows[0][0]) if rows else None
+
+    async def increment(self, session_id: str, field: str, amount: int = 1) -> Optional[int]:
+        now = time.time()
+        path = f"$.{field}"
+        rows = await self._execute(
+            "UPDATE sessions SET data = json_set(data, ?, COALESCE(json_extract(data, ?), 0) + ?), expires_at = ? "
+            "WHERE namespace = ? AND session_id = ? AND expires_at > ? RETURNING json_extract(data, ?)",
+            (path, path, amount, now + self.ttl, self.namespace, session_id, now, path)
+        )
+        return rows[0][0] if rows else None
+
+    async def delete(self, session_id: str) -> bool:
+        rows = await self._execute(
+            "DELETE FROM sessions WHERE namespace = ? AND session_id = ? RETURNING session_id",
+            (self.namespace, session_id)
+        )
+        return bool(rows)
+
+    async def list(self, user_id: Optional[str] = None) -> list:
+        if user_id is None:
+            rows = await self._execute(
+                "SELECT session_id, data FROM sessions WHERE namespace = ? AND expires_at > ?",
+                (self.namespace, time.time())
+            )
+        else:
+            rows = await self._execute(
+                "SELECT session_id, data FROM sessions WHERE namespace = ? AND user_id = ? AND expires_at > ?",
+                (self.namespace, user_id, time.time())
+            )
+        return [{**json.loads(data), "session_id": session_id} for session_id, data in rows]
+
+    async def reap(self) -> int:
+        rows = await self._execute(
+            "DELETE FROM sessions WHERE namespace = ? AND expires_at <= ? RETURNING session_id",
+            (self.namespace, time.time())
+        )
+        return len(rows)
+
+class RedisSessionRegistry(SessionRegistry):
+    """Registry in Redis (or any Redis-protocol server), shared across hosts
+
+    Each session is a hash of JSON-encoded fields with a native key TTL,
+    so expiry needs no reaping; the reaper only prunes per-user indexes.
+    """
+
+    backend = "redis"
+
+    def __init__(self, namespace: str, ttl: float, reap_interval: float, url: str):
+        super().__init__(namespace, ttl, reap_interval)
+        try:
+            import redis.asyncio as redis
+            from redis.exceptions import WatchError
+        except ImportError:
+            raise ImportError("SESSION_REGISTRY_BACKEND=redis requires the redis package (pip install redis)")
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._watch_error = WatchError
+        self._prefix = f"kashar:{namespace}"
+        self._ttl_ms = int(ttl * 1000)
+
+    def _key(self, session_id: str) -> str:
+        return f"{self._prefix}:session:{session_id}"
+
+    def _user_key(self, user_id: str) -> str:
+        return f"{self._prefix}:user:{user_id}"
+
+    @staticmethod
+    def _decode(raw: dict) -> dict:
+        return {field: json.loads(value) for field, value in raw.items()}
+
+    async def get(self, session_id: str) -> Optional[dict]:
+        async with self._redis.pipeline(transaction=True) as pipe:
+            raw, _ = await pipe.hgetall(self._key(session_id)).pexpire(self._key(session_id), self._ttl_ms).execute()
+        return self._decode(raw) if raw else None
+
+    async def create(self, session_id: str, data: dict):
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in data.items()})
+            pipe.pexpire(key, self._ttl_ms)
+            pipe.sadd(self._user_key(data["user_id"]), session_id)
+            await pipe.execute()
+
+    async def _write_if_live(self, session_id: str, queue_writes) -> Optional[list]:
+        """Run queued writes on a session only if it still exists, returning their results
+
+        The key is WATCHed across the existence check and the MULTI block, so
+        a session that expires or is deleted in between aborts the write
+        instead of being recreated as a fragment without a TTL or user.
+        """
+        key = self._key(session_id)
+        async with self._redis.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key)
+                    if not await pipe.exists(key):
+                        await pipe.unwatch()
+                        return None
+                    pipe.multi()
+                    queue_writes(pipe, key)
+                    pipe.pexpire(key, self._ttl_ms)
+                    return await pipe.execute()
+                except self._watch_error:
+                    # The session changed between WATCH and EXEC; check it again
+                    continue
+
+    async def update(self, session_id: str, fields: dict) -> Optional[dict]:
+        def queue_writes(pipe, key):
+            pipe.hset(key, mapping={field: json.dumps(value) for field, value in fields.items()})
+            pipe.hgetall(key)
+
+        results = await self._write_if_live(session_id, queue_writes)
+        return self._decode(results[1]) if results is not None else None
+
+    async def increment(self, session_id: str, field: str, amount: int = 1) -> Optional[int]:
+        results = await self._write_if_live(session_id, lambda pipe, key: pipe.hincrby(key, field, amount))
+        return results[0] if results is not None else None
+
+    async def delete(self, session_id: str) -> bool:
+        key = self._key(session_id)
+        user_id = await self._redis.hget(key, "user_id")
+        async with self._redis.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            if user_id:
+                pipe.srem(self._user_key(json.loads(user_id)), session_id)
+            removed = (await pipe.execute())[0]
+        return bool(removed)
+
+    async def list(self, user_id: Optional[str] = None) -> list:
+        if user_id is None:
+            prefix = self._key("")
+            session_ids = [key[len(prefix):] async for key in self._redis.scan_iter(match=f"{prefix}*")]
+        else:
+            session_ids = list(await self._redis.smembers(self._user_key(user_id)))
+
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for session_id in session_ids:
+                pipe.hgetall(self._key(session_id))
+            results = await pipe.execute()
+
+        sessions, expired = [], []
+        for session_id, raw in zip(session_ids, results):
+            if raw:
+                sessions.append({**self._decode(raw), "session_id": session_id})
+            else:
+                expired.append(session_id)
+        if user_id is not None and expired:
+            await self._redis.srem(self._user_key(user_id), *expired)
+        return sessions
+
+    async def reap(self) -> int:
+        # Keys expire on their own; drop index entries whose session has gone
+        removed = 0
+        async for user_key in self._redis.scan_iter(match=f"{self._prefix}:user:*"):
+            session_ids = list(await self._redis.smembers(user_key))
+            async with self._redis.pipeline(transaction=False) as pipe:
+                for session_id in session_ids:
+                    pipe.exists(self._key(session_id))
+                alive = await pipe.execute()
+            expired = [session_id for session_id, exists in zip(session_ids, alive) if not exists]
+            if expired:
+                await self._redis.srem(user_key, *expired)
+                removed += len(expired)
+        return removed
+
+    async def stop(self):
+        await super().stop()
+        await self._redis.aclose()
+
+def create_session_registry(namespace: str) -> SessionRegistry:
+    """Build the configured session registry backend for a namespace"""
+    if SESSION_REGISTRY_BACKEND == "memory":
+        return MemorySessionRegistry(namespace, VOICE_SESSION_TTL_SECONDS, SESSION_REAPER_INTERVAL_SECONDS)
+    if SESSION_REGISTRY_BACKEND == "sqlite":
+        return SQLiteSessionRegistry(
+            namespace, VOICE_SESSION_TTL_SECONDS, SESSION_REAPER_INTERVAL_SECONDS, SESSION_REGISTRY_PATH
+        )
+    if SESSION_REGISTRY_BACKEND == "redis":
+        return RedisSessionRegistry(
+            namespace, VOICE_SESSION_TTL_SECONDS, SESSION_REAPER_INTERVAL_SECONDS, SESSION_REGISTRY_REDIS_URL
+        )
+    raise ValueError(f"Unknown SESSION_REGISTRY_BACKEND: {SESSION_REGISTRY_BACKEND}")
@@ -0,0 +1,97 @@
+import asyncio
+from datetime import datetime, timezone
+from supabase import Client
+from utils.database import get_supabase_admin
+from utils.config import SESSION_STATS_FLUSH_SECONDS
+import logging
+
+logger = logging.getLogger(__name__)
+
+class SessionStatsTracker:
+    """Accumulates tutor session statistics in memory and flushes them periodically
+
+    Each turn adds constant-time deltas (messages, tokens, turn latency);
+    a flush applies every dirty session's deltas with one RPC, which also
+    derives the session duration from its last activity.
+    """
+
+    def __init__(self, client: Client, flush_interval: float):
+        self.client = client
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._task = None
+        self._lock = asyncio.Lock()
+        self.flushes = 0
+        self.sessions_flushed = 0
+        self.flush_errors = 0
+
+    def record_turn(self, session_id: str, messages: int, tokens: int, latency_ms: int):
+        """Add one turn's deltas for a session"""
+        stats = self._pending.setdefault(session_id, {
+            "session_id": session_id,
+            "messages": 0,
+            "tokens": 0,
+            "turns": 0,
+            "latency_ms": 0
+        })
+        stats["messages"] += messages
+        stats["tokens"] += tokens
+        stats["turns"] += 1
+        stats["latency_ms"] += latency_ms
+        stats["last_activity_at"] = datetime.now(timezone.utc).isoformat()
+
+    async def start(self):
+        """Start the periodic flush loop"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush loop and write out anything pending"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    async def flush(self):
+        """Apply all pending deltas in a single RPC"""
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+
+            try:
+                await asyncio.to_thread(
+                    lambda: self.client.rpc("apply_session_stats", {"p_stats": list(pending.values())}).execute()
+                )
+                self.flushes += 1
+                self.sessions_flushed += len(pending)
+            except Exception as e:
+                self.flush_errors += 1
+                logger.error(f"Error flushing stats for {len(pending)} sessions: {e}")
+                self._restore(pending)
+
+    def stats(self) -> dict:
+        return {
+            "pending_sessions": len(self._pending),
+            "flushes": self.flushes,
+            "sessions_flushed": self.sessions_flushed,
+            "flush_errors": self.flush_errors
+        }
+
+    def _restore(self, pending: dict):
+        """Merge deltas from a failed flush back so the next flush retries them"""
+        for session_id, stats in pending.items():
+            current = self._pending.get(session_id)
+            if current is None:
+                self._pending[session_id] = stats
+                continue
+            for field in ("messages", "tokens", "turns", "latency_ms"):
+                current[field] += stats[field]
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+session_stats = SessionStatsTracker(get_supabase_admin(), SESSION_STATS_FLUSH_SECONDS)
@@ -0,0 +1,129 @@
+import abc
+import asyncio
+import os
+import sqlite3
+import threading
+
+from utils.config import SESSION_REGISTRY_BACKEND, SESSION_REGISTRY_PATH, SESSION_REGISTRY_REDIS_URL
+
+class VersionStore(abc.ABC):
+    """Per-key version counters shared by every worker using the same backend
+
+    Process-local caches tag entries with the version they were loaded at
+    and treat them as stale once the shared version moves on, so a write
+    handled by one worker invalidates the caches of all of them. Keys that
+    were never bumped are at version 0.
+    """
+
+    backend = None
+
+    def __init__(self, namespace: str):
+        self.namespace = namespace
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> int:
+        """Current version of a key"""
+
+    @abc.abstractmethod
+    async def bump(self, key: str) -> int:
+        """Advance a key's version, returning the new one"""
+
+    async def close(self):
+        """Release the backend's connection"""
+
+class MemoryVersionStore(VersionStore):
+    """Per-process counters; only valid with a single worker"""
+
+    backend = "memory"
+
+    def __init__(self, namespace: str):
+        super().__init__(namespace)
+        self._versions = {}
+
+    async def get(self, key: str) -> int:
+        return self._versions.get(key, 0)
+
+    async def bump(self, key: str) -> int:
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return self._versions[key]
+
+class SQLiteVersionStore(VersionStore):
+    """Counters in a local SQLite file, shared by all workers on one host"""
+
+    backend = "sqlite"
+
+    def __init__(self, namespace: str, path: str):
+        super().__init__(namespace)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS versions (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )"""
+        )
+        self._conn.commit()
+
+    def _execute_sync(self, sql: str, params: tuple) -> list:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.commit()
+            return rows
+
+    async def get(self, key: str) -> int:
+        rows = await asyncio.to_thread(
+            self._execute_sync,
+            "SELECT version FROM versions WHERE namespace = ? AND key = ?",
+            (self.namespace, key)
+        )
+        return rows[0][0] if rows else 0
+
+    async def bump(self, key: str) -> int:
+        rows = await asyncio.to_thread(
+            self._execute_sync,
+            "INSERT INTO versions (namespace, key, version) VALUES (?, ?, 1) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET version = version + 1 RETURNING version",
+            (self.namespace, key)
+        )
+        return rows[0][0]
+
+class RedisVersionStore(VersionStore):
+    """Counters in Redis, shared across hosts
+
+    Keys carry no TTL: a counter that disappeared would restart at 0 and
+    could match an entry cached before it was first bumped.
+    """
+
+    backend = "redis"
+
+    def __init__(self, namespace: str, url: str):
+        super().__init__(namespace)
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise ImportError("SESSION_REGISTRY_BACKEND=redis requires the redis package (pip install redis)")
+        self._redis = redis.from_url(url, decode_responses=True)
+        self._prefix = f"kashar:{namespace}:version"
+
+    async def get(self, key: str) -> int:
+        return int(await self._redis.get(f"{self._prefix}:{key}") or 0)
+
+    async def bump(self, key: str) -> int:
+        return await self._redis.incr(f"{self._prefix}:{key}")
+
+    async def close(self):
+        await self._redis.aclose()
+
+def create_version_store(namespace: str) -> VersionStore:
+    """Build a version store on the same backend as the session registry"""
+    if SESSION_REGISTRY_BACKEND == "memory":
+        return MemoryVersionStore(namespace)
+    if SESSION_REGISTRY_BACKEND == "sqlite":
+        return SQLiteVersionStore(namespace, SESSION_REGISTRY_PATH)
+    if SESSION_REGISTRY_BACKEND == "redis":
+        return RedisVersionStore(namespace, SESSION_REGISTRY_REDIS_URL)
+    raise ValueError(f"Unknown SESSION_REGISTRY_BACKEND: {SESSION_REGISTRY_BACKEND}")
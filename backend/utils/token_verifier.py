@@ -0,0 +1,177 @@
+import asyncio
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+import logging
+
+import httpx
+from jose import jwt, JWTError
+
+from utils.config import (
+    SUPABASE_JWT_SECRET,
+    SUPABASE_JWKS_URL,
+    SUPABASE_JWT_AUDIENCE,
+    AUTH_TOKEN_CACHE_TTL,
+    AUTH_TOKEN_CACHE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+JWKS_REFRESH_SECONDS = 3600
+JWKS_RETRY_SECONDS = 30
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256"]
+
+class TokenVerifier:
+    """Verifies Supabase access tokens locally and caches the verified claims
+
+    HS256 tokens are checked against the project's JWT secret, asymmetric
+    ones against the project's JWKS. Verified claims are cached for a short
+    TTL (never past the token's own expiry) so repeat requests with the
+    same token skip signature verification as well. Tokens found to be
+    revoked on a remote check are remembered until they expire.
+    """
+
+    def __init__(self, secret: Optional[str], jwks_url: Optional[str], audience: str, ttl: float, max_entries: int):
+        self.secret = secret
+        self.jwks_url = jwks_url
+        self.audience = audience
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._revoked = {}
+        self._checked = OrderedDict()
+        self._jwks = None
+        self._jwks_fetched_at = 0.0
+        self._jwks_lock = asyncio.Lock()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.verifications = 0
+        self.failures = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.secret or self.jwks_url)
+
+    def get_cached(self, token: str) -> Optional[dict]:
+        """Get a cached entry for a token still within its TTL"""
+        now = time.time()
+        with self._lock:
+            entry = self._cache.get(token)
+            if entry is None:
+                return None
+            if entry["expires_at"] <= now or token in self._revoked:
+                del self._cache[token]
+                return None
+            self._cache.move_to_end(token)
+            self.hits += 1
+            return entry
+
+    async def verify(self, token: str) -> dict:
+        """Verify a token's signature, expiry and audience, returning its claims"""
+        if self.is_revoked(token):
+            raise JWTError("Token has been revoked")
+
+        try:
+            algorithm = jwt.get_unverified_header(token).get("alg")
+            if algorithm == "HS256" and self.secret:
+                key, algorithms = self.secret, ["HS256"]
+            elif algorithm in ASYMMETRIC_ALGORITHMS and self.jwks_url:
+                key, algorithms = await self._get_jwks(), ASYMMETRIC_ALGORITHMS
+            else:
+                raise JWTError(f"No verification key for algorithm {algorithm}")
+
+            claims = jwt.decode(token, key, algorithms=algorithms, audience=self.audience)
+            if not claims.get("sub"):
+                raise JWTError("Token has no subject")
+            self.verifications += 1
+            return claims
+        except JWTError:
+            self.failures += 1
+            raise
+
+    def cache(self, token: str, user, expires_at: Optional[float] = None) -> dict:
+        """Cache a verified user for a token, returning the cache entry"""
+        now = time.time()
+        entry = {
+            "user": user,
+            "expires_at": min(now + self.ttl, expires_at) if expires_at else now + self.ttl,
+            "token_expires_at": expires_at
+        }
+        with self._lock:
+            self._cache[token] = entry
+            self._cache.move_to_end(token)
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        return entry
+
+    def due_for_revalidation(self, token: str, interval: float) -> bool:
+        """Whether a token is due a remote check; marks it checked when it is
+
+        The check time outlives cache entries, so a token in continuous use
+        is re-checked once per interval rather than once per cache TTL.
+        """
+        now = time.time()
+        with self._lock:
+            checked_at = self._checked.get(token)
+            if checked_at is not None and now - checked_at < interval:
+                return False
+            self._checked[token] = now
+            self._checked.move_to_end(token)
+            while len(self._checked) > self.max_entries:
+                self._checked.popitem(last=False)
+            # A token seen for the first time was just verified locally
+            return checked_at is not None
+
+    def revoke(self, token: str, expires_at: Optional[float] = None):
+        """Reject a token locally until it expires"""
+        with self._lock:
+            self._cache.pop(token, None)
+            self._checked.pop(token, None)
+            self._revoked[token] = expires_at or time.time() + self.ttl
+            now = time.time()
+            for revoked in [t for t, until in self._revoked.items() if until <= now]:
+                del self._revoked[revoked]
+
+    def is_revoked(self, token: str) -> bool:
+        until = self._revoked.get(token)
+        return until is not None and until > time.time()
+
+    def stats(self) -> dict:
+        return {
+            "local_verification": self.enabled,
+            "cache_hits": self.hits,
+            "verifications": self.verifications,
+            "failures": self.failures,
+            "cached_tokens": len(self._cache),
+            "revoked_tokens": len(self._revoked)
+        }
+
+    async def _get_jwks(self) -> dict:
+        """Get the signing keys, fetching them off the event loop when missing or stale
+
+        Concurrent callers share one fetch. If a refresh fails the previous
+        keys stay in use and the next attempt waits JWKS_RETRY_SECONDS.
+        """
+        if self._jwks is not None and time.time() - self._jwks_fetched_at <= JWKS_REFRESH_SECONDS:
+            return self._jwks
+
+        async with self._jwks_lock:
+            # Another request may have refreshed the keys while this one waited
+            if self._jwks is not None and time.time() - self._jwks_fetched_at <= JWKS_REFRESH_SECONDS:
+                return self._jwks
+            try:
+                response = await asyncio.to_thread(httpx.get, self.jwks_url, timeout=5)
+                response.raise_for_status()
+                self._jwks = response.json()
+                self._jwks_fetched_at = time.time()
+            except Exception as e:
+                logger.error(f"Error fetching JWKS: {e}")
+                if self._jwks is None:
+                    raise JWTError("Signing keys unavailable")
+                self._jwks_fetched_at = time.time() - JWKS_REFRESH_SECONDS + JWKS_RETRY_SECONDS
+        return self._jwks
+
+token_verifier = TokenVerifier(
+    SUPABASE_JWT_SECRET, SUPABASE_JWKS_URL, SUPABASE_JWT_AUDIENCE, AUTH_TOKEN_CACHE_TTL, AUTH_TOKEN_CACHE_SIZE
+)
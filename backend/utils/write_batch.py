@@ -0,0 +1,169 @@
+from supabase import Client
+from utils.database import get_supabase_admin
+from utils.config import SUPABASE_WRITE_WINDOW_MS, SUPABASE_WRITE_MAX_ROWS, SUPABASE_WRITE_RETRIES, SUPABASE_WRITE_RETRY_DELAY_MS
+import asyncio
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+class WriteBatch:
+    """Collects rows per table and writes each table with one bulk request
+
+    Tables are written in the order they were first added to, so parents
+    added before children satisfy foreign keys. Requests run in a worker
+    thread so the event loop is not blocked. Used as an async context
+    manager the batch executes on a clean exit and is dropped if the
+    block raises.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+        self._writes = {}
+
+    def insert(self, table: str, records):
+        """Queue one record or a list of records for insertion"""
+        self._add("insert", table, records)
+
+    def upsert(self, table: str, records):
+        """Queue one record or a list of records for upsert on the primary key"""
+        self._add("upsert", table, records)
+
+    async def execute(self) -> dict:
+        """Send one request per table and operation, returning rows written per table"""
+        written = {}
+        writes, self._writes = self._writes, {}
+        for (operation, table), rows in writes.items():
+            try:
+                await asyncio.to_thread(lambda: getattr(self.client.table(table), operation)(rows).execute())
+                written[table] = written.get(table, 0) + len(rows)
+            except Exception as e:
+                logger.error(f"Error writing {len(rows)} rows to {table}: {e}")
+                raise
+        return written
+
+    def _add(self, operation: str, table: str, records):
+        rows = records if isinstance(records, list) else [records]
+        if rows:
+            self._writes.setdefault((operation, table), []).extend(rows)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            await self.execute()
+        return False
+
+class BufferedWriter:
+    """Buffers inserts into append-only tables and flushes them in bulk
+
+    Rows from every request in a short time window (or up to max_rows)
+    share one insert per table. Meant for logs that are not read back
+    within the same request, such as progress_logs.
+
+    A failed bulk insert is retried with exponential backoff, then each
+    row is written on its own so one bad row cannot sink the batch. Rows
+    carry their own primary key, and retries skip rows that already
+    exist, so a retry after an ambiguous failure never duplicates them.
+    Rows that still fail are logged with their payload.
+    """
+
+    def __init__(self, client: Client, window: float, max_rows: int, retries: int = 3, retry_delay: float = 0.5):
+        self.client = client
+        self.window = window
+        self.max_rows = max_rows
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self._rows = {}
+        self._pending = 0
+        self._timer = None
+        self._flushing = set()
+        self.flushes = 0
+        self.rows_written = 0
+        self.rows_retried = 0
+        self.rows_failed = 0
+
+    def insert(self, table: str, records):
+        """Queue rows; they are written within the flush window"""
+        rows = records if isinstance(records, list) else [records]
+        self._rows.setdefault(table, []).extend(rows)
+        self._pending += len(rows)
+
+        if self._pending >= self.max_rows:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._start_flush)
+
+    async def flush(self):
+        """Write everything queued so far and wait for in-flight flushes"""
+        self._start_flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending_rows": self._pending,
+            "flushes": self.flushes,
+            "rows_written": self.rows_written,
+            "rows_retried": self.rows_retried,
+            "rows_failed": self.rows_failed
+        }
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._rows:
+            return
+
+        rows, self._rows, self._pending = self._rows, {}, 0
+        task = asyncio.get_running_loop().create_task(self._write(rows))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+
+    async def _write(self, rows: dict):
+        self.flushes += 1
+        for table, table_rows in rows.items():
+            if await self._insert(table, table_rows, self.retries):
+                self.rows_written += len(table_rows)
+                continue
+
+            logger.warning(f"Bulk insert of {len(table_rows)} rows to {table} failed, writing rows one by one")
+            for row in table_rows:
+                if await self._insert(table, [row], 1, retry_first=True):
+                    self.rows_written += 1
+                else:
+                    self.rows_failed += 1
+                    logger.error(f"Dropped buffered row for {table}: {json.dumps(row, default=str)}")
+
+    async def _insert(self, table: str, rows: list, retries: int, retry_first: bool = False) -> bool:
+        """Insert rows, retrying with backoff; returns whether they were written"""
+        for attempt in range(retries + 1):
+            retrying = attempt > 0 or retry_first
+            try:
+                if retrying:
+                    # The earlier attempt may have landed before failing; skip rows already written
+                    self.rows_retried += len(rows)
+                    await asyncio.to_thread(
+                        lambda: self.client.table(table).upsert(rows, ignore_duplicates=True).execute()
+                    )
+                else:
+                    await asyncio.to_thread(lambda: self.client.table(table).insert(rows).execute())
+                return True
+            except Exception as e:
+                if attempt == retries:
+                    logger.error(f"Error writing {len(rows)} buffered rows to {table}: {e}")
+                    return False
+                delay = self.retry_delay * 2 ** attempt
+                logger.warning(f"Error writing {len(rows)} buffered rows to {table}, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+        return False
+
+progress_writer = BufferedWriter(
+    get_supabase_admin(),
+    SUPABASE_WRITE_WINDOW_MS / 1000,
+    SUPABASE_WRITE_MAX_ROWS,
+    retries=SUPABASE_WRITE_RETRIES,
+    retry_delay=SUPABASE_WRITE_RETRY_DELAY_MS / 1000
+)
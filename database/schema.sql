@@ -38,6 +38,22 @@ CREATE TABLE IF NOT EXISTS quizzes (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Pre-generated quiz questions per user, topic and difficulty
+CREATE TABLE IF NOT EXISTS quiz_question_pool (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    document_id UUID NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+    topic TEXT NOT NULL,
+    topic_key TEXT NOT NULL, -- lowercased, whitespace-normalised topic
+    difficulty TEXT NOT NULL,
+    question JSONB NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Pooled questions must belong to a document so deleting it removes them
+DELETE FROM quiz_question_pool WHERE document_id IS NULL;
+ALTER TABLE quiz_question_pool ALTER COLUMN document_id SET NOT NULL;
+
 -- Quiz results table
 CREATE TABLE IF NOT EXISTS quiz_results (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -58,10 +74,20 @@ CREATE TABLE IF NOT EXISTS tutor_sessions (
     session_type TEXT NOT NULL DEFAULT 'text', -- 'text' or 'voice'
     duration INTEGER DEFAULT 0, -- in seconds
     message_count INTEGER DEFAULT 0,
+    token_count INTEGER DEFAULT 0,
+    turn_count INTEGER DEFAULT 0,
+    total_latency_ms BIGINT DEFAULT 0, -- sum of turn latencies; divide by turn_count for the mean
+    last_activity_at TIMESTAMP WITH TIME ZONE,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     ended_at TIMESTAMP WITH TIME ZONE
 );
 
+-- Session stat columns for databases created before they were added
+ALTER TABLE tutor_sessions ADD COLUMN IF NOT EXISTS token_count INTEGER DEFAULT 0;
+ALTER TABLE tutor_sessions ADD COLUMN IF NOT EXISTS turn_count INTEGER DEFAULT 0;
+ALTER TABLE tutor_sessions ADD COLUMN IF NOT EXISTS total_latency_ms BIGINT DEFAULT 0;
+ALTER TABLE tutor_sessions ADD COLUMN IF NOT EXISTS last_activity_at TIMESTAMP WITH TIME ZONE;
+
 -- Tutor messages table
 CREATE TABLE IF NOT EXISTS tutor_messages (
     id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
@@ -93,26 +119,51 @@ CREATE TABLE IF NOT EXISTS progress_logs (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Daily activity rollup per user, maintained from progress_logs by triggers
+CREATE TABLE IF NOT EXISTS user_daily_activity (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    activity_date DATE NOT NULL, -- UTC day
+    activity_count INTEGER NOT NULL DEFAULT 0,
+    total_duration INTEGER NOT NULL DEFAULT 0, -- in seconds
+    PRIMARY KEY (user_id, activity_date)
+);
+
+-- Quiz score rollup per user and topic, maintained from quiz_results by triggers
+CREATE TABLE IF NOT EXISTS user_topic_scores (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    topic TEXT NOT NULL,
+    quiz_count INTEGER NOT NULL DEFAULT 0,
+    total_percentage DECIMAL(12,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, topic)
+);
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_documents_user_id ON documents(user_id);
 CREATE INDEX IF NOT EXISTS idx_topics_user_id ON topics(user_id);
 CREATE INDEX IF NOT EXISTS idx_quizzes_user_id ON quizzes(user_id);
+CREATE INDEX IF NOT EXISTS idx_quiz_question_pool_lookup ON quiz_question_pool(user_id, topic_key, difficulty);
 CREATE INDEX IF NOT EXISTS idx_quiz_results_user_id ON quiz_results(user_id);
 CREATE INDEX IF NOT EXISTS idx_tutor_sessions_user_id ON tutor_sessions(user_id);
 CREATE INDEX IF NOT EXISTS idx_tutor_messages_session_id ON tutor_messages(session_id);
 CREATE INDEX IF NOT EXISTS idx_flashcard_sets_user_id ON flashcard_sets(user_id);
 CREATE INDEX IF NOT EXISTS idx_progress_logs_user_id ON progress_logs(user_id);
+CREATE INDEX IF NOT EXISTS idx_quiz_results_user_created ON quiz_results(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_tutor_sessions_user_created ON tutor_sessions(user_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_progress_logs_user_created ON progress_logs(user_id, created_at);
 
 -- Row Level Security Policies
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
 ALTER TABLE documents ENABLE ROW LEVEL SECURITY;
 ALTER TABLE topics ENABLE ROW LEVEL SECURITY;
 ALTER TABLE quizzes ENABLE ROW LEVEL SECURITY;
+ALTER TABLE quiz_question_pool ENABLE ROW LEVEL SECURITY;
 ALTER TABLE quiz_results ENABLE ROW LEVEL SECURITY;
 ALTER TABLE tutor_sessions ENABLE ROW LEVEL SECURITY;
 ALTER TABLE tutor_messages ENABLE ROW LEVEL SECURITY;
 ALTER TABLE flashcard_sets ENABLE ROW LEVEL SECURITY;
 ALTER TABLE progress_logs ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_daily_activity ENABLE ROW LEVEL SECURITY;
+ALTER TABLE user_topic_scores ENABLE ROW LEVEL SECURITY;
 
 -- Users policies
 DROP POLICY IF EXISTS "Users can view own profile" ON users;
@@ -144,6 +195,10 @@ DROP POLICY IF EXISTS "Users can insert own quizzes" ON quizzes;
 CREATE POLICY "Users can view own quizzes" ON quizzes FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can insert own quizzes" ON quizzes FOR INSERT WITH CHECK (auth.uid() = user_id);
 
+-- Quiz question pool policies (written by the backend service role)
+DROP POLICY IF EXISTS "Users can view own quiz question pool" ON quiz_question_pool;
+CREATE POLICY "Users can view own quiz question pool" ON quiz_question_pool FOR SELECT USING (auth.uid() = user_id);
+
 -- Quiz results policies
 DROP POLICY IF EXISTS "Users can view own quiz results" ON quiz_results;
 DROP POLICY IF EXISTS "Users can insert own quiz results" ON quiz_results;
@@ -178,6 +233,12 @@ DROP POLICY IF EXISTS "Users can insert own progress logs" ON progress_logs;
 CREATE POLICY "Users can view own progress logs" ON progress_logs FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can insert own progress logs" ON progress_logs FOR INSERT WITH CHECK (auth.uid() = user_id);
 
+-- Rollup policies (written only by triggers)
+DROP POLICY IF EXISTS "Users can view own daily activity" ON user_daily_activity;
+DROP POLICY IF EXISTS "Users can view own topic scores" ON user_topic_scores;
+CREATE POLICY "Users can view own daily activity" ON user_daily_activity FOR SELECT USING (auth.uid() = user_id);
+CREATE POLICY "Users can view own topic scores" ON user_topic_scores FOR SELECT USING (auth.uid() = user_id);
+
 -- Functions for updated_at timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -201,10 +262,307 @@ BEGIN
     VALUES (NEW.id, NEW.email);
     RETURN NEW;
 END;
-$$ LANGUAGE plpgsql SECURITY DEFINER;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
 
 -- Trigger to automatically create user record when auth user is created
 DROP TRIGGER IF EXISTS on_auth_user_created ON auth.users;
 CREATE TRIGGER on_auth_user_created
     AFTER INSERT ON auth.users
     FOR EACH ROW EXECUTE FUNCTION handle_new_user();
+
+-- Replaced by apply_session_stats
+DROP FUNCTION IF EXISTS increment_session_message_count(UUID, INTEGER);
+
+-- Function to apply batched tutor session stat deltas atomically
+-- p_stats: [{"session_id", "messages", "tokens", "turns", "latency_ms", "last_activity_at"}, ...]
+CREATE OR REPLACE FUNCTION apply_session_stats(p_stats JSONB)
+RETURNS VOID AS $$
+BEGIN
+    UPDATE tutor_sessions s
+    SET message_count = COALESCE(s.message_count, 0) + (d->>'messages')::INTEGER,
+        token_count = COALESCE(s.token_count, 0) + (d->>'tokens')::INTEGER,
+        turn_count = COALESCE(s.turn_count, 0) + (d->>'turns')::INTEGER,
+        total_latency_ms = COALESCE(s.total_latency_ms, 0) + (d->>'latency_ms')::BIGINT,
+        last_activity_at = GREATEST(s.last_activity_at, (d->>'last_activity_at')::TIMESTAMPTZ),
+        duration = GREATEST(
+            COALESCE(s.duration, 0),
+            EXTRACT(EPOCH FROM ((d->>'last_activity_at')::TIMESTAMPTZ - s.created_at))::INTEGER
+        )
+    FROM jsonb_array_elements(p_stats) AS d
+    WHERE s.id = (d->>'session_id')::UUID;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Writes any user's session stats, so only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION apply_session_stats(JSONB) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION apply_session_stats(JSONB) TO service_role;
+
+-- Function drawing random questions from a quiz pool and removing them in one statement
+-- Concurrent callers skip rows another draw has locked, so no question is handed out twice.
+-- Takes all p_count questions or none. Result: {"questions": [...] or null, "remaining": N}
+CREATE OR REPLACE FUNCTION take_quiz_pool_questions(p_user_id UUID, p_topic_key TEXT, p_difficulty TEXT, p_count INTEGER)
+RETURNS JSONB AS $$
+DECLARE
+    v_ids UUID[];
+    v_questions JSONB;
+    v_remaining INTEGER;
+BEGIN
+    SELECT array_agg(id) INTO v_ids FROM (
+        SELECT id FROM quiz_question_pool
+        WHERE user_id = p_user_id AND topic_key = p_topic_key AND difficulty = p_difficulty
+        ORDER BY random()
+        LIMIT p_count
+        FOR UPDATE SKIP LOCKED
+    ) picked;
+
+    IF COALESCE(array_length(v_ids, 1), 0) >= p_count THEN
+        WITH taken AS (
+            DELETE FROM quiz_question_pool WHERE id = ANY(v_ids) RETURNING question
+        )
+        SELECT jsonb_agg(question) INTO v_questions FROM taken;
+    END IF;
+
+    SELECT COUNT(*) INTO v_remaining FROM quiz_question_pool
+    WHERE user_id = p_user_id AND topic_key = p_topic_key AND difficulty = p_difficulty;
+
+    RETURN jsonb_build_object('questions', v_questions, 'remaining', v_remaining);
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Deletes from any user's pool, so only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION take_quiz_pool_questions(UUID, TEXT, TEXT, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION take_quiz_pool_questions(UUID, TEXT, TEXT, INTEGER) TO service_role;
+
+-- Function adding generated questions to a quiz pool without growing it past p_max_size
+-- Fills of the same pool are serialised on an advisory lock, so concurrent fills from
+-- several workers cannot overfill it. Returns the number of questions added.
+CREATE OR REPLACE FUNCTION add_quiz_pool_questions(
+    p_user_id UUID, p_document_id UUID, p_topic TEXT, p_topic_key TEXT, p_difficulty TEXT,
+    p_questions JSONB, p_max_size INTEGER
+)
+RETURNS INTEGER AS $$
+DECLARE
+    v_room INTEGER;
+    v_added INTEGER;
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtextextended(p_user_id::TEXT || ':' || p_topic_key || ':' || p_difficulty, 0));
+
+    SELECT p_max_size - COUNT(*) INTO v_room FROM quiz_question_pool
+    WHERE user_id = p_user_id AND topic_key = p_topic_key AND difficulty = p_difficulty;
+
+    IF v_room <= 0 THEN
+        RETURN 0;
+    END IF;
+
+    INSERT INTO quiz_question_pool (user_id, document_id, topic, topic_key, difficulty, question)
+    SELECT p_user_id, p_document_id, p_topic, p_topic_key, p_difficulty, question
+    FROM jsonb_array_elements(p_questions) WITH ORDINALITY AS generated(question, position)
+    WHERE position <= v_room;
+
+    GET DIAGNOSTICS v_added = ROW_COUNT;
+    RETURN v_added;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Writes to any user's pool, so only the backend (service role) may call it
+REVOKE EXECUTE ON FUNCTION add_quiz_pool_questions(UUID, UUID, TEXT, TEXT, TEXT, JSONB, INTEGER) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION add_quiz_pool_questions(UUID, UUID, TEXT, TEXT, TEXT, JSONB, INTEGER) TO service_role;
+
+-- Function returning a user's progress over a date range in one round trip
+-- Result: {"quiz_scores": [...], "tutor_sessions": [...], "topics_studied": [...], "total_study_time": N}
+CREATE OR REPLACE FUNCTION get_user_progress(p_user_id UUID, p_start TIMESTAMPTZ, p_end TIMESTAMPTZ)
+RETURNS JSONB AS $$
+    WITH logs AS (
+        SELECT
+            COALESCE(jsonb_agg(DISTINCT topic) FILTER (WHERE topic IS NOT NULL AND topic <> ''), '[]'::JSONB) AS topics,
+            COALESCE(SUM(duration), 0) AS study_time
+        FROM progress_logs
+        WHERE user_id = p_user_id AND created_at BETWEEN p_start AND p_end
+    )
+    SELECT jsonb_build_object(
+        'quiz_scores', COALESCE((
+            SELECT jsonb_agg(jsonb_build_object(
+                'score', r.score,
+                'total_questions', r.total_questions,
+                'percentage', r.percentage,
+                'created_at', r.created_at,
+                'quizzes', jsonb_build_object('topic', q.topic, 'difficulty', q.difficulty)
+            ) ORDER BY r.created_at)
+            FROM quiz_results r
+            JOIN quizzes q ON q.id = r.quiz_id
+            WHERE r.user_id = p_user_id AND r.created_at BETWEEN p_start AND p_end
+        ), '[]'::JSONB),
+        'tutor_sessions', COALESCE((
+            SELECT jsonb_agg(to_jsonb(s) ORDER BY s.created_at)
+            FROM tutor_sessions s
+            WHERE s.user_id = p_user_id AND s.created_at BETWEEN p_start AND p_end
+        ), '[]'::JSONB),
+        'topics_studied', logs.topics,
+        'total_study_time', logs.study_time
+    )
+    FROM logs;
+$$ LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION get_user_progress(UUID, TIMESTAMPTZ, TIMESTAMPTZ) FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION get_user_progress(UUID, TIMESTAMPTZ, TIMESTAMPTZ) TO service_role;
+
+-- Rollup maintenance: statement-level triggers fold each insert batch into the rollups,
+-- and take deleted or updated rows back out
+CREATE OR REPLACE FUNCTION rollup_progress_logs()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('DELETE', 'UPDATE') THEN
+        UPDATE user_daily_activity a
+        SET activity_count = a.activity_count - o.activity_count,
+            total_duration = a.total_duration - o.total_duration
+        FROM (
+            SELECT user_id, (created_at AT TIME ZONE 'UTC')::DATE AS activity_date,
+                   COUNT(*) AS activity_count, COALESCE(SUM(duration), 0) AS total_duration
+            FROM old_rows
+            GROUP BY 1, 2
+        ) o
+        WHERE a.user_id = o.user_id AND a.activity_date = o.activity_date;
+
+        DELETE FROM user_daily_activity a
+        USING old_rows o
+        WHERE a.user_id = o.user_id
+          AND a.activity_date = (o.created_at AT TIME ZONE 'UTC')::DATE
+          AND a.activity_count <= 0;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO user_daily_activity (user_id, activity_date, activity_count, total_duration)
+        SELECT user_id, (created_at AT TIME ZONE 'UTC')::DATE, COUNT(*), COALESCE(SUM(duration), 0)
+        FROM new_rows
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, activity_date) DO UPDATE
+        SET activity_count = user_daily_activity.activity_count + EXCLUDED.activity_count,
+            total_duration = user_daily_activity.total_duration + EXCLUDED.total_duration;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Recompute topic scores for the given users from quiz_results; used where a row's topic
+-- can no longer be read back (its quiz may be deleted in the same cascade)
+CREATE OR REPLACE FUNCTION refresh_user_topic_scores(p_user_ids UUID[])
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM user_topic_scores WHERE user_id = ANY(p_user_ids);
+
+    -- Users removed in the same statement are skipped
+    INSERT INTO user_topic_scores (user_id, topic, quiz_count, total_percentage)
+    SELECT r.user_id, q.topic, COUNT(*), SUM(r.percentage)
+    FROM quiz_results r
+    JOIN quizzes q ON q.id = r.quiz_id
+    JOIN users u ON u.id = r.user_id
+    WHERE r.user_id = ANY(p_user_ids)
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION refresh_user_topic_scores(UUID[]) FROM PUBLIC, anon, authenticated;
+
+CREATE OR REPLACE FUNCTION rollup_quiz_results()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO user_topic_scores (user_id, topic, quiz_count, total_percentage)
+        SELECT r.user_id, q.topic, COUNT(*), SUM(r.percentage)
+        FROM new_rows r
+        JOIN quizzes q ON q.id = r.quiz_id
+        GROUP BY 1, 2
+        ON CONFLICT (user_id, topic) DO UPDATE
+        SET quiz_count = user_topic_scores.quiz_count + EXCLUDED.quiz_count,
+            total_percentage = user_topic_scores.total_percentage + EXCLUDED.total_percentage;
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_user_topic_scores(ARRAY(SELECT DISTINCT user_id FROM old_rows));
+    ELSE
+        PERFORM refresh_user_topic_scores(ARRAY(
+            SELECT user_id FROM old_rows UNION SELECT user_id FROM new_rows
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Renaming a quiz's topic moves its results to the new topic
+CREATE OR REPLACE FUNCTION rollup_quiz_topics()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_user_topic_scores(ARRAY(
+        SELECT DISTINCT unnest(ARRAY[o.user_id, n.user_id])
+        FROM old_rows o
+        JOIN new_rows n ON n.id = o.id
+        WHERE n.topic IS DISTINCT FROM o.topic OR n.user_id IS DISTINCT FROM o.user_id
+    ));
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- Transition tables allow one event per trigger, so each event gets its own
+DROP TRIGGER IF EXISTS rollup_progress_logs_insert ON progress_logs;
+CREATE TRIGGER rollup_progress_logs_insert
+    AFTER INSERT ON progress_logs
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_progress_logs();
+
+DROP TRIGGER IF EXISTS rollup_progress_logs_update ON progress_logs;
+CREATE TRIGGER rollup_progress_logs_update
+    AFTER UPDATE ON progress_logs
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_progress_logs();
+
+DROP TRIGGER IF EXISTS rollup_progress_logs_delete ON progress_logs;
+CREATE TRIGGER rollup_progress_logs_delete
+    AFTER DELETE ON progress_logs
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_progress_logs();
+
+DROP TRIGGER IF EXISTS rollup_quiz_results_insert ON quiz_results;
+CREATE TRIGGER rollup_quiz_results_insert
+    AFTER INSERT ON quiz_results
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_quiz_results();
+
+DROP TRIGGER IF EXISTS rollup_quiz_results_update ON quiz_results;
+CREATE TRIGGER rollup_quiz_results_update
+    AFTER UPDATE ON quiz_results
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_quiz_results();
+
+DROP TRIGGER IF EXISTS rollup_quiz_results_delete ON quiz_results;
+CREATE TRIGGER rollup_quiz_results_delete
+    AFTER DELETE ON quiz_results
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_quiz_results();
+
+DROP TRIGGER IF EXISTS rollup_quizzes_update ON quizzes;
+CREATE TRIGGER rollup_quizzes_update
+    AFTER UPDATE ON quizzes
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION rollup_quiz_topics();
+
+-- Compaction: rebuild the rollups from the source tables (backfill, or repair after manual edits)
+CREATE OR REPLACE FUNCTION rebuild_user_rollups()
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM user_daily_activity;
+    INSERT INTO user_daily_activity (user_id, activity_date, activity_count, total_duration)
+    SELECT user_id, (created_at AT TIME ZONE 'UTC')::DATE, COUNT(*), COALESCE(SUM(duration), 0)
+    FROM progress_logs
+    GROUP BY 1, 2;
+
+    DELETE FROM user_topic_scores;
+    INSERT INTO user_topic_scores (user_id, topic, quiz_count, total_percentage)
+    SELECT r.user_id, q.topic, COUNT(*), SUM(r.percentage)
+    FROM quiz_results r
+    JOIN quizzes q ON q.id = r.quiz_id
+    GROUP BY 1, 2;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+REVOKE EXECUTE ON FUNCTION rebuild_user_rollups() FROM PUBLIC, anon, authenticated;
+GRANT EXECUTE ON FUNCTION rebuild_user_rollups() TO service_role;
+
+SELECT rebuild_user_rollups();
@@ -3,6 +3,7 @@ import { useDropzone } from 'react-dropzone';
 import axios from 'axios';
 import toast from 'react-hot-toast';
 import { Upload, File, X, CheckCircle } from 'lucide-react';
+import { waitForIngestionJob } from './ingestionJobs';
 
 function DocumentUpload() {
   const [files, setFiles] = useState([]);
@@ -55,10 +56,12 @@ function DocumentUpload() {
           },
         });
 
+        const document = await waitForIngestionJob(response.data.job.job_id);
+
         results.push({
           ...fileData,
           success: true,
-          document: response.data.document
+          document
         });
 
         toast.success(`${fileData.title} uploaded successfully!`);
@@ -67,7 +70,7 @@ function DocumentUpload() {
         results.push({
           ...fileData,
           success: false,
-          error: error.response?.data?.detail || 'Upload failed'
+          error: error.response?.data?.detail || error.message || 'Upload failed'
         });
         toast.error(`Failed to upload ${fileData.title}`);
       }
@@ -110,7 +113,7 @@ function DocumentUpload() {
                   Drag & drop PDF files here, or click to select
                 </p>
                 <p className="text-sm text-primary-500">
-                  Maximum file size: 10MB per file
+                  Maximum file size: 50MB per file
                 </p>
               </div>
             )}
@@ -12,6 +12,7 @@ import {
   AlertTriangle,
   Plus
 } from 'lucide-react';
+import { waitForIngestionJob } from './ingestionJobs';
 
 function DocumentsPage() {
   const [documents, setDocuments] = useState([]);
@@ -256,19 +257,21 @@ function DocumentUploadForm({ onSuccess }) {
       formData.append('file', file);
       formData.append('title', title.trim());
 
-      await axios.post('/api/documents/upload', formData, {
+      const response = await axios.post('/api/documents/upload', formData, {
         headers: {
           'Content-Type': 'multipart/form-data',
         },
       });
 
+      await waitForIngestionJob(response.data.job.job_id);
+
       toast.success('Document uploaded successfully');
       setFile(null);
       setTitle('');
       onSuccess();
     } catch (error) {
       console.error('Error uploading document:', error);
-      toast.error(error.response?.data?.detail || 'Failed to upload document');
+      toast.error(error.response?.data?.detail || error.message || 'Failed to upload document');
     } finally {
       setUploading(false);
     }
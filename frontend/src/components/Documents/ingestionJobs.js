@@ -0,0 +1,18 @@
+import axios from 'axios';
+
+const POLL_INTERVAL_MS = 2000;
+
+// Poll a background ingestion job until it completes, returning the processed document
+export async function waitForIngestionJob(jobId, onProgress) {
+  while (true) {
+    const response = await axios.get(`/api/documents/jobs/${jobId}`);
+    const job = response.data.job;
+
+    if (onProgress) onProgress(job);
+
+    if (job.status === 'completed') return job.document;
+    if (job.status === 'failed') throw new Error(job.error || 'Document processing failed');
+
+    await new Promise(resolve => setTimeout(resolve, POLL_INTERVAL_MS));
+  }
+}
@@ -42,6 +42,8 @@ function LiveTutorRoom() {
   const localAudioTrack = useRef(null);
   const mediaRecorder = useRef(null);
   const audioChunks = useRef([]);
+  const audioPlayback = useRef(Promise.resolve());
+  const voiceSocket = useRef(null);
   
   // Session data
   const [sessionData, setSessionData] = useState(null);
@@ -81,6 +83,7 @@ function LiveTutorRoom() {
       
       setSessionId(session.session_id);
       setSessionData(session);
+      openVoiceSocket(session.session_id, token);
       
       // Initialize Agora RTC for voice (simplified for testing)
       try {
@@ -174,6 +177,56 @@ function LiveTutorRoom() {
     }
   };
 
+  const openVoiceSocket = (id, token) => {
+    // One authenticated connection per session: recorded audio goes up as a
+    // binary frame and each reply sentence comes back as a binary frame
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocol}://${window.location.host}/api/tutor/voice/ws/${id}`);
+    
+    socket.onopen = () => socket.send(JSON.stringify({ type: 'auth', token }));
+    
+    socket.onmessage = (message) => {
+      if (typeof message.data !== 'string') {
+        queueAudioResponse(new Blob([message.data], { type: 'audio/mpeg' }));
+        return;
+      }
+      
+      const event = JSON.parse(message.data);
+      if (event.type === 'ready') {
+        voiceSocket.current = socket;
+      } else {
+        handleVoiceEvent(event);
+        if (event.type === 'done' || event.type === 'error' || event.type === 'cancelled') {
+          setIsProcessing(false);
+        }
+      }
+    };
+    
+    socket.onclose = (event) => {
+      if (voiceSocket.current === socket) {
+        voiceSocket.current = null;
+        setIsProcessing(false);
+      }
+      if (event.code === 4401) {
+        toast.error('Voice connection expired - please log in again');
+      }
+    };
+  };
+
+  const handleVoiceEvent = (event) => {
+    if (event.type === 'transcript') {
+      addMessage('user', event.text);
+    } else if (event.type === 'audio' && event.audio) {
+      queueAudioResponse(base64ToBlob(event.audio));
+    } else if (event.type === 'audio_error') {
+      toast.error(event.detail, { id: 'voice-audio-error' });
+    } else if (event.type === 'done') {
+      addMessage('ai', event.response);
+    } else if (event.type === 'error') {
+      toast.error(event.detail);
+    }
+  };
+
   const addMessage = (type, content) => {
     const message = {
       id: Date.now() + Math.random(),
@@ -188,6 +241,11 @@ function LiveTutorRoom() {
     try {
       setConnectionStatus('disconnecting');
       
+      if (voiceSocket.current) {
+        voiceSocket.current.close();
+        voiceSocket.current = null;
+      }
+      
       // Stop recording if active
       if (mediaRecorder.current && mediaRecorder.current.state === 'recording') {
         mediaRecorder.current.stop();
@@ -277,40 +335,48 @@ function LiveTutorRoom() {
     if (!sessionId) return;
     
     setIsProcessing(true);
+    if (voiceSocket.current) {
+      voiceSocket.current.send(audioBlob);
+      voiceSocket.current.send(JSON.stringify({ type: 'end_utterance', format: 'wav' }));
+      return;
+    }
+    
     try {
       const formData = new FormData();
       formData.append('session_id', sessionId);
       formData.append('audio_file', audioBlob, 'voice_message.wav');
       
+      // Stream transcript, tokens and per-sentence audio as NDJSON events so
+      // the first sentence plays while the rest of the reply is generated
       const token = localStorage.getItem('access_token');
-      const response = await axios.post('/api/tutor/voice/process-audio', formData, {
-        headers: { 
-          'Content-Type': 'multipart/form-data',
-          'Authorization': `Bearer ${token}`
-        }
+      const response = await fetch('/api/tutor/voice/process-audio/stream', {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+        body: formData
       });
       
-      const result = response.data;
-      
-      // Add user message (transcribed)
-      if (result.user_message) {
-        addMessage('user', result.user_message);
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
       }
       
-      // Add AI response
-      if (result.response) {
-        addMessage('ai', result.response);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
         
-        // Play audio response if available
-        if (result.audio_response && result.has_audio) {
-          playAudioResponse(result.audio_response);
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+        
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          handleVoiceEvent(JSON.parse(line));
         }
       }
       
-      if (result.error) {
-        toast.error(result.error);
-      }
-      
     } catch (error) {
       console.error('Error processing voice message:', error);
       toast.error('Failed to process voice message');
@@ -319,23 +385,37 @@ function LiveTutorRoom() {
     }
   };
 
-  const playAudioResponse = (audioData) => {
+  const queueAudioResponse = (audioBlob) => {
+    // Play streamed segments back to back, in the order they arrive
+    audioPlayback.current = audioPlayback.current.then(() => playAudioBlob(audioBlob));
+  };
+
+  const base64ToBlob = (audioData) => {
+    const byteCharacters = atob(audioData);
+    const byteNumbers = new Array(byteCharacters.length);
+    for (let i = 0; i < byteCharacters.length; i++) {
+      byteNumbers[i] = byteCharacters.charCodeAt(i);
+    }
+    return new Blob([new Uint8Array(byteNumbers)], { type: 'audio/mpeg' });
+  };
+
+  const playAudioResponse = (audioData) => playAudioBlob(base64ToBlob(audioData));
+
+  const playAudioBlob = (audioBlob) => {
     try {
-      // Convert base64 to blob and play
-      const byteCharacters = atob(audioData);
-      const byteNumbers = new Array(byteCharacters.length);
-      for (let i = 0; i < byteCharacters.length; i++) {
-        byteNumbers[i] = byteCharacters.charCodeAt(i);
-      }
-      const byteArray = new Uint8Array(byteNumbers);
-      const audioBlob = new Blob([byteArray], { type: 'audio/mpeg' });
-      
       const audioUrl = URL.createObjectURL(audioBlob);
       const audio = new Audio(audioUrl);
-      audio.play();
+      return new Promise(resolve => {
+        audio.onended = audio.onerror = () => {
+          URL.revokeObjectURL(audioUrl);
+          resolve();
+        };
+        audio.play().catch(resolve);
+      });
       
     } catch (error) {
       console.error('Error playing audio response:', error);
+      return Promise.resolve();
     }
   };
 
@@ -349,6 +429,11 @@ function LiveTutorRoom() {
     addMessage('user', message);
     
     setIsProcessing(true);
+    if (voiceSocket.current) {
+      voiceSocket.current.send(JSON.stringify({ type: 'text', text: message }));
+      return;
+    }
+    
     try {
       const token = localStorage.getItem('access_token');
       const response = await axios.post('/api/tutor/voice/process-text', {
@@ -57,19 +57,64 @@ function TutorRoom() {
     setLoading(true);
 
     try {
-      const response = await axios.post('/api/tutor/message', {
-        message: inputMessage,
-        session_id: sessionId
+      // Stream the reply as NDJSON events so tokens render as they arrive
+      const response = await fetch('/api/tutor/message/stream', {
+        method: 'POST',
+        headers: {
+          'Content-Type': 'application/json',
+          Authorization: axios.defaults.headers.common['Authorization']
+        },
+        body: JSON.stringify({
+          message: inputMessage,
+          session_id: sessionId
+        })
       });
 
-      const assistantMessage = {
+      if (!response.ok || !response.body) {
+        throw new Error(`Request failed with status ${response.status}`);
+      }
+
+      setMessages(prev => [...prev, {
         role: 'assistant',
-        content: response.data.response.response,
-        timestamp: new Date(),
-        sources: response.data.response.sources
+        content: '',
+        timestamp: new Date()
+      }]);
+
+      const updateAssistantMessage = (update) => {
+        setMessages(prev => {
+          const next = [...prev];
+          next[next.length - 1] = { ...next[next.length - 1], ...update(next[next.length - 1]) };
+          return next;
+        });
       };
 
-      setMessages(prev => [...prev, assistantMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const event = JSON.parse(line);
+
+          if (event.type === 'session') {
+            setSessionId(event.session_id);
+          } else if (event.type === 'token') {
+            updateAssistantMessage(message => ({ content: message.content + event.content }));
+          } else if (event.type === 'done') {
+            updateAssistantMessage(() => ({ content: event.response, sources: event.sources }));
+          } else if (event.type === 'error') {
+            throw new Error(event.detail);
+          }
+        }
+      }
     } catch (error) {
       console.error('Error sending message:', error);
       toast.error('Failed to send message');
@@ -1,8 +1,20 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 import PyPDF2
-import io
+import json
 import logging
+import mmap
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from chunking import (
+    Chunker,
+    get_tokenizer,
+    DEFAULT_STRATEGY,
+    DEFAULT_MAX_TOKENS,
+    DEFAULT_OVERLAP_TOKENS
+)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,49 +23,120 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 CORS(app)
 
-# File size limit (10MB)
-app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024
+# File size limit (uploads are spooled to disk and parsed page by page)
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "50"))
+app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE_MB * 1024 * 1024
 
-def extract_text_from_pdf(pdf_file):
-    """Extract text from PDF file"""
+# Parallel page extraction (PyPDF2 is CPU-bound, so pages are spread across processes)
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "16"))
+
+_executor = None
+
+def _get_executor():
+    """Get the shared page-extraction process pool, creating it on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+    return _executor
+
+_worker_pdf = None  # (file key, file, mmap, reader) cached per worker process
+
+def _get_worker_reader(pdf_path):
+    """Open (or reuse) a memory-mapped reader for pdf_path in a worker process
+    
+    Workers receive only the file path and map the PDF read-only, so the
+    document bytes are shared through the page cache instead of pickled.
+    The reader is reused across page ranges of the same file so the page
+    tree is only parsed once per worker.
+    """
+    global _worker_pdf
+    stat = os.stat(pdf_path)
+    key = (pdf_path, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    
+    if _worker_pdf is None or _worker_pdf[0] != key:
+        if _worker_pdf is not None:
+            _worker_pdf[2].close()
+            _worker_pdf[1].close()
+        f = open(pdf_path, "rb")
+        pdf_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _worker_pdf = (key, f, pdf_map, PyPDF2.PdfReader(pdf_map))
+    
+    return _worker_pdf[3]
+
+def _extract_page_range(pdf_path, start, end):
+    """Extract text for pages [start, end) in a worker process"""
+    pdf_reader = _get_worker_reader(pdf_path)
+    return [(pdf_reader.pages[i].extract_text() or "") + "\n" for i in range(start, end)]
+
+def iter_pdf_pages(pdf_path):
+    """Yield the text of each PDF page in order
+    
+    Large PDFs are split into page ranges extracted in parallel; ranges are
+    yielded in order as they complete, with at most two ranges in flight
+    per worker so memory stays bounded.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        text = ""
+        pdf_reader = PyPDF2.PdfReader(pdf_path)
+        page_count = len(pdf_reader.pages)
+        
+        if PDF_WORKERS <= 1 or page_count <= PDF_PAGES_PER_TASK:
+            for page in pdf_reader.pages:
+                yield (page.extract_text() or "") + "\n"
+            return
         
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
+        executor = _get_executor()
+        ranges = deque(
+            (start, min(start + PDF_PAGES_PER_TASK, page_count))
+            for start in range(0, page_count, PDF_PAGES_PER_TASK)
+        )
+        in_flight = deque()
         
-        return text.strip()
+        while ranges or in_flight:
+            while ranges and len(in_flight) < PDF_WORKERS * 2:
+                start, end = ranges.popleft()
+                in_flight.append(executor.submit(_extract_page_range, pdf_path, start, end))
+            
+            for page_text in in_flight.popleft().result():
+                yield page_text
     except Exception as e:
         logger.error(f"Error extracting text from PDF: {e}")
         raise
 
-def chunk_text(text, chunk_size=1000, overlap=200):
-    """Split text into chunks with overlap"""
-    chunks = []
-    start = 0
+def extract_text_from_pdf(pdf_path):
+    """Extract text from PDF file"""
+    return "".join(iter_pdf_pages(pdf_path)).strip()
+
+def _chunker_from_request():
+    """Build a Chunker from optional strategy/max_tokens/overlap_tokens/tokenizer form fields"""
+    form = request.form
+    return Chunker(
+        strategy=form.get('strategy', DEFAULT_STRATEGY),
+        max_tokens=int(form.get('max_tokens', DEFAULT_MAX_TOKENS)),
+        overlap_tokens=int(form.get('overlap_tokens', DEFAULT_OVERLAP_TOKENS)),
+        tokenizer=get_tokenizer(form.get('tokenizer', 'approximate'))
+    )
+
+def _save_upload(file):
+    """Spool an uploaded PDF to a temporary file and return its path"""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as out:
+        file.save(out)
+    return path
+
+def _validate_upload():
+    """Return (file, None) for a valid PDF upload, or (None, error response)"""
+    if 'file' not in request.files:
+        return None, (jsonify({"error": "No file provided"}), 400)
     
-    while start < len(text):
-        end = start + chunk_size
-        chunk = text[start:end]
-        
-        # Find the last complete sentence in the chunk
-        if end < len(text):
-            last_period = chunk.rfind('.')
-            last_newline = chunk.rfind('\n')
-            last_break = max(last_period, last_newline)
-            
-            if last_break > start + chunk_size // 2:
-                chunk = chunk[:last_break + 1]
-                end = start + len(chunk)
-        
-        chunks.append(chunk.strip())
-        start = end - overlap
-        
-        if start >= len(text):
-            break
+    file = request.files['file']
+    if file.filename == '':
+        return None, (jsonify({"error": "No file selected"}), 400)
     
-    return [chunk for chunk in chunks if len(chunk.strip()) > 50]
+    if not file.filename.lower().endswith('.pdf'):
+        return None, (jsonify({"error": "Only PDF files are allowed"}), 400)
+    
+    return file, None
 
 @app.route('/health', methods=['GET'])
 def health_check():
@@ -63,27 +146,26 @@ def health_check():
 @app.route('/parse-pdf', methods=['POST'])
 def parse_pdf():
     """Parse PDF and return extracted text chunks"""
+    pdf_path = None
     try:
-        # Validate request
-        if 'file' not in request.files:
-            return jsonify({"error": "No file provided"}), 400
-        
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({"error": "No file selected"}), 400
+        file, error = _validate_upload()
+        if error:
+            return error
         
-        if not file.filename.lower().endswith('.pdf'):
-            return jsonify({"error": "Only PDF files are allowed"}), 400
+        try:
+            chunker = _chunker_from_request()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         
         # Extract text from PDF
-        pdf_content = io.BytesIO(file.read())
-        text = extract_text_from_pdf(pdf_content)
+        pdf_path = _save_upload(file)
+        text = extract_text_from_pdf(pdf_path)
         
         if not text.strip():
             return jsonify({"error": "No text found in PDF"}), 400
         
         # Chunk the text
-        chunks = chunk_text(text)
+        chunks = list(chunker.chunks([text]))
         
         logger.info(f"Successfully parsed PDF: {file.filename}, {len(chunks)} chunks")
         
@@ -97,10 +179,66 @@ def parse_pdf():
     except Exception as e:
         logger.error(f"Error parsing PDF: {e}")
         return jsonify({"error": "Failed to parse PDF"}), 500
+    finally:
+        if pdf_path and os.path.exists(pdf_path):
+            os.unlink(pdf_path)
+
+@app.route('/parse-pdf/stream', methods=['POST'])
+def parse_pdf_stream():
+    """Parse PDF page by page, streaming chunk records back as NDJSON
+    
+    Optional form fields select the chunking: strategy (token, sentence,
+    paragraph, heading), max_tokens, overlap_tokens and tokenizer.
+    
+    Emits {"type": "chunk", "index", "text"} records as pages are extracted,
+    then a final {"type": "done", "chunk_count", "page_count"} record, or
+    {"type": "error", "error"} if parsing fails part way.
+    """
+    file, error = _validate_upload()
+    if error:
+        return error
+    
+    try:
+        chunker = _chunker_from_request()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    filename = file.filename
+    pdf_path = _save_upload(file)
+    
+    def generate():
+        page_count = 0
+        chunk_count = 0
+        try:
+            def pages():
+                nonlocal page_count
+                for page_text in iter_pdf_pages(pdf_path):
+                    page_count += 1
+                    yield page_text
+            
+            for chunk in chunker.chunks(pages()):
+                yield json.dumps({"type": "chunk", "index": chunk_count, "text": chunk}) + "\n"
+                chunk_count += 1
+            
+            if chunk_count == 0:
+                yield json.dumps({"type": "error", "error": "No text found in PDF"}) + "\n"
+                return
+            
+            logger.info(f"Successfully streamed PDF: {filename}, {page_count} pages, {chunk_count} chunks")
+            yield json.dumps({"type": "done", "chunk_count": chunk_count, "page_count": page_count}) + "\n"
+            
+        except Exception as e:
+            logger.error(f"Error streaming PDF: {e}")
+            yield json.dumps({"type": "error", "error": "Failed to parse PDF"}) + "\n"
+        finally:
+            if os.path.exists(pdf_path):
+                os.unlink(pdf_path)
+    
+    return Response(generate(), mimetype="application/x-ndjson")
 
 @app.errorhandler(413)
 def too_large(e):
-    return jsonify({"error": "File too large. Maximum size is 10MB"}), 413
+    return jsonify({"error": f"File too large. Maximum size is {MAX_UPLOAD_SIZE_MB}MB"}), 413
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,248 @@
+"""
+Token-aware text chunking for the parsing service
+
+Text is cut into segments (sentences and lines) in a single pass, and
+segments are packed greedily into chunks that fit a token budget. The
+strategy decides where a chunk may end:
+
+- "token":     anywhere between segments
+- "sentence":  at the last sentence end that fits
+- "paragraph": at a paragraph break once the chunk is half full, else a sentence end
+- "heading":   like "paragraph", and a new chunk starts at each heading line
+
+Text can be fed incrementally (e.g. page by page); only the unfinished
+tail segment and the chunk being packed are buffered.
+"""
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ("token", "sentence", "paragraph", "heading")
+
+DEFAULT_STRATEGY = "paragraph"
+DEFAULT_MAX_TOKENS = 300
+DEFAULT_OVERLAP_TOKENS = 0
+MIN_CHUNK_CHARS = 50
+
+# Paragraph break, line break, or whitespace after sentence-ending punctuation
+_BOUNDARY = re.compile(r"\n[ \t]*\n\s*|\n|(?<=[.!?])[\"')\]]*[ \t]+")
+_SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s*$")
+_HEADING = re.compile(
+    r"^\s*(?:#{1,6}\s+\S.*"
+    r"|(?i:chapter|section|part|unit)\s+[\dIVXLC]+\b.*"
+    r"|\d+(?:\.\d+)*\.?\s+[A-Z].*"
+    r"|[A-Z][A-Z0-9 ,:&'-]{3,})\s*$"
+)
+_HEADING_MAX_WORDS = 12
+_WORD = re.compile(r"\S+\s*")
+
+class ApproximateTokenizer:
+    """Counts words and punctuation marks, a close proxy for BPE token counts"""
+
+    name = "approximate"
+    _token = re.compile(r"\w+|[^\w\s]")
+
+    def count(self, text: str) -> int:
+        return len(self._token.findall(text))
+
+class TiktokenTokenizer:
+    """Exact counts for OpenAI embedding models (requires the tiktoken package)"""
+
+    name = "tiktoken"
+
+    def __init__(self, encoding: str = "cl100k_base"):
+        import tiktoken
+        self._encoding = tiktoken.get_encoding(encoding)
+
+    def count(self, text: str) -> int:
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+TOKENIZERS = {
+    ApproximateTokenizer.name: ApproximateTokenizer,
+    TiktokenTokenizer.name: TiktokenTokenizer
+}
+
+_tokenizer_instances = {}
+
+def get_tokenizer(name: str = ApproximateTokenizer.name):
+    """Get a shared tokenizer by name, falling back to the approximate one"""
+    if name not in TOKENIZERS:
+        raise ValueError(f"Unknown tokenizer: {name}")
+
+    if name not in _tokenizer_instances:
+        try:
+            _tokenizer_instances[name] = TOKENIZERS[name]()
+        except ImportError:
+            logger.warning(f"Tokenizer '{name}' unavailable, using approximate token counts")
+            return get_tokenizer(ApproximateTokenizer.name)
+    return _tokenizer_instances[name]
+
+class _Segment:
+    __slots__ = ("text", "tokens", "kind", "heading")
+
+    def __init__(self, text: str, tokens: int, kind: str, heading: bool):
+        self.text = text
+        self.tokens = tokens
+        self.kind = kind  # "sentence", "paragraph", "line" or "partial"
+        self.heading = heading
+
+class Chunker:
+    """Incremental single-pass chunker with a token budget per chunk"""
+
+    def __init__(self, strategy: str = DEFAULT_STRATEGY, max_tokens: int = DEFAULT_MAX_TOKENS,
+                 overlap_tokens: int = DEFAULT_OVERLAP_TOKENS, tokenizer=None,
+                 min_chars: int = MIN_CHUNK_CHARS):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown chunking strategy: {strategy}")
+        if max_tokens < 1:
+            raise ValueError("max_tokens must be positive")
+        if not 0 <= overlap_tokens < max_tokens:
+            raise ValueError("overlap_tokens must be between 0 and max_tokens")
+
+        self.strategy = strategy
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.tokenizer = tokenizer or get_tokenizer()
+        self.min_chars = min_chars
+
+        self._buffer = ""
+        self._scan_from = 0
+        self._at_line_start = True
+        self._segments = []
+        self._tokens = 0
+        self._carried = 0  # leading segments repeated from the previous chunk as overlap
+
+    def chunks(self, pieces):
+        """Chunk an iterable of text pieces"""
+        for piece in pieces:
+            yield from self.feed(piece)
+        yield from self.flush()
+
+    def feed(self, text: str):
+        """Add text, yielding every chunk that is now complete"""
+        self._buffer += text
+        buffer = self._buffer
+        start = 0
+
+        for match in _BOUNDARY.finditer(buffer, self._scan_from):
+            # A boundary touching the end of the buffer may still grow (e.g. "\n" -> "\n\n")
+            if match.end() == len(buffer):
+                break
+            yield from self._add_segment(buffer[start:match.end()], match.group())
+            start = match.end()
+
+        self._buffer = buffer[start:]
+        # Resume scanning just before the trailing whitespace, where an unfinished boundary may start
+        self._scan_from = max(0, len(self._buffer.rstrip()) - 3)
+
+    def flush(self):
+        """Yield the remaining text as final chunks"""
+        if self._buffer:
+            match = _BOUNDARY.search(self._buffer, self._scan_from)
+            yield from self._add_segment(self._buffer, match.group() if match else "")
+            self._buffer = ""
+            self._scan_from = 0
+
+        yield from self._emit(len(self._segments))
+        self._segments, self._tokens, self._carried = [], 0, 0
+
+    def _add_segment(self, text: str, separator: str):
+        if "\n" in separator:
+            kind = "paragraph" if separator.count("\n") > 1 else "line"
+            if kind == "line" and _SENTENCE_END.search(text):
+                kind = "sentence"
+        elif separator:
+            kind = "sentence"
+        else:
+            kind = "partial"
+
+        heading = (
+            self._at_line_start
+            and kind in ("line", "paragraph", "partial")
+            and len(text.split()) <= _HEADING_MAX_WORDS
+            and bool(_HEADING.match(text))
+        )
+        self._at_line_start = "\n" in separator
+
+        tokens = self.tokenizer.count(text)
+        if tokens > self.max_tokens:
+            yield from self._add_oversized(text, kind)
+            return
+
+        if heading and self.strategy == "heading" and len(self._segments) > self._carried:
+            yield from self._emit(len(self._segments))
+
+        while self._segments and self._tokens + tokens > self.max_tokens:
+            if len(self._segments) == self._carried:
+                # Only overlap is left; dropping it beats emitting a duplicate chunk
+                self._segments, self._tokens, self._carried = [], 0, 0
+                break
+            yield from self._emit(self._break_index())
+
+        self._segments.append(_Segment(text, tokens, kind, heading))
+        self._tokens += tokens
+
+    def _add_oversized(self, text: str, kind: str):
+        """Split a segment larger than the budget on word boundaries"""
+        yield from self._emit(len(self._segments))
+        self._segments, self._tokens, self._carried = [], 0, 0
+
+        words = _WORD.findall(text)
+        for i, word in enumerate(words):
+            tokens = self.tokenizer.count(word)
+            if self._segments and self._tokens + tokens > self.max_tokens:
+                yield from self._emit(len(self._segments))
+            is_last = i == len(words) - 1
+            self._segments.append(_Segment(word, tokens, kind if is_last else "partial", False))
+            self._tokens += tokens
+
+    def _break_index(self) -> int:
+        """Number of leading segments to emit as the next chunk"""
+        if self.strategy == "token":
+            return len(self._segments)
+
+        sentence_break = paragraph_break = None
+        filled = self._tokens
+        for i in range(len(self._segments) - 1, self._carried - 1, -1):
+            segment = self._segments[i]
+            if paragraph_break is None and segment.kind == "paragraph" and filled * 2 >= self.max_tokens:
+                paragraph_break = i + 1
+            if sentence_break is None and segment.kind in ("sentence", "paragraph"):
+                sentence_break = i + 1
+            if sentence_break is not None and (paragraph_break is not None or self.strategy == "sentence"):
+                break
+            filled -= segment.tokens
+
+        if self.strategy in ("paragraph", "heading") and paragraph_break is not None:
+            return paragraph_break
+        return sentence_break or len(self._segments)
+
+    def _emit(self, count: int):
+        """Yield the first count segments as a chunk and keep the rest (plus overlap)"""
+        if count <= self._carried:
+            return
+
+        emitted = self._segments[:count]
+        remaining = self._segments[count:]
+
+        text = "".join(segment.text for segment in emitted).strip()
+        if len(text) > self.min_chars:
+            yield text
+
+        overlap = []
+        if self.overlap_tokens:
+            budget = self.overlap_tokens
+            for segment in reversed(emitted):
+                if segment.tokens > budget:
+                    break
+                overlap.insert(0, segment)
+                budget -= segment.tokens
+
+        self._segments = overlap + remaining
+        self._tokens = sum(segment.tokens for segment in self._segments)
+        self._carried = len(overlap)
+
+def chunk_text(text: str, **options) -> list:
+    """Split text into token-budgeted chunks"""
+    return list(Chunker(**options).chunks([text]))
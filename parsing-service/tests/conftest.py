@@ -0,0 +1,16 @@
+"""Test setup: import the service from the parent directory"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pdf_factory import write_pdf
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """Build a synthetic PDF with the given number of pages in a temporary directory"""
+    def build(page_count, name="doc.pdf", lines_per_page=3):
+        return write_pdf(str(tmp_path / name), page_count, lines_per_page)
+    return build
@@ -0,0 +1,74 @@
+import json
+
+import PyPDF2
+import pytest
+
+import app as parsing_app
+from pdf_factory import write_pdf
+
+PAGES = 50
+
+@pytest.fixture
+def parallel(monkeypatch):
+    """Extract in a two-worker pool with small page ranges, recording each submitted task"""
+    submitted = []
+    monkeypatch.setattr(parsing_app, "PDF_WORKERS", 2)
+    monkeypatch.setattr(parsing_app, "PDF_PAGES_PER_TASK", 4)
+    monkeypatch.setattr(parsing_app, "_executor", None)
+    executor = parsing_app._get_executor()
+    submit = executor.submit
+
+    def recording_submit(fn, *args):
+        submitted.append(args)
+        return submit(fn, *args)
+
+    monkeypatch.setattr(executor, "submit", recording_submit)
+    yield submitted
+    executor.shutdown()
+
+def sequential_pages(pdf_path):
+    return [(page.extract_text() or "") + "\n" for page in PyPDF2.PdfReader(pdf_path).pages]
+
+def test_parallel_extraction_matches_sequential_in_order(make_pdf, parallel):
+    pdf_path = make_pdf(PAGES)
+    pages = list(parsing_app.iter_pdf_pages(pdf_path))
+
+    assert pages == sequential_pages(pdf_path)
+    assert [page.split()[1] for page in pages] == [str(i) for i in range(PAGES)]
+    # Split into ranges of PDF_PAGES_PER_TASK that cover every page once
+    assert [(start, end) for _, start, end in parallel] == [(i, min(i + 4, PAGES)) for i in range(0, PAGES, 4)]
+
+def test_workers_receive_the_path_not_the_bytes(make_pdf, parallel):
+    pdf_path = make_pdf(PAGES)
+    list(parsing_app.iter_pdf_pages(pdf_path))
+
+    assert parallel
+    assert all(args[0] == pdf_path and not isinstance(args[0], bytes) for args in parallel)
+
+def test_small_pdfs_are_extracted_inline(make_pdf, parallel):
+    pdf_path = make_pdf(3)
+    assert list(parsing_app.iter_pdf_pages(pdf_path)) == sequential_pages(pdf_path)
+    assert parallel == []
+
+def test_worker_reader_is_reopened_when_the_file_changes(tmp_path, monkeypatch):
+    monkeypatch.setattr(parsing_app, "_worker_pdf", None)
+    pdf_path = write_pdf(str(tmp_path / "doc.pdf"), 2)
+    assert parsing_app._extract_page_range(pdf_path, 0, 2) == sequential_pages(pdf_path)
+
+    write_pdf(pdf_path, 5)
+    assert parsing_app._extract_page_range(pdf_path, 3, 5) == sequential_pages(pdf_path)[3:5]
+
+def test_parse_routes_return_pages_in_order(make_pdf, parallel):
+    pdf_path = make_pdf(PAGES)
+    client = parsing_app.app.test_client()
+
+    with open(pdf_path, "rb") as f:
+        response = client.post("/parse-pdf", data={"file": (f, "book.pdf")})
+    assert response.status_code == 200
+    assert response.get_json()["text"] == "".join(sequential_pages(pdf_path)).strip()
+
+    with open(pdf_path, "rb") as f:
+        response = client.post("/parse-pdf/stream", data={"file": (f, "book.pdf")})
+    records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert records[-1] == {"type": "done", "chunk_count": len(records) - 1, "page_count": PAGES}
+    assert "Page 0 line 0" in records[0]["text"]
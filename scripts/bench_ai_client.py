@@ -0,0 +1,117 @@
+"""
+Load benchmark for the AI client against a local mock OpenRouter server
+
+Compares the original client (blocking requests.post inside async methods)
+with the pooled httpx client in utils/mistral_client.AIClient, at several
+concurrency levels. The mock answers every chat completion after a fixed
+delay, standing in for model latency.
+
+Usage (from the repository root):
+    python scripts/bench_ai_client.py [--latency 0.2] [--requests 200] [--concurrency 1,10,100]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import requests
+import uvicorn
+from fastapi import FastAPI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+def start_mock_openrouter(latency: float) -> str:
+    """Serve a fake /chat/completions in a background thread, returning its base URL"""
+    app = FastAPI()
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions():
+        await asyncio.sleep(latency)
+        return {"choices": [{"message": {"content": "Mock answer."}}]}
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=75))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/api/v1"
+
+class BlockingClient:
+    """The original AIClient.chat_completion: a blocking requests.post inside an async method"""
+
+    def __init__(self, base_url: str, headers: dict):
+        self.base_url = base_url
+        self.headers = headers
+
+    async def chat_completion(self, messages: list, max_tokens: int = 1000) -> str:
+        response = requests.post(
+            f"{self.base_url}/chat/completions",
+            headers=self.headers,
+            json={"model": "openai/gpt-3.5-turbo", "messages": messages, "max_tokens": max_tokens},
+            timeout=60
+        )
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+async def run_load(client, total: int, concurrency: int) -> dict:
+    limiter = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(i: int):
+        async with limiter:
+            started = time.monotonic()
+            await client.chat_completion([{"role": "user", "content": f"question {i}"}])
+            latencies.append(time.monotonic() - started)
+
+    started = time.monotonic()
+    await asyncio.gather(*[one(i) for i in range(total)])
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        "throughput": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="mock model latency in seconds")
+    parser.add_argument("--requests", type=int, default=200, help="requests per run")
+    parser.add_argument("--concurrency", default="1,10,100", help="comma-separated concurrency levels")
+    args = parser.parse_args()
+
+    base_url = start_mock_openrouter(args.latency)
+    os.environ.setdefault("OPENROUTER_API_KEY", "bench-key")
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    for name in ("SUPABASE_URL", "SUPABASE_KEY", "AGORA_APP_ID", "AGORA_APP_CERTIFICATE"):
+        os.environ.setdefault(name, "http://bench.invalid" if name.endswith("URL") else "bench")
+    os.environ["EMBEDDING_CACHE_ENABLED"] = "false"
+    from utils.mistral_client import AIClient
+
+    pooled = AIClient()
+    blocking = BlockingClient(base_url, pooled.headers)
+    # The blocking client serialises everything, so cap its runs to keep the benchmark short
+    blocking_total = min(args.requests, max(20, int(10 / args.latency)))
+
+    print(f"mock latency {args.latency * 1000:.0f} ms; {args.requests} requests per run "
+          f"({blocking_total} for the blocking client)")
+    print(f"{'client':<10} {'concurrency':>11} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9}")
+
+    async def bench():
+        for concurrency in [int(level) for level in args.concurrency.split(",")]:
+            for name, client, total in (("blocking", blocking, blocking_total), ("pooled", pooled, args.requests)):
+                result = await run_load(client, total, concurrency)
+                print(f"{name:<10} {concurrency:>11} {result['throughput']:>9.1f} "
+                      f"{result['p50_ms']:>9.0f} {result['p95_ms']:>9.0f}")
+        await pooled.close()
+
+    asyncio.run(bench())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-request auth overhead benchmark against a local fake Supabase Auth
+
+Times auth_service.get_user_from_token, the work behind get_current_user,
+in three modes:
+
+- remote: no local key, so every request asks Supabase Auth (the original
+  behaviour); the fake /auth/v1/user answers after --latency seconds
+- local: HS256 signature, expiry and audience checked in-process, with
+  the verified-token cache disabled
+- cached: repeat requests with the same token served from the cache
+
+Usage (from the repository root):
+    python scripts/bench_auth.py [--latency 0.02] [--requests 200]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+from jose import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+JWT_SECRET = "bench-jwt-secret"
+
+def start_fake_auth(latency: float) -> str:
+    """Serve a fake Supabase Auth /user endpoint in a background thread, returning its base URL"""
+    app = FastAPI()
+
+    @app.get("/auth/v1/user")
+    async def user():
+        await asyncio.sleep(latency)
+        return {"id": "bench-user", "aud": "authenticated", "role": "authenticated", "email": "bench@example.com",
+                "app_metadata": {}, "user_metadata": {}, "created_at": "2024-01-01T00:00:00Z"}
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+async def time_requests(get_user, token: str, total: int) -> dict:
+    latencies = []
+    for _ in range(total):
+        started = time.perf_counter()
+        user = await get_user(token)
+        latencies.append(time.perf_counter() - started)
+        assert user is not None and user.id == "bench-user"
+    latencies.sort()
+    return {
+        "p50_us": statistics.median(latencies) * 1e6,
+        "p95_us": latencies[int(len(latencies) * 0.95) - 1] * 1e6
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.02, help="fake Supabase Auth latency in seconds")
+    parser.add_argument("--requests", type=int, default=200, help="requests per mode")
+    args = parser.parse_args()
+
+    os.environ["SUPABASE_URL"] = start_fake_auth(args.latency)
+    os.environ["SUPABASE_KEY"] = "bench-anon-key"
+    os.environ["SUPABASE_SERVICE_KEY"] = "bench-service-key"
+    os.environ["AUTH_REVALIDATE_SECONDS"] = "0"
+    for name in ("OPENROUTER_API_KEY", "AGORA_APP_ID", "AGORA_APP_CERTIFICATE"):
+        os.environ.setdefault(name, "bench")
+    from services import auth_service as auth_module
+    from utils.token_verifier import TokenVerifier
+
+    token = jwt.encode(
+        {"sub": "bench-user", "email": "bench@example.com", "role": "authenticated",
+         "aud": "authenticated", "exp": int(time.time()) + 3600},
+        JWT_SECRET, algorithm="HS256"
+    )
+    modes = (
+        ("remote", TokenVerifier(None, None, "authenticated", ttl=0, max_entries=100)),
+        ("local", TokenVerifier(JWT_SECRET, None, "authenticated", ttl=0, max_entries=100)),
+        ("cached", TokenVerifier(JWT_SECRET, None, "authenticated", ttl=60, max_entries=100))
+    )
+
+    print(f"fake Supabase Auth latency {args.latency * 1000:.0f} ms; {args.requests} requests per mode")
+    print(f"{'mode':<8} {'p50':>11} {'p95':>11}")
+
+    async def bench():
+        for name, verifier in modes:
+            auth_module.token_verifier = verifier
+            result = await time_requests(auth_module.auth_service.get_user_from_token, token, args.requests)
+            print(f"{name:<8} {result['p50_us']:>9.1f}us {result['p95_us']:>9.1f}us")
+
+    asyncio.run(bench())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Query latency benchmark for the per-user Chroma partitions
+
+Loads the same synthetic corpus (random embeddings, a fixed number of
+chunks per user) into both layouts and times one user's top-5 query as
+the number of users grows. Timed queries go to a sample of active users
+whose partitions have already been queried once, as a tutor session's
+would be; the first query to a partition also loads its index from disk,
+reported separately as "cold".
+
+Layouts:
+
+- shared: the original single kashar_documents collection queried with
+  where={"user_id": ...}, which searches every user's vectors
+- partitioned: utils/chroma_client.ChromaDBClient, which routes the query
+  to the user's own collection (or hash shard with --shards)
+
+Usage (from the repository root):
+    python scripts/bench_chroma_partition.py [--users 10,100,1000] [--chunks 50] [--dim 256] [--queries 200] [--active 20] [--shards 0]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+def random_vectors(rng: random.Random, count: int, dim: int) -> list:
+    return [[rng.uniform(-1.0, 1.0) for _ in range(dim)] for _ in range(count)]
+
+def load_corpus(shared, store, start_user: int, end_user: int, chunks: int, dim: int, rng: random.Random):
+    """Add users [start_user, end_user) to both layouts"""
+    for user in range(start_user, end_user):
+        user_id = f"user-{user:05d}"
+        batch = {
+            "documents": [f"{user_id} chunk {i}" for i in range(chunks)],
+            "embeddings": random_vectors(rng, chunks, dim),
+            "metadatas": [{"user_id": user_id, "document_title": "textbook", "chunk_index": i} for i in range(chunks)],
+            "ids": [f"{user_id}_{i}" for i in range(chunks)]
+        }
+        shared.add(**batch)
+        store.add_documents(**batch)
+
+def time_queries(query, user_ids: list, queries: int, dim: int, rng: random.Random) -> tuple:
+    """p50/p95 latency in ms over queries spread across user_ids"""
+    latencies = []
+    for _ in range(queries):
+        user_id = rng.choice(user_ids)
+        embedding = random_vectors(rng, 1, dim)
+        started = time.perf_counter()
+        results = query(embedding, user_id)
+        latencies.append(time.perf_counter() - started)
+        assert all(metadata["user_id"] == user_id for metadata in results["metadatas"][0])
+    latencies.sort()
+    return statistics.median(latencies) * 1000, latencies[int(len(latencies) * 0.95) - 1] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", default="10,100,1000", help="comma-separated user counts (ascending)")
+    parser.add_argument("--chunks", type=int, default=50, help="chunks per user")
+    parser.add_argument("--dim", type=int, default=256, help="embedding dimensions")
+    parser.add_argument("--queries", type=int, default=200, help="queries timed per user count")
+    parser.add_argument("--active", type=int, default=20, help="users the timed queries are spread across")
+    parser.add_argument("--shards", type=int, default=0, help="CHROMA_SHARDS for the partitioned store")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["CHROMA_DB_PATH"] = os.path.join(tmp, "partitioned")
+        os.environ["CHROMA_SHARDS"] = str(args.shards)
+        for name in ("OPENROUTER_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "AGORA_APP_ID", "AGORA_APP_CERTIFICATE"):
+            os.environ.setdefault(name, "http://bench.invalid" if name.endswith("URL") else "bench")
+        import chromadb
+        from chromadb.config import Settings
+        from utils.chroma_client import ChromaDBClient
+
+        store = ChromaDBClient()
+        shared = chromadb.PersistentClient(
+            path=os.path.join(tmp, "shared"), settings=Settings(anonymized_telemetry=False)
+        ).get_or_create_collection(name="kashar_documents")
+
+        def query_shared(embedding, user_id):
+            return shared.query(query_embeddings=embedding, n_results=5, where={"user_id": user_id})
+
+        def query_partitioned(embedding, user_id):
+            return store.query_documents(query_embeddings=embedding, n_results=5, where={"user_id": user_id})
+
+        rng = random.Random(7)
+        layout = f"{args.shards} shards" if args.shards else "one collection per user"
+        print(f"{args.chunks} chunks per user, {args.dim} dimensions, {args.queries} queries; partitioned: {layout}")
+        print(f"{'users':>6} {'vectors':>8} {'shared p50':>11} {'p95':>7} "
+              f"{'partitioned p50':>16} {'p95':>7} {'cold':>8}")
+
+        loaded = 0
+        for users in [int(count) for count in args.users.split(",")]:
+            load_corpus(shared, store, loaded, users, args.chunks, args.dim, rng)
+            loaded = users
+            active = [f"user-{user:05d}" for user in rng.sample(range(users), min(users, args.active))]
+            cold = []
+            for user_id in active:
+                query_shared(random_vectors(rng, 1, args.dim), user_id)
+                started = time.perf_counter()
+                query_partitioned(random_vectors(rng, 1, args.dim), user_id)
+                cold.append(time.perf_counter() - started)
+            cold = statistics.median(cold) * 1000
+            shared_p50, shared_p95 = time_queries(query_shared, active, args.queries, args.dim, rng)
+            part_p50, part_p95 = time_queries(query_partitioned, active, args.queries, args.dim, rng)
+            print(f"{users:>6} {users * args.chunks:>8} {shared_p50:>9.2f}ms {shared_p95:>5.2f}ms "
+                  f"{part_p50:>14.2f}ms {part_p95:>5.2f}ms {cold:>6.2f}ms")
+
+if __name__ == "__main__":
+    main()
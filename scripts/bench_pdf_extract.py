@@ -0,0 +1,72 @@
+"""
+Benchmark for parallel PDF page extraction in the parsing service
+
+Generates a synthetic multi-hundred-page text PDF and times
+extract_text_from_pdf with the page-extraction pool at several worker
+counts. One worker is the original single-process path. Every run is
+checked against the single-worker text, so a speedup never comes from
+dropped or reordered pages.
+
+Usage (from the repository root):
+    python scripts/bench_pdf_extract.py [--pages 400] [--lines 40] [--workers 1,2,4] [--pages-per-task 16]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "parsing-service"))
+sys.path.insert(0, os.path.join(ROOT, "parsing-service", "tests"))
+
+import app as parsing_app
+from pdf_factory import write_pdf
+
+def time_extraction(pdf_path: str, workers: int, pages_per_task: int, repeats: int) -> tuple:
+    """Best-of-repeats wall time for one worker count, with a fresh pool per count"""
+    parsing_app.PDF_WORKERS = workers
+    parsing_app.PDF_PAGES_PER_TASK = pages_per_task
+    parsing_app._executor = None
+    try:
+        if workers > 1:
+            # Start the worker processes before timing, as a long-running service would have
+            list(parsing_app._get_executor().map(abs, range(workers)))
+        best = None
+        for _ in range(repeats):
+            started = time.perf_counter()
+            text = parsing_app.extract_text_from_pdf(pdf_path)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, text
+    finally:
+        if parsing_app._executor is not None:
+            parsing_app._executor.shutdown()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=400, help="pages in the synthetic PDF")
+    parser.add_argument("--lines", type=int, default=40, help="text lines per page")
+    default_workers = sorted({1, 2, 4, os.cpu_count() or 1})
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="comma-separated worker counts")
+    parser.add_argument("--pages-per-task", type=int, default=16, help="pages per worker task")
+    parser.add_argument("--repeats", type=int, default=3, help="runs per worker count (best is reported)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf_path = write_pdf(os.path.join(tmp, "textbook.pdf"), args.pages, args.lines)
+        print(f"{args.pages} pages x {args.lines} lines ({os.path.getsize(pdf_path) / 1e6:.1f} MB), "
+              f"{args.pages_per_task} pages per task, {os.cpu_count()} CPUs")
+        print(f"{'workers':>7} {'seconds':>9} {'pages/s':>9} {'speedup':>8}")
+
+        baseline = expected = None
+        for workers in [int(count) for count in args.workers.split(",")]:
+            elapsed, text = time_extraction(pdf_path, workers, args.pages_per_task, args.repeats)
+            if expected is None:
+                baseline, expected = elapsed, text
+            elif text != expected:
+                raise SystemExit(f"{workers} workers returned different text from the first run")
+            print(f"{workers:>7} {elapsed:>9.2f} {args.pages / elapsed:>9.0f} {baseline / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""
+Load test for voice turns: the voice WebSocket against one POST per turn
+
+Runs the tutor routes in a separate server process with the STT, LLM and
+TTS stages replaced by fakes with fixed latencies, then drives many
+concurrent simulated voice sessions. Each turn uploads one utterance and
+reads back the transcript, tokens and per-sentence audio. Modes:
+
+- ws: one authenticated /api/tutor/voice/ws/{session_id} connection per
+  session; binary audio frames both ways
+- http: POST /api/tutor/voice/process-audio/stream per turn on a fresh
+  connection, multipart upload and base64 audio in NDJSON (the old path)
+- http-keepalive: the same POSTs, reusing pooled connections
+
+Usage (from the repository root):
+    python scripts/bench_voice_ws.py [--sessions 100] [--turns 5] [--modes ws,http,http-keepalive]
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import sys
+import time
+
+import httpx
+import websockets
+from jose import jwt
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+JWT_SECRET = "bench-jwt-secret"
+UTTERANCE_BYTES = 48000   # about 3 s of 128 kbps webm/opus
+SEGMENT_AUDIO_BYTES = 16000   # about 1 s of 128 kbps mp3 per sentence
+REPLY = [
+    "Photosynthesis is how plants turn light into chemical energy. ",
+    "It happens mostly in the chloroplasts of leaf cells. ",
+    "Would you like me to walk through either stage in more detail?"
+]
+
+def configure_environment():
+    os.environ.update({
+        "SUPABASE_URL": "http://bench.invalid",
+        "SUPABASE_KEY": "bench-anon-key",
+        "SUPABASE_SERVICE_KEY": "bench-service-key",
+        "SUPABASE_JWT_SECRET": JWT_SECRET,
+        "AUTH_REVALIDATE_SECONDS": "0",
+        "SESSION_REGISTRY_BACKEND": "memory"
+    })
+    for name in ("OPENROUTER_API_KEY", "AGORA_APP_ID", "AGORA_APP_CERTIFICATE"):
+        os.environ.setdefault(name, "bench")
+
+def run_server(port: int, sessions: int):
+    """Serve the tutor routes with fake voice stages (runs in a child process)"""
+    import logging
+    import uvicorn
+    from fastapi import FastAPI
+    from routes import tutor as tutor_routes
+    from services import voice_tutor_service as voice_module
+
+    voice = voice_module.voice_tutor_service
+
+    async def transcribe(audio_data, audio_format):
+        await asyncio.sleep(0.05)
+        return "Explain photosynthesis"
+
+    async def reply(messages, max_tokens=800):
+        await asyncio.sleep(0.1)
+        for sentence in REPLY:
+            for start in range(0, len(sentence), 8):
+                await asyncio.sleep(0.01)
+                yield sentence[start:start + 8]
+
+    async def synthesize(text):
+        await asyncio.sleep(0.05)
+        return os.urandom(SEGMENT_AUDIO_BYTES)
+
+    async def summarize(messages, max_tokens=1000):
+        return "The student is learning about photosynthesis."
+
+    async def nothing(*args):
+        return ""
+
+    voice_module.stt_service.transcribe_audio = transcribe
+    voice_module.ai_client.chat_completion_stream = reply
+    voice_module.ai_client.chat_completion = summarize
+    voice_module.tts_service.synthesize_speech = synthesize
+    voice._get_relevant_context = nothing
+    voice._store_interaction = nothing
+
+    async def seed_sessions():
+        for i in range(sessions):
+            await voice.sessions.create(f"bench-{i}", {"user_id": "bench-user", "message_count": 0})
+
+    asyncio.run(seed_sessions())
+    app = FastAPI()
+    app.include_router(tutor_routes.router)
+
+    logging.getLogger().setLevel(logging.WARNING)
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=75)
+
+class Results:
+    def __init__(self):
+        self.first_audio = []
+        self.turns = []
+        self.sent = []
+        self.received = []
+        self.errors = 0
+
+async def ws_session(base: str, token: str, index: int, turns: int, utterance: bytes, results: Results):
+    async with websockets.connect(f"ws://{base}/api/tutor/voice/ws/bench-{index}", max_size=None) as ws:
+        await ws.send(json.dumps({"type": "auth", "token": token}))
+        assert json.loads(await ws.recv())["type"] == "ready"
+        for _ in range(turns):
+            started = time.monotonic()
+            first_audio, received = None, 0
+            for offset in range(0, len(utterance), 16000):
+                await ws.send(utterance[offset:offset + 16000])
+            end = json.dumps({"type": "end_utterance", "format": "webm"})
+            await ws.send(end)
+            while True:
+                message = await ws.recv()
+                received += len(message)
+                if isinstance(message, bytes):
+                    first_audio = first_audio or time.monotonic() - started
+                    continue
+                event = json.loads(message)
+                if event["type"] in ("done", "error"):
+                    results.errors += event["type"] == "error"
+                    break
+            results.sent.append(len(utterance) + len(end))
+            results.received.append(received)
+            results.first_audio.append(first_audio)
+            results.turns.append(time.monotonic() - started)
+
+async def http_session(base: str, token: str, index: int, turns: int, utterance: bytes, results: Results, client):
+    for _ in range(turns):
+        started = time.monotonic()
+        first_audio, received = None, 0
+        request = client.build_request(
+            "POST", f"http://{base}/api/tutor/voice/process-audio/stream",
+            data={"session_id": f"bench-{index}"},
+            files={"audio_file": ("voice.webm", utterance, "audio/webm")},
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        results.sent.append(len(request.read()))
+        response = await client.send(request, stream=True)
+        buffer = b""
+        async for chunk in response.aiter_bytes():
+            received += len(chunk)
+            buffer += chunk
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                event = json.loads(line)
+                if event["type"] == "audio":
+                    first_audio = first_audio or time.monotonic() - started
+                results.errors += event["type"] == "error"
+        await response.aclose()
+        results.received.append(received)
+        results.first_audio.append(first_audio)
+        results.turns.append(time.monotonic() - started)
+
+async def run_mode(mode: str, base: str, token: str, sessions: int, turns: int) -> tuple:
+    results = Results()
+    utterance = os.urandom(UTTERANCE_BYTES)
+    started = time.monotonic()
+    if mode == "ws":
+        await asyncio.gather(*[ws_session(base, token, i, turns, utterance, results) for i in range(sessions)])
+    else:
+        keepalive = sessions if mode == "http-keepalive" else 0
+        limits = httpx.Limits(max_connections=sessions, max_keepalive_connections=keepalive)
+        async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+            await asyncio.gather(*[
+                http_session(base, token, i, turns, utterance, results, client) for i in range(sessions)
+            ])
+    return results, time.monotonic() - started
+
+def percentile_ms(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[max(int(len(values) * fraction) - 1, 0)] * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100, help="concurrent voice sessions")
+    parser.add_argument("--turns", type=int, default=5, help="turns per session")
+    parser.add_argument("--modes", default="ws,http,http-keepalive", help="comma-separated modes")
+    args = parser.parse_args()
+
+    configure_environment()
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = multiprocessing.Process(target=run_server, args=(port, args.sessions), daemon=True)
+    server.start()
+    base = f"127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(f"http://{base}/docs", timeout=1)
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    token = jwt.encode(
+        {"sub": "bench-user", "email": "bench@example.com", "role": "authenticated",
+         "aud": "authenticated", "exp": int(time.time()) + 3600},
+        JWT_SECRET, algorithm="HS256"
+    )
+    print(f"{args.sessions} sessions x {args.turns} turns; {UTTERANCE_BYTES // 1000} KB utterance, "
+          f"{len(REPLY)} x {SEGMENT_AUDIO_BYTES // 1000} KB audio segments per reply")
+    print(f"{'mode':<15} {'wall s':>7} {'errors':>6} {'1st audio p50':>14} {'p95':>7} "
+          f"{'turn p50':>9} {'p95':>7} {'up KiB':>7} {'down KiB':>9}")
+    try:
+        for mode in args.modes.split(","):
+            results, wall = asyncio.run(run_mode(mode, base, token, args.sessions, args.turns))
+            first_audio = [value for value in results.first_audio if value]
+            print(f"{mode:<15} {wall:>7.1f} {results.errors:>6} "
+                  f"{percentile_ms(first_audio, 0.5):>12.0f}ms {percentile_ms(first_audio, 0.95):>5.0f}ms "
+                  f"{percentile_ms(results.turns, 0.5):>7.0f}ms {percentile_ms(results.turns, 0.95):>5.0f}ms "
+                  f"{statistics.mean(results.sent) / 1024:>7.1f} {statistics.mean(results.received) / 1024:>9.1f}")
+    finally:
+        server.terminate()
+        server.join()
+
+if __name__ == "__main__":
+    main()